@@ -1,8 +1,20 @@
+import json
 import os
+import shutil
 
+from app.models.build_target_model import BuildTarget
+from app.models.os_model import CopyStrategy
 from app.models.platform_model import Platform
-from app.services import ado_service, shell_service
-from app.utils import adapter_util, io_util
+from app.services import (
+    ado_service,
+    artifact_service,
+    build_cache_service,
+    build_daemon_service,
+    build_scheduler_service,
+    dependency_cache_service,
+    shell_service,
+)
+from app.utils import adapter_util, io_util, trace_util
 
 
 def _fetch_required_env_var():
@@ -17,6 +29,23 @@ def _fetch_required_env_var():
         "nuget_config_path": os.getenv("NUGET_CONFIG_PATH", ""),
         "settings_xml_path": os.getenv("SETTINGS_XML_PATH", ""),
         "env_build_resource_dir": os.getenv("ENV_BUILD_RESOURCE_DIR", ""),
+        "is_build_reusable": adapter_util.getenv_bool("IS_BUILD_REUSABLE", False),
+        "artifact_entry_dir": os.getenv("ARTIFACT_ENTRY_DIR"),
+        "build_cache_dir": os.getenv("BUILD_CACHE_DIR"),
+        "build_cache_max_bytes": int(os.getenv("BUILD_CACHE_MAX_BYTES", 20 * 1024**3)),
+        "io_copy_strategy": os.getenv("IO_COPY_STRATEGY", "AUTO"),
+        "dependency_cache_dir": os.getenv("DEPENDENCY_CACHE_DIR"),
+        "dependency_cache_max_bytes": int(
+            os.getenv("DEPENDENCY_CACHE_MAX_BYTES", 20 * 1024**3)
+        ),
+        "dependency_cache_restore_strategy": os.getenv(
+            "DEPENDENCY_CACHE_RESTORE_STRATEGY", "AUTO"
+        ),
+        "build_targets_json": os.getenv("BUILD_TARGETS_JSON"),
+        "build_workers": int(os.getenv("BUILD_WORKERS", 0)),
+        "build_log_dir": os.getenv("BUILD_LOG_DIR", ""),
+        "is_build_daemon": adapter_util.getenv_bool("IS_BUILD_DAEMON", False),
+        "build_daemon_state_dir": os.getenv("BUILD_DAEMON_STATE_DIR"),
     }
     return env_vars
 
@@ -27,6 +56,8 @@ def _maven_compile(
     maven_goals: str,
     is_use_private_libs: bool,
     settings_xml_path: str,
+    is_build_daemon: bool = False,
+    build_daemon_state_dir: str = None,
 ):
     if is_use_private_libs:
         m2_home = os.path.expanduser("~/.m2")
@@ -38,7 +69,8 @@ def _maven_compile(
         io_util.cp(settings_xml_path, dest_settings_xml_path)
         shell_service.cat(dest_settings_xml_path)
 
-    shell_service.check_version_maven()
+    is_mvnd = is_build_daemon and shutil.which("mvnd") is not None
+    shell_service.check_version_maven(cmd=["mvnd", "--version"] if is_mvnd else None)
 
     maven_goals = (
         maven_goals
@@ -47,12 +79,19 @@ def _maven_compile(
     """
     )
 
-    shell_service.maven_cmd(
-        maven_goals,
-        cwd=maven_build_work_dir_path,
-        trace_cmd=True,
-        collect_log_types=[shell_service.LogType.STDOUT, shell_service.LogType.STDERR],
-    )
+    with build_daemon_service.build_cmd(
+        Platform.MAVEN, maven_goals, is_build_daemon, build_daemon_state_dir
+    ) as maven_goals:
+        shell_service.maven_cmd(
+            maven_goals,
+            cwd=maven_build_work_dir_path,
+            trace_cmd=True,
+            collect_log_types=[
+                shell_service.LogType.STDOUT,
+                shell_service.LogType.STDERR,
+            ],
+            is_stream_log=True,
+        )
 
 
 def _dotnet_compile(
@@ -61,6 +100,8 @@ def _dotnet_compile(
     dotnet_goals: str,
     is_use_private_libs: bool,
     nuget_config_path: str,
+    is_build_daemon: bool = False,
+    build_daemon_state_dir: str = None,
 ):
     if is_use_private_libs:
         print("> Fetching libs from private repository.")
@@ -82,13 +123,49 @@ def _dotnet_compile(
         """
     )
 
-    shell_service.dotnet_cmd(
-        dotnet_goals,
-        cwd=dotnet_build_work_dir_path,
-        trace_cmd=True,
-        collect_log_types=[shell_service.LogType.STDOUT, shell_service.LogType.STDERR],
+    with build_daemon_service.build_cmd(
+        Platform.DOTNET, dotnet_goals, is_build_daemon, build_daemon_state_dir
+    ) as dotnet_goals:
+        shell_service.dotnet_cmd(
+            dotnet_goals,
+            cwd=dotnet_build_work_dir_path,
+            trace_cmd=True,
+            collect_log_types=[
+                shell_service.LogType.STDOUT,
+                shell_service.LogType.STDERR,
+            ],
+            is_stream_log=True,
+        )
+
+
+def _gradle_compile(
+    gradle_build_work_dir_path: str,
+    gradle_build_output_path: str,
+    gradle_tasks: str,
+    is_build_daemon: bool = False,
+    build_daemon_state_dir: str = None,
+):
+    gradle_tasks = (
+        gradle_tasks
+        or """
+            gradle build
+        """
     )
 
+    with build_daemon_service.build_cmd(
+        Platform.GRADLE, gradle_tasks, is_build_daemon, build_daemon_state_dir
+    ) as gradle_tasks:
+        shell_service.execute_cmd(
+            gradle_tasks,
+            cwd=gradle_build_work_dir_path,
+            trace_cmd=True,
+            collect_log_types=[
+                shell_service.LogType.STDOUT,
+                shell_service.LogType.STDERR,
+            ],
+            is_stream_log=True,
+        )
+
 
 def _npm_compile(
     npm_build_work_dir_path: str,
@@ -106,7 +183,9 @@ def _npm_compile(
             npm install
         """
     )
-    shell_service.npm_cmd(npm_install_goal, cwd=npm_build_work_dir_path)
+    shell_service.npm_cmd(
+        npm_install_goal, cwd=npm_build_work_dir_path, is_stream_log=True
+    )
 
     npm_build_goal = (
         npm_build_goal
@@ -114,21 +193,258 @@ def _npm_compile(
             npm run build
         """
     )
-    shell_service.npm_cmd(npm_build_goal, cwd=npm_build_work_dir_path)
+    shell_service.npm_cmd(
+        npm_build_goal, cwd=npm_build_work_dir_path, is_stream_log=True
+    )
+
+
+def _compile_platform(
+    platform: Platform,
+    build_work_dir_path: str,
+    build_output_path: str,
+    goal_command: str,
+    is_use_private_libs: bool,
+    nuget_config_path: str,
+    settings_xml_path: str,
+    env_build_resource_dir: str,
+    is_build_daemon: bool = False,
+    build_daemon_state_dir: str = None,
+):
+    with trace_util.span(f"Compile {platform.value}"):
+        match platform:
+            case Platform.DOTNET:
+                _dotnet_compile(
+                    dotnet_build_work_dir_path=build_work_dir_path,
+                    dotnet_build_output_path=build_output_path,
+                    dotnet_goals=goal_command,
+                    is_use_private_libs=is_use_private_libs,
+                    nuget_config_path=nuget_config_path,
+                    is_build_daemon=is_build_daemon,
+                    build_daemon_state_dir=build_daemon_state_dir,
+                )
+            case Platform.MAVEN:
+                _maven_compile(
+                    maven_build_work_dir_path=build_work_dir_path,
+                    maven_build_output_path=build_output_path,
+                    maven_goals=goal_command,
+                    is_use_private_libs=is_use_private_libs,
+                    settings_xml_path=settings_xml_path,
+                    is_build_daemon=is_build_daemon,
+                    build_daemon_state_dir=build_daemon_state_dir,
+                )
+            case Platform.GRADLE:
+                _gradle_compile(
+                    gradle_build_work_dir_path=build_work_dir_path,
+                    gradle_build_output_path=build_output_path,
+                    gradle_tasks=goal_command,
+                    is_build_daemon=is_build_daemon,
+                    build_daemon_state_dir=build_daemon_state_dir,
+                )
+            case Platform.NPM:
+                _npm_compile(
+                    npm_build_work_dir_path=build_work_dir_path,
+                    npm_build_output_path=build_output_path,
+                    npm_install_goal=goal_command,
+                    env_build_resource_dir=env_build_resource_dir,
+                )
+            case _:
+                print("Do nothing.")
+
+
+def _build(
+    platform: Platform,
+    build_work_dir_path: str,
+    build_output_path: str,
+    goal_command: str,
+    env_vars,
+) -> dict:
+    """
+    Restores the build output from the build cache, or compiles it with the
+    dependency cache.
+    Returns:
+        dict: The dependency and build cache vars to expose.
+    """
+    is_use_private_libs = env_vars["is_use_private_libs"]
+    nuget_config_path = env_vars["nuget_config_path"]
+    settings_xml_path = env_vars["settings_xml_path"]
+    env_build_resource_dir = env_vars["env_build_resource_dir"]
+    build_cache_dir = env_vars["build_cache_dir"]
+    build_cache_max_bytes = env_vars["build_cache_max_bytes"]
+    io_copy_strategy = CopyStrategy(env_vars["io_copy_strategy"].upper())
+    dependency_cache_dir = env_vars["dependency_cache_dir"]
+    dependency_cache_max_bytes = env_vars["dependency_cache_max_bytes"]
+    dependency_cache_restore_strategy = CopyStrategy(
+        env_vars["dependency_cache_restore_strategy"].upper()
+    )
+    is_build_daemon = env_vars["is_build_daemon"]
+    build_daemon_state_dir = env_vars["build_daemon_state_dir"]
+
+    build_vars = {}
+    is_build_cache_hit = False
+    if build_cache_dir:
+        print("> Look up the build cache.")
+        with trace_util.span("Look up build cache") as build_cache_span:
+            toolchain_version = build_cache_service.get_toolchain_version(platform)
+            build_cache_key = build_cache_service.compute_key(
+                platform,
+                goal_command,
+                toolchain_version,
+                source_paths=[
+                    build_work_dir_path,
+                    env_build_resource_dir,
+                    settings_xml_path if is_use_private_libs else "",
+                    nuget_config_path if is_use_private_libs else "",
+                ],
+                excluded_paths=[build_output_path],
+            )
+            is_build_cache_hit = build_cache_service.restore(
+                build_cache_dir,
+                build_cache_key,
+                build_output_path,
+                strategy=io_copy_strategy,
+            )
+            build_cache_span.attrs["is_hit"] = is_build_cache_hit
+        print(
+            f"Build cache {'hit' if is_build_cache_hit else 'miss'}: {build_cache_key}."
+        )
+
+    if not is_build_cache_hit:
+        with dependency_cache_service.cached_dependencies(
+            dependency_cache_dir,
+            platform,
+            build_work_dir_path,
+            dependency_cache_max_bytes,
+            strategy=dependency_cache_restore_strategy,
+        ) as dependency_cache_status:
+            _compile_platform(
+                platform,
+                build_work_dir_path,
+                build_output_path,
+                goal_command,
+                is_use_private_libs,
+                nuget_config_path,
+                settings_xml_path,
+                env_build_resource_dir,
+                is_build_daemon=is_build_daemon,
+                build_daemon_state_dir=build_daemon_state_dir,
+            )
+        if dependency_cache_status is not None:
+            build_vars["dependency_cache_status"] = (
+                dependency_cache_status.value.lower()
+            )
+
+    if build_cache_dir:
+        eviction_stats = None
+        if not is_build_cache_hit and os.path.exists(build_output_path):
+            build_cache_service.save(
+                build_cache_dir,
+                build_cache_key,
+                platform,
+                build_output_path,
+                goal_command=goal_command,
+                toolchain_version=toolchain_version,
+            )
+            eviction_stats = build_cache_service.evict(
+                build_cache_dir, build_cache_max_bytes, keep_key=build_cache_key
+            )
+        build_cache_stats = build_cache_service.record_stats(
+            build_cache_dir, is_build_cache_hit, eviction_stats
+        )
+        build_vars.update(
+            {
+                "build_cache_status": "hit" if is_build_cache_hit else "miss",
+                "build_cache_key": build_cache_key,
+                "build_cache_hits": str(build_cache_stats.hits),
+                "build_cache_misses": str(build_cache_stats.misses),
+                "build_cache_hit_ratio": f"{build_cache_stats.hit_ratio:.2f}",
+                "build_cache_evicted_entries": str(build_cache_stats.evicted_entries),
+                "build_cache_size_bytes": str(build_cache_stats.size_bytes),
+            }
+        )
+    return build_vars
+
+
+def _compile_targets(env_vars):
+    """
+    Builds every target of BUILD_TARGETS_JSON concurrently, each from its own app
+    dir into its own output dir, and exposes FLOW_TARGET_BUILD_APP_DIR_<NAME>,
+    FLOW_TARGET_BUILD_OUTPUT_DIR_<NAME> and FLOW_TARGET_BUILD_LOG_PATH_<NAME>.
+    """
+    target_base_path = os.path.join(
+        env_vars["app_source_dir"], env_vars["target_sub_dir"]
+    )
+    targets = [
+        BuildTarget.from_dict(
+            target,
+            default_platform=env_vars["target_platform"],
+            default_build_output=env_vars["target_build_output"],
+        )
+        for target in json.loads(env_vars["build_targets_json"])
+    ]
+    for key in ["name", "build_output"]:
+        values = [getattr(target, key) for target in targets]
+        duplicate_values = sorted(
+            {value for value in values if values.count(value) > 1}
+        )
+        if duplicate_values:
+            raise ValueError(
+                f"Duplicate build target {key}s: {', '.join(duplicate_values)}."
+            )
+    platforms = {target.name: Platform(target.platform) for target in targets}
+    target_build_vars = {}
+
+    def build_target(target: BuildTarget):
+        # The vars are exposed once all targets are built, so the ##vso lines of
+        # concurrent targets never interleave.
+        target_build_vars[target.name] = _build(
+            platforms[target.name],
+            os.path.join(target_base_path, target.build_app),
+            os.path.join(target_base_path, target.build_output),
+            target.goal_command or env_vars["goal_command"],
+            env_vars,
+        )
+
+    build_log_dir = env_vars["build_log_dir"] or os.path.join(
+        target_base_path, "build_logs"
+    )
+    results = build_scheduler_service.run_targets(
+        targets,
+        build_target,
+        build_log_dir,
+        max_workers=env_vars["build_workers"] or None,
+    )
+
+    print("> Expose build target vars.")
+    build_target_vars = {}
+    for target in targets:
+        build_target_vars[f"target_build_app_dir_{target.name}"] = os.path.join(
+            target_base_path, target.build_app
+        )
+        build_target_vars[f"target_build_output_dir_{target.name}"] = os.path.join(
+            target_base_path, target.build_output
+        )
+        build_target_vars[f"target_build_log_path_{target.name}"] = results[
+            target.name
+        ].log_path
+        for key, value in target_build_vars.get(target.name, {}).items():
+            build_target_vars[f"{target.name}_{key}"] = value
+    ado_service.convert_to_ado_env_vars(build_target_vars, prefix_var="FLOW_")
 
 
 def compile():
     env_vars = _fetch_required_env_var()
+    if env_vars["build_targets_json"]:
+        _compile_targets(env_vars)
+        return
+
     target_sub_dir = env_vars["target_sub_dir"]
     target_platform = env_vars["target_platform"]
     app_source_dir = env_vars["app_source_dir"]
     target_build_app = env_vars["target_build_app"]
     target_build_output = env_vars["target_build_output"]
     goal_command = env_vars["goal_command"]
-    is_use_private_libs = env_vars["is_use_private_libs"]
-    nuget_config_path = env_vars["nuget_config_path"]
-    settings_xml_path = env_vars["settings_xml_path"]
-    env_build_resource_dir = env_vars["env_build_resource_dir"]
+    is_build_reusable = env_vars["is_build_reusable"]
+    artifact_entry_dir = env_vars["artifact_entry_dir"]
 
     build_work_dir_path = os.path.join(app_source_dir, target_sub_dir, target_build_app)
     build_output_path = os.path.join(
@@ -141,33 +457,27 @@ def compile():
     }
     ado_service.convert_to_ado_env_vars(expose_ado_env_vars, prefix_var="FLOW_")
 
-    platform = Platform(target_platform.upper())
-    match platform:
-        case Platform.DOTNET:
-            _dotnet_compile(
-                dotnet_build_work_dir_path=build_work_dir_path,
-                dotnet_build_output_path=build_output_path,
-                dotnet_goals=goal_command,
-                is_use_private_libs=is_use_private_libs,
-                nuget_config_path=nuget_config_path,
-            )
-        case Platform.MAVEN:
-            _maven_compile(
-                maven_build_work_dir_path=build_work_dir_path,
-                maven_build_output_path=build_output_path,
-                maven_goals=goal_command,
-                is_use_private_libs=is_use_private_libs,
-                settings_xml_path=settings_xml_path,
+    if is_build_reusable and artifact_entry_dir:
+        record = artifact_service.load_record(artifact_entry_dir)
+        if artifact_service.is_reusable(record):
+            print("> The build output of this commit is reusable, skip the compile.")
+            artifact_service.restore_artifact(
+                record.artifacts[artifact_service.BUILD_OUTPUT], build_output_path
             )
-        case Platform.NPM:
-            _npm_compile(
-                npm_build_work_dir_path=build_work_dir_path,
-                npm_build_output_path=build_output_path,
-                npm_install_goal=goal_command,
-                env_build_resource_dir=env_build_resource_dir,
-            )
-        case _:
-            print("Do nothing.")
+            return
+
+    platform = Platform(target_platform.upper())
+    build_vars = _build(
+        platform, build_work_dir_path, build_output_path, goal_command, env_vars
+    )
+    if build_vars:
+        print("> Expose build cache vars.")
+        ado_service.convert_to_ado_env_vars(build_vars, prefix_var="FLOW_")
+
+    if artifact_entry_dir and os.path.exists(build_output_path):
+        artifact_service.save_artifact(
+            artifact_entry_dir, artifact_service.BUILD_OUTPUT, build_output_path
+        )
 
 
 def execute():
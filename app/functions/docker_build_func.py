@@ -1,9 +1,15 @@
 import json
 import os
 
+from app.models.os_model import CopyStrategy
 from app.models.publisher_model import Publisher
-from app.services import ado_service, shell_service
-from app.utils import adapter_util, io_util
+from app.services import (
+    ado_service,
+    artifact_service,
+    session_service,
+    shell_service,
+)
+from app.utils import adapter_util, io_util, trace_util
 
 
 def _fetch_required_env_var():
@@ -23,18 +29,23 @@ def _fetch_required_env_var():
         "docker_server_username": os.getenv("DOCKER_SERVER_USERNAME"),
         "docker_server_password": os.getenv("DOCKER_SERVER_PASSWORD"),
         "docker_image_tag_target_env": os.getenv("DOCKER_IMAGE_TAG_TARGET_ENV"),
+        "is_build_reusable": adapter_util.getenv_bool("IS_BUILD_REUSABLE", False),
+        "artifact_entry_dir": os.getenv("ARTIFACT_ENTRY_DIR"),
+        "io_copy_strategy": os.getenv("IO_COPY_STRATEGY", "AUTO"),
+        "io_copy_workers": int(os.getenv("IO_COPY_WORKERS", io_util.COPY_WORKERS)),
+        "is_sync_delete": adapter_util.getenv_bool("IS_SYNC_DELETE", False),
+        "is_sync_compare_content": adapter_util.getenv_bool(
+            "IS_SYNC_COMPARE_CONTENT", False
+        ),
     }
     return env_vars
 
 
 def parse_publisher_file(publish_file_path: str) -> Publisher:
-    if os.path.exists(publish_file_path):
-        with open(publish_file_path, "r") as file:
-            publisher_dict = json.load(file)
-        return Publisher.from_json(publisher_dict)
-    else:
-        print(f"File does not exist: {publish_file_path}.")
-        raise FileNotFoundError(f"File does not exist: {publish_file_path}.")
+    """
+    Parses the publish file through the session cache of session_service.get_publisher.
+    """
+    return session_service.get_publisher(publish_file_path)
 
 
 def build_docker_image(
@@ -51,16 +62,22 @@ def build_docker_image(
 ):
     if docker_is_private_registry:
         print("> Docker login.")
-        shell_service.docker_login(
-            server_uri=docker_server_uri,
-            server_username=docker_server_username,
-            server_password=docker_server_password,
-            trace_cmd=True,
-            collect_log_types=[
-                shell_service.LogType.STDERR,
-                shell_service.LogType.STDOUT,
-            ],
-        )
+        with trace_util.span("Docker login"):
+            session_service.login_once(
+                "docker",
+                docker_server_uri,
+                docker_server_username,
+                lambda: shell_service.docker_login(
+                    server_uri=docker_server_uri,
+                    server_username=docker_server_username,
+                    server_password=docker_server_password,
+                    trace_cmd=True,
+                    collect_log_types=[
+                        shell_service.LogType.STDERR,
+                        shell_service.LogType.STDOUT,
+                    ],
+                ),
+            )
 
     print("> Start build the Docker image.")
     appended_args = []
@@ -75,23 +92,27 @@ def build_docker_image(
             for key, value in build_arg.items():
                 appended_args.extend(["--build-arg", f"{key}={value}"])
 
-    shell_service.docker_build(
-        docker_server_uri,
-        image_name,
-        tag,
-        build_context=build_context,
-        cwd=target_build_docker_path,
-        trace_cmd=True,
-        collect_log_types=[shell_service.LogType.STDERR],
-        container_args=appended_args,
-    )
+    with trace_util.span("Docker build"):
+        shell_service.docker_build(
+            docker_server_uri,
+            image_name,
+            tag,
+            build_context=build_context,
+            cwd=target_build_docker_path,
+            trace_cmd=True,
+            collect_log_types=[shell_service.LogType.STDERR],
+            is_stream_log=True,
+            container_args=appended_args,
+        )
 
-    shell_service.docker_push(
-        docker_server_uri,
-        image_name,
-        tag,
-        cwd=target_build_docker_path,
-    )
+    with trace_util.span("Docker push"):
+        shell_service.docker_push(
+            docker_server_uri,
+            image_name,
+            tag,
+            cwd=target_build_docker_path,
+            is_stream_log=True,
+        )
 
 
 def execute():
@@ -109,13 +130,34 @@ def execute():
     docker_server_username = env_vars["docker_server_username"]
     docker_server_password = env_vars["docker_server_password"]
     docker_image_tag_target_env = env_vars["docker_image_tag_target_env"]
+    is_build_reusable = env_vars["is_build_reusable"]
+    artifact_entry_dir = env_vars["artifact_entry_dir"]
+    io_copy_strategy = CopyStrategy(env_vars["io_copy_strategy"].upper())
+    io_copy_workers = env_vars["io_copy_workers"]
+    is_sync_delete = env_vars["is_sync_delete"]
+    is_sync_compare_content = env_vars["is_sync_compare_content"]
 
     target_docker_resource_path = (
         f"{docker_resource_work_dir}/{docker_target_dockerfile}"
     )
 
+    record = (
+        artifact_service.load_record(artifact_entry_dir)
+        if is_build_reusable and artifact_entry_dir
+        else None
+    )
+    is_reused = artifact_service.is_reusable(record)
+    if is_reused:
+        # The publish file of this run carries a new image tag that was never
+        # pushed, the recorded one names the image built for this commit.
+        print("> Restore the publish file of the reusable build.")
+        artifact_service.restore_artifact(
+            record.artifacts[artifact_service.PUBLISH_FILE], publisher_file_path
+        )
+        os.utime(publisher_file_path)
+
     print("> Extract required data from publish file.")
-    publisher = parse_publisher_file(publisher_file_path)
+    publisher = session_service.get_publisher(publisher_file_path)
 
     image_name = publisher.image_name
     is_image_tag_based_on_env = publisher.is_image_tag_based_on_env
@@ -126,22 +168,37 @@ def execute():
     else:
         image_tag = publisher.image_tags.base
 
+    if is_reused:
+        print(f"> Image {image_name}:{image_tag} of this commit exists, skip build.")
+        ado_service.add_tag_on_pipeline(
+            [f"image_name={image_name}", f"image_tag={image_tag}"]
+        )
+        return
+
     print("> Prepare resources to build Docker image.")
     print(f"Target build output path: {target_build_output_path}")
     print(f"Target build Docker path: {target_build_docker_path}")
     print(f"Target Docker resource path: {target_docker_resource_path}")
 
-    print(
-        f"Verify content of target docker resource path: {target_docker_resource_path}"
-    )
-    shell_service.tree(target_docker_resource_path)
-    print(
-        "Copy content of target docker resource and build output to target build docker path"
-    )
-    io_util.cp(target_build_output_path, target_build_docker_path)
-    io_util.cp(target_docker_resource_path, target_build_docker_path)
-    print(f"Verify content of target build docker path: {target_build_docker_path}")
-    shell_service.tree(target_build_docker_path)
+    with trace_util.span("Prepare resources to build Docker image"):
+        print(
+            f"Verify content of target docker resource path: {target_docker_resource_path}"
+        )
+        shell_service.tree(target_docker_resource_path)
+        print(
+            "Sync content of target docker resource and build output to target build docker path"
+        )
+        for source_path in [target_build_output_path, target_docker_resource_path]:
+            io_util.sync(
+                source_path,
+                target_build_docker_path,
+                is_compare_content=is_sync_compare_content,
+                is_delete=is_sync_delete,
+                strategy=io_copy_strategy,
+                workers=io_copy_workers,
+            )
+        print(f"Verify content of target build docker path: {target_build_docker_path}")
+        shell_service.tree(target_build_docker_path)
 
     build_docker_image(
         image_name=image_name,
@@ -155,5 +212,10 @@ def execute():
         target_build_docker_path=target_build_docker_path,
     )
 
+    if artifact_entry_dir:
+        artifact_service.save_artifact(
+            artifact_entry_dir, artifact_service.PUBLISH_FILE, publisher_file_path
+        )
+
     print("> Add tag on pipeline.")
     ado_service.add_tag_on_pipeline([f"image_name={image_name}", f"image_tag={image_tag}"])
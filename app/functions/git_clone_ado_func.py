@@ -1,7 +1,14 @@
+import contextvars
+import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
-from app.services import ado_service, git_service, shell_service
-from app.utils import adapter_util
+from app.models.git_model import GitCloneStrategy, GitRepoSpec
+from app.models.os_model import ArchiveCodec
+from app.services import ado_service, artifact_service, git_service, trash_service
+from app.utils import adapter_util, archive_util, trace_util
 
 
 def _fetch_required_env_var():
@@ -14,33 +21,227 @@ def _fetch_required_env_var():
         "git_username": os.getenv("GIT_USERNAME"),
         "git_token": os.getenv("GIT_TOKEN"),
         "archive_path": os.getenv("ARCHIVE_PATH", os.getcwd()),
+        "archive_codec": os.getenv("ARCHIVE_CODEC", "DEFLATE"),
+        "archive_compress_level": int(os.getenv("ARCHIVE_COMPRESS_LEVEL", 6)),
+        "archive_workers": int(os.getenv("ARCHIVE_WORKERS", os.cpu_count() or 1)),
+        "archive_source": os.getenv("ARCHIVE_SOURCE", "WORKTREE"),
+        "archive_paths_json": os.getenv("ARCHIVE_PATHS_JSON"),
+        "is_skip_checkout": adapter_util.getenv_bool("IS_SKIP_CHECKOUT", False),
+        "git_clone_strategy": os.getenv("GIT_CLONE_STRATEGY", "SHALLOW"),
+        "git_clone_depth": int(os.getenv("GIT_CLONE_DEPTH", 1)),
+        "target_sub_dir": os.getenv("TARGET_SUB_DIR", ""),
+        "is_sparse_checkout": adapter_util.getenv_bool("IS_SPARSE_CHECKOUT", False),
+        "sparse_checkout_dirs_json": os.getenv("SPARSE_CHECKOUT_DIRS_JSON"),
+        "artifact_index_dir": os.getenv("ARTIFACT_INDEX_DIR"),
+        "git_mirror_cache_dir": os.getenv("GIT_MIRROR_CACHE_DIR"),
+        "git_mirror_cache_max_bytes": int(
+            os.getenv("GIT_MIRROR_CACHE_MAX_BYTES", 20 * 1024**3)
+        ),
+        "git_repos_json": os.getenv("GIT_REPOS_JSON"),
+        "git_clone_workers": int(os.getenv("GIT_CLONE_WORKERS", 4)),
+        "is_background_delete": adapter_util.getenv_bool("IS_BACKGROUND_DELETE", False),
     }
     return env_vars
 
 
+def _reuse_build(record, artifact_entry_dir, archive_path):
+    """
+    Restores the archive of an already built commit and exposes the recorded
+    outputs, so the clone, compile and docker stages can skip their work.
+    """
+    reused_archive_path = os.path.join(
+        archive_path, os.path.basename(record.artifacts[artifact_service.ARCHIVE])
+    )
+    artifact_service.restore_artifact(
+        record.artifacts[artifact_service.ARCHIVE], reused_archive_path
+    )
+
+    print("> Expose git vars and reusable build outputs.")
+    reusable_build_vars = {
+        "git_commit_id": record.git_commit_id,
+        "git_short_commit_id": record.git_commit_id[:8],
+        "is_build_reusable": "true",
+        "artifact_entry_dir": artifact_entry_dir,
+        "reusable_archive_path": reused_archive_path,
+        "reusable_build_output_dir": record.artifacts[artifact_service.BUILD_OUTPUT],
+        "reusable_publish_file_path": record.artifacts[artifact_service.PUBLISH_FILE],
+    }
+    ado_service.convert_to_ado_env_vars(reusable_build_vars, prefix_var="FLOW_")
+
+
+def _get_repo_specs(env_vars) -> List[GitRepoSpec]:
+    """
+    Returns the repositories to clone: those of GIT_REPOS_JSON, the first one being
+    the app source, or the single repository of GIT_URL and APP_SOURCE.
+    """
+    if not env_vars["git_repos_json"]:
+        return [
+            GitRepoSpec.from_dict(
+                {"url": env_vars["git_url"], "destination": env_vars["app_source"]},
+                env_vars["git_branch"],
+                env_vars["is_private_repo"],
+            )
+        ]
+
+    repo_specs = [
+        GitRepoSpec.from_dict(repo, env_vars["git_branch"], env_vars["is_private_repo"])
+        for repo in json.loads(env_vars["git_repos_json"])
+    ]
+    if not repo_specs:
+        raise ValueError("GIT_REPOS_JSON lists no repository.")
+    names = [repo_spec.name for repo_spec in repo_specs]
+    duplicate_names = sorted({name for name in names if names.count(name) > 1})
+    if duplicate_names:
+        raise ValueError(f"Duplicate repository names: {', '.join(duplicate_names)}.")
+    return repo_specs
+
+
+def _get_entry_dir(env_vars, repo_specs: List[GitRepoSpec], git_commit_ids: List[str]):
+    return artifact_service.get_entry_dir(
+        env_vars["artifact_index_dir"],
+        repo_specs[0].git_url,
+        git_commit_ids[0],
+        env_vars["target_sub_dir"],
+        other_commits=[
+            (repo_spec.git_url, git_commit_id)
+            for repo_spec, git_commit_id in zip(repo_specs[1:], git_commit_ids[1:])
+        ],
+    )
+
+
+def _resolve_remote_commits(env_vars, repo_specs: List[GitRepoSpec]) -> List[str]:
+    """
+    Resolves the branch of every repository to a commit, or returns None when a
+    branch does not exist on its remote.
+    """
+    git_commit_ids = []
+    for repo_spec in repo_specs:
+        credential_url = git_service.get_credential_url(
+            repo_spec.git_url,
+            repo_spec.is_private_repo,
+            env_vars["git_username"],
+            env_vars["git_token"],
+        )
+        remote_commit_id = artifact_service.resolve_remote_commit(
+            credential_url, repo_spec.git_branch
+        )
+        if not remote_commit_id:
+            return None
+        print(f"Remote commit of {repo_spec.git_branch}: {remote_commit_id}.")
+        git_commit_ids.append(remote_commit_id)
+    return git_commit_ids
+
+
+def _clone_repos(env_vars, repo_specs: List[GitRepoSpec], **app_source_kwargs):
+    """
+    Clones every repository concurrently, each into its own destination under
+    APP_SOURCE_PREFIX_PATH. `app_source_kwargs` are passed to the clone of the
+    first repository, the app source, only.
+    Returns:
+        List[dict]: The clone result of every repository, in order.
+    """
+
+    def clone_repo(repo_spec: GitRepoSpec, clone_kwargs):
+        with trace_util.span(f"Clone {repo_spec.name}", git_url=repo_spec.git_url):
+            return git_service.clone(
+                env_vars["app_source_prefix_path"],
+                repo_spec.app_source,
+                repo_spec.is_private_repo,
+                repo_spec.git_branch,
+                repo_spec.git_url,
+                env_vars["git_username"],
+                env_vars["git_token"],
+                clone_strategy=GitCloneStrategy(env_vars["git_clone_strategy"].upper()),
+                clone_depth=env_vars["git_clone_depth"],
+                mirror_cache_dir=env_vars["git_mirror_cache_dir"],
+                mirror_cache_max_bytes=env_vars["git_mirror_cache_max_bytes"],
+                is_background_delete=env_vars["is_background_delete"],
+                **clone_kwargs,
+            )
+
+    max_workers = max(1, min(env_vars["git_clone_workers"], len(repo_specs)))
+    if len(repo_specs) > 1:
+        print(f"> Clone {len(repo_specs)} repositories with {max_workers} workers.")
+    with trace_util.span("Clone app source"):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    clone_repo,
+                    repo_spec,
+                    app_source_kwargs if index == 0 else {},
+                )
+                for index, repo_spec in enumerate(repo_specs)
+            ]
+            return [future.result() for future in futures]
+
+
+def _expose_repo_git_vars(repo_specs: List[GitRepoSpec], git_commit_ids: List[str]):
+    """
+    Exposes the commit of every repository of GIT_REPOS_JSON as
+    FLOW_<NAME>_GIT_COMMIT_ID and FLOW_<NAME>_GIT_SHORT_COMMIT_ID.
+    """
+    git_vars = {}
+    for repo_spec, git_commit_id in zip(repo_specs, git_commit_ids):
+        git_vars[f"{repo_spec.name}_git_commit_id"] = git_commit_id
+        git_vars[f"{repo_spec.name}_git_short_commit_id"] = git_commit_id[:8]
+    ado_service.convert_to_ado_env_vars(git_vars, prefix_var="FLOW_")
+
+
 def execute():
     env_vars = _fetch_required_env_var()
+    repo_specs = _get_repo_specs(env_vars)
+    is_multi_repo = len(repo_specs) > 1
+
     app_source_prefix_path = env_vars["app_source_prefix_path"]
-    app_source = env_vars["app_source"]
-    is_private_repo = env_vars["is_private_repo"]
-    git_branch = env_vars["git_branch"]
-    git_url = env_vars["git_url"]
-    git_username = env_vars["git_username"]
-    git_token = env_vars["git_token"]
+    app_source = repo_specs[0].app_source
+    git_url = repo_specs[0].git_url
     archive_path = env_vars["archive_path"]
+    archive_codec = ArchiveCodec(env_vars["archive_codec"].upper())
+    archive_compress_level = env_vars["archive_compress_level"]
+    archive_workers = env_vars["archive_workers"]
+    is_archive_from_git = env_vars["archive_source"].upper() == "GIT"
+    archive_paths_json = env_vars["archive_paths_json"]
+    is_skip_checkout = env_vars["is_skip_checkout"] and is_archive_from_git
+    target_sub_dir = env_vars["target_sub_dir"]
+    artifact_index_dir = env_vars["artifact_index_dir"]
+    is_sparse_checkout = env_vars["is_sparse_checkout"]
+    sparse_checkout_dirs_json = env_vars["sparse_checkout_dirs_json"]
+    is_background_delete = env_vars["is_background_delete"]
+
+    sparse_checkout_dirs = None
+    if is_sparse_checkout:
+        if sparse_checkout_dirs_json:
+            sparse_checkout_dirs = json.loads(sparse_checkout_dirs_json)
+        else:
+            sparse_checkout_dirs = [target_sub_dir] if target_sub_dir else None
 
-    git_clone_result = git_service.clone(
-        app_source_prefix_path,
-        app_source,
-        is_private_repo,
-        git_branch,
-        git_url,
-        git_username,
-        git_token,
+    if artifact_index_dir:
+        print("> Look up the artifact index.")
+        remote_commit_ids = _resolve_remote_commits(env_vars, repo_specs)
+        if remote_commit_ids:
+            artifact_entry_dir = _get_entry_dir(env_vars, repo_specs, remote_commit_ids)
+            record = artifact_service.load_record(artifact_entry_dir)
+            if artifact_service.is_reusable(record):
+                print("> The build of this commit is reusable, skip the clone.")
+                _reuse_build(record, artifact_entry_dir, archive_path)
+                if is_multi_repo:
+                    _expose_repo_git_vars(repo_specs, remote_commit_ids)
+                return
+
+    git_clone_results = _clone_repos(
+        env_vars,
+        repo_specs,
+        sparse_checkout_dirs=sparse_checkout_dirs,
+        is_delete_git_dir=not is_archive_from_git,
+        is_skip_checkout=is_skip_checkout,
     )
+    git_commit_ids = [
+        git_clone_result["git_commit_id"] for git_clone_result in git_clone_results
+    ]
 
-    git_commit_id = git_clone_result["git_commit_id"]
-    git_short_commit_id = git_clone_result["git_short_commit_id"]
+    git_commit_id = git_clone_results[0]["git_commit_id"]
+    git_short_commit_id = git_clone_results[0]["git_short_commit_id"]
     # git_clone_result_list = [
     #     {"git_commit_id": git_commit_id},
     #     {"git_short_commit_id": git_short_commit_id},
@@ -52,7 +253,63 @@ def execute():
         "git_short_commit_id": git_short_commit_id,
     }
     ado_service.convert_to_ado_env_vars(git_clone_result, prefix_var="FLOW_")
+    if is_multi_repo:
+        _expose_repo_git_vars(repo_specs, git_commit_ids)
 
     print("> Archive the app source.")
-    archive_path = os.path.join(archive_path, f"{app_source}.zip")
-    shell_service.zip(archive_path, app_source)
+    app_source_path = os.path.join(app_source_prefix_path, app_source)
+    # The next stages extract a ZSTD archive with the zstandard module, whichever
+    # tool wrote it.
+    archive_codec = archive_util.resolve_codec(archive_codec)
+    if (
+        is_archive_from_git
+        and archive_codec == ArchiveCodec.ZSTD
+        and shutil.which("zstd") is None
+    ):
+        print("Command zstd is not installed, fall back to DEFLATE.")
+        archive_codec = ArchiveCodec.DEFLATE
+
+    archive_extension = archive_util.get_archive_extension(archive_codec)
+    archive_path = os.path.join(archive_path, f"{app_source}{archive_extension}")
+    with trace_util.span("Archive the app source") as archive_span:
+        if is_archive_from_git:
+            archive_stats = git_service.archive(
+                app_source_path,
+                archive_path,
+                prefix=app_source,
+                codec=archive_codec,
+                level=archive_compress_level,
+                paths=json.loads(archive_paths_json) if archive_paths_json else None,
+            )
+            print("> Remove .git directory.\n")
+            trash_service.delete_path(
+                os.path.join(app_source_path, ".git"),
+                trash_dir=os.path.join(
+                    app_source_prefix_path, trash_service.TRASH_DIR_NAME
+                ),
+                is_background=is_background_delete,
+            )
+        else:
+            archive_stats = archive_util.create_archive(
+                app_source_path,
+                archive_path,
+                codec=archive_codec,
+                level=archive_compress_level,
+                workers=archive_workers,
+            )
+        archive_span.attrs.update(archive_stats.to_dict())
+
+    if artifact_index_dir:
+        artifact_entry_dir = _get_entry_dir(env_vars, repo_specs, git_commit_ids)
+        artifact_service.save_artifact(
+            artifact_entry_dir,
+            artifact_service.ARCHIVE,
+            archive_path,
+            git_url=git_url,
+            git_commit_id=git_commit_id,
+            target_sub_dir=target_sub_dir,
+        )
+        ado_service.convert_to_ado_env_vars(
+            {"is_build_reusable": "false", "artifact_entry_dir": artifact_entry_dir},
+            prefix_var="FLOW_",
+        )
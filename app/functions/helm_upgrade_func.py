@@ -1,11 +1,10 @@
 import base64
-import json
 import os
 from typing import List
 
-from app.models.publisher_model import Publisher
-from app.services import ado_service, shell_service
-from app.utils import adapter_util, io_util
+from app.models.os_model import CopyStrategy
+from app.services import ado_service, session_service, shell_service
+from app.utils import adapter_util, io_util, trace_util
 
 
 def _fetch_required_env_var():
@@ -29,11 +28,17 @@ def _fetch_required_env_var():
         "is_scan_azure_secrets_vault": adapter_util.getenv_bool(
             "IS_SCAN_AZURE_SECRETS_VAULT", True
         ),
+        "io_copy_strategy": os.getenv("IO_COPY_STRATEGY", "AUTO"),
     }
     return env_vars
 
 
-def _prepare_resources_to_upgrade(helm_chart_path, k8s_resources_path, environment):
+def _prepare_resources_to_upgrade(
+    helm_chart_path,
+    k8s_resources_path,
+    environment,
+    io_copy_strategy: CopyStrategy = CopyStrategy.AUTO,
+):
     configmap_path = f"{helm_chart_path}/resources/configmap"
     secret_path = f"{helm_chart_path}/resources/secret"
     base_configmap = f"{k8s_resources_path}/base/configmap/."
@@ -50,11 +55,12 @@ def _prepare_resources_to_upgrade(helm_chart_path, k8s_resources_path, environme
         collect_log_types=[shell_service.LogType.STDOUT, shell_service.LogType.STDERR],
     )
 
-    print("Copy resources to corresponding locations.")
-    io_util.cp(base_configmap, configmap_path)
-    io_util.cp(base_secret, secret_path)
-    io_util.cp(target_env_configmap, configmap_path)
-    io_util.cp(target_env_secret, secret_path)
+    # The env resources are overlaid on the base ones, so nothing is deleted.
+    print("Sync resources to corresponding locations.")
+    io_util.sync(base_configmap, configmap_path, strategy=io_copy_strategy)
+    io_util.sync(base_secret, secret_path, strategy=io_copy_strategy)
+    io_util.sync(target_env_configmap, configmap_path, strategy=io_copy_strategy)
+    io_util.sync(target_env_secret, secret_path, strategy=io_copy_strategy)
 
     print("Verify content of the helm chart.")
     shell_service.tree(
@@ -74,7 +80,7 @@ def _helm_upgrade(
     append_helm_args: List = None,
 ):
     additional_args = [
-        f"--set {helm_arg}" for helm_arg in append_helm_args if helm_arg is not None
+        helm_arg for helm_arg in append_helm_args if helm_arg is not None
     ]
 
     shell_service.helm_upgrade(
@@ -89,6 +95,7 @@ def _helm_upgrade(
         cwd=helm_chart_path,
         trace_cmd=True,
         collect_log_types=[shell_service.LogType.STDOUT, shell_service.LogType.STDERR],
+        is_stream_log=True,
     )
 
 
@@ -109,15 +116,11 @@ def execute():
     helm_server_password = env_vars["helm_server_password"]
     is_transform_env_name = env_vars["is_transform_env_name"]
     is_scan_azure_secrets_vault = env_vars["is_scan_azure_secrets_vault"]
+    io_copy_strategy = CopyStrategy(env_vars["io_copy_strategy"].upper())
 
     environment = environment.lower()
     print("> Validate publish file.")
-    if os.path.exists(publish_file_path):
-        with open(publish_file_path, "r") as file:
-            publisher_dict = json.load(file)
-            publisher = Publisher.from_json(publisher_dict)
-    else:
-        print(f"File does not exist: {publish_file_path}.")
+    publisher = session_service.get_publisher(publish_file_path)
 
     app_resources_path = os.path.join(project_path, app_resources)
     k8s_resources_path = os.path.join(project_path, k8s_resources)
@@ -195,21 +198,34 @@ def execute():
         image_tag = publisher.image_tags.base
 
     print("> Helm login registry server.")
-    shell_service.helm_registry_login(
-        helm_server_uri,
-        helm_server_username,
-        helm_server_password,
-        collect_log_types=[shell_service.LogType.STDOUT, shell_service.LogType.STDERR],
-    )
+    with trace_util.span("Helm login registry server"):
+        session_service.login_once(
+            "helm",
+            helm_server_uri,
+            helm_server_username,
+            lambda: shell_service.helm_registry_login(
+                helm_server_uri,
+                helm_server_username,
+                helm_server_password,
+                collect_log_types=[
+                    shell_service.LogType.STDOUT,
+                    shell_service.LogType.STDERR,
+                ],
+            ),
+        )
 
     print("> Helm pull chart.")
-    shell_service.helm_pull(
-        helm_server_uri,
-        helm_chart_name,
-        helm_chart_version,
-        cwd=deployment_work_dir,
-        collect_log_types=[shell_service.LogType.STDOUT, shell_service.LogType.STDERR],
-    )
+    with trace_util.span("Helm pull chart"):
+        shell_service.helm_pull(
+            helm_server_uri,
+            helm_chart_name,
+            helm_chart_version,
+            cwd=deployment_work_dir,
+            collect_log_types=[
+                shell_service.LogType.STDOUT,
+                shell_service.LogType.STDERR,
+            ],
+        )
 
     shell_service.tree(deployment_work_dir)
 
@@ -222,24 +238,27 @@ def execute():
     os.environ["KUBECONFIG"] = os.path.abspath(config_file_path)
 
     helm_chart_path = os.path.join(deployment_work_dir, helm_chart_name)
-    _prepare_resources_to_upgrade(
-        helm_chart_path=helm_chart_path,
-        k8s_resources_path=k8s_resources_path,
-        environment=environment,
-    )
+    with trace_util.span("Prepare resources to upgrade"):
+        _prepare_resources_to_upgrade(
+            helm_chart_path=helm_chart_path,
+            k8s_resources_path=k8s_resources_path,
+            environment=environment,
+            io_copy_strategy=io_copy_strategy,
+        )
 
     appended_common_env_vars.extend(appended_secret_env_vars)
     append_helm_args = appended_common_env_vars
-    _helm_upgrade(
-        project_name,
-        helm_chart_path,
-        helm_chart_values_base_file_path,
-        helm_chart_values_target_env_file_path,
-        docker_server_uri=docker_server_uri,
-        image_name=image_name,
-        image_tag=image_tag,
-        append_helm_args=append_helm_args,
-    )
+    with trace_util.span("Helm upgrade"):
+        _helm_upgrade(
+            project_name,
+            helm_chart_path,
+            helm_chart_values_base_file_path,
+            helm_chart_values_target_env_file_path,
+            docker_server_uri=docker_server_uri,
+            image_name=image_name,
+            image_tag=image_tag,
+            append_helm_args=append_helm_args,
+        )
 
     ado_service.add_tag_on_pipeline(
         tags=[
@@ -3,6 +3,7 @@ import textwrap
 
 from app.models.pipeline_model import PipelineStage
 from app.services import ado_service, shell_service
+from app.utils import trace_util
 
 
 def _fetch_required_env_var():
@@ -142,32 +143,33 @@ def execute():
 
     stage = PipelineStage.from_string(stage_name)
 
-    match stage:
-        case PipelineStage.BOOTSTRAP:
-            _set_up_bootstrap_stage(
-                bootstrap_base_dir, bootstrap_section=bootstrap_section
-            )
-        case PipelineStage.BUILD:
-            _set_up_build_stage(
-                app_source,
-                target_sub_dir=target_sub_dir,
-                build_base_dir=build_base_dir,
-                build_section=build_section,
-                build_app=build_app,
-                build_docker=build_docker,
-                target_build_app=target_build_app,
-                target_build_output=target_build_output,
-            )
-        case PipelineStage.UNIT_TEST:
-            _set_up_unit_test_stage(
-                app_source,
-                unit_test_base_dir,
-                unit_test_section=unit_test_section,
-                target_unit_test_app=target_unit_test_app,
-                target_unit_test_output=target_unit_test_output,
-            )
-        case PipelineStage.DEPLOYMENT:
-            _set_up_deployment_stage(
-                deployment_base_dir,
-                deployment_section=deployment_section,
-            )
+    with trace_util.span(f"Set up {stage.value.name} stage"):
+        match stage:
+            case PipelineStage.BOOTSTRAP:
+                _set_up_bootstrap_stage(
+                    bootstrap_base_dir, bootstrap_section=bootstrap_section
+                )
+            case PipelineStage.BUILD:
+                _set_up_build_stage(
+                    app_source,
+                    target_sub_dir=target_sub_dir,
+                    build_base_dir=build_base_dir,
+                    build_section=build_section,
+                    build_app=build_app,
+                    build_docker=build_docker,
+                    target_build_app=target_build_app,
+                    target_build_output=target_build_output,
+                )
+            case PipelineStage.UNIT_TEST:
+                _set_up_unit_test_stage(
+                    app_source,
+                    unit_test_base_dir,
+                    unit_test_section=unit_test_section,
+                    target_unit_test_app=target_unit_test_app,
+                    target_unit_test_output=target_unit_test_output,
+                )
+            case PipelineStage.DEPLOYMENT:
+                _set_up_deployment_stage(
+                    deployment_base_dir,
+                    deployment_section=deployment_section,
+                )
@@ -1,8 +1,14 @@
 import os
 
+from app.models.os_model import CopyStrategy
 from app.models.platform_model import Platform
-from app.services import ado_service, shell_service
-from app.utils import adapter_util, io_util
+from app.services import (
+    ado_service,
+    build_daemon_service,
+    dependency_cache_service,
+    shell_service,
+)
+from app.utils import adapter_util, io_util, trace_util
 
 
 def _fetch_required_env_var():
@@ -22,6 +28,15 @@ def _fetch_required_env_var():
         "venv_path": os.getenv("VENV_PATH", ""),
         "venv_name": os.getenv("VENV_NAME", "unit-test"),
         "requirements_txt_path": os.getenv("REQUIREMENTS_TXT_PATH"),
+        "dependency_cache_dir": os.getenv("DEPENDENCY_CACHE_DIR"),
+        "dependency_cache_max_bytes": int(
+            os.getenv("DEPENDENCY_CACHE_MAX_BYTES", 20 * 1024**3)
+        ),
+        "dependency_cache_restore_strategy": os.getenv(
+            "DEPENDENCY_CACHE_RESTORE_STRATEGY", "AUTO"
+        ),
+        "is_build_daemon": adapter_util.getenv_bool("IS_BUILD_DAEMON", False),
+        "build_daemon_state_dir": os.getenv("BUILD_DAEMON_STATE_DIR"),
     }
     return env_vars
 
@@ -32,6 +47,8 @@ def _maven_run_unit_test(
     goal_command: str,
     is_use_private_libs: bool,
     settings_xml_path: str = None,
+    is_build_daemon: bool = False,
+    build_daemon_state_dir: str = None,
 ):
     if is_use_private_libs:
         m2_home = os.path.expanduser("~/.m2")
@@ -50,12 +67,19 @@ def _maven_run_unit_test(
         """
     )
 
-    shell_service.execute_cmd(
-        cmd=goal_command,
-        cwd=work_dir_path,
-        trace_cmd=True,
-        collect_log_types=[shell_service.LogType.STDOUT, shell_service.LogType.STDERR],
-    )
+    with build_daemon_service.build_cmd(
+        Platform.MAVEN, goal_command, is_build_daemon, build_daemon_state_dir
+    ) as goal_command:
+        shell_service.execute_cmd(
+            cmd=goal_command,
+            cwd=work_dir_path,
+            trace_cmd=True,
+            collect_log_types=[
+                shell_service.LogType.STDOUT,
+                shell_service.LogType.STDERR,
+            ],
+            is_stream_log=True,
+        )
 
 
 def _dotnet_run_unit_test(
@@ -64,6 +88,8 @@ def _dotnet_run_unit_test(
     goal_command: str,
     is_use_private_libs: bool,
     nuget_config_path: str = None,
+    is_build_daemon: bool = False,
+    build_daemon_state_dir: str = None,
 ):
     if is_use_private_libs:
         nuget_home = os.path.expanduser("~/.nuget/NuGet")
@@ -84,16 +110,52 @@ def _dotnet_run_unit_test(
         """
     )
 
-    shell_service.execute_cmd(
-        cmd=goal_command,
-        cwd=work_dir_path,
-        trace_cmd=True,
-        collect_log_types=[shell_service.LogType.STDOUT, shell_service.LogType.STDERR],
-    )
+    with build_daemon_service.build_cmd(
+        Platform.DOTNET, goal_command, is_build_daemon, build_daemon_state_dir
+    ) as goal_command:
+        shell_service.execute_cmd(
+            cmd=goal_command,
+            cwd=work_dir_path,
+            trace_cmd=True,
+            collect_log_types=[
+                shell_service.LogType.STDOUT,
+                shell_service.LogType.STDERR,
+            ],
+            is_stream_log=True,
+        )
 
     shell_service.tree(path=work_dir_path)
 
 
+def _gradle_run_unit_test(
+    work_dir_path: str,
+    output_path: str,
+    goal_command: str,
+    is_build_daemon: bool = False,
+    build_daemon_state_dir: str = None,
+):
+    goal_command = (
+        goal_command
+        or """
+            gradle test
+        """
+    )
+
+    with build_daemon_service.build_cmd(
+        Platform.GRADLE, goal_command, is_build_daemon, build_daemon_state_dir
+    ) as goal_command:
+        shell_service.execute_cmd(
+            cmd=goal_command,
+            cwd=work_dir_path,
+            trace_cmd=True,
+            collect_log_types=[
+                shell_service.LogType.STDOUT,
+                shell_service.LogType.STDERR,
+            ],
+            is_stream_log=True,
+        )
+
+
 def _python_run_unit_test(
     work_dir_path: str,
     output_path: str,
@@ -111,7 +173,9 @@ def _python_run_unit_test(
         )
 
     shell_service.conda_run_install_libs(
-        venv_name=venv_name, requirements_txt_path=requirements_txt_path
+        venv_name=venv_name,
+        requirements_txt_path=requirements_txt_path,
+        is_stream_log=True,
     )
 
     goal_command = (
@@ -121,7 +185,9 @@ def _python_run_unit_test(
         """.format(work_dir=work_dir_path, output_path=output_path)
     )
 
-    shell_service.conda_run_with_goal(venv_name=venv_name, goal_cmd=goal_command)
+    shell_service.conda_run_with_goal(
+        venv_name=venv_name, goal_cmd=goal_command, is_stream_log=True
+    )
 
 
 def execute():
@@ -139,6 +205,13 @@ def execute():
     venv_path = env_vars["venv_path"]
     venv_name = env_vars["venv_name"]
     requirements_txt_path = env_vars["requirements_txt_path"]
+    dependency_cache_dir = env_vars["dependency_cache_dir"]
+    dependency_cache_max_bytes = env_vars["dependency_cache_max_bytes"]
+    dependency_cache_restore_strategy = CopyStrategy(
+        env_vars["dependency_cache_restore_strategy"].upper()
+    )
+    is_build_daemon = env_vars["is_build_daemon"]
+    build_daemon_state_dir = env_vars["build_daemon_state_dir"]
 
     work_dir_path = os.path.join(app_source_dir, target_sub_dir, target_unit_test_app)
     output_path = os.path.join(app_source_dir, target_sub_dir, target_unit_test_output)
@@ -150,31 +223,60 @@ def execute():
     ado_service.convert_to_ado_env_vars(expose_ado_env_vars, prefix_var="FLOW_")
 
     platform = Platform(picked_platform.upper())
-    match platform:
-        case Platform.MAVEN:
-            _maven_run_unit_test(
-                work_dir_path=work_dir_path,
-                output_path=output_path,
-                goal_command=goal_command,
-                is_use_private_libs=is_use_private_libs,
-                settings_xml_path=settings_xml_path,
-            )
-        case Platform.DOTNET:
-            _dotnet_run_unit_test(
-                work_dir_path=work_dir_path,
-                output_path=output_path,
-                goal_command=goal_command,
-                is_use_private_libs=is_use_private_libs,
-                nuget_config_path=nuget_config_path,
-            )
-        case Platform.PYTHON:
-            _python_run_unit_test(
-                work_dir_path=work_dir_path,
-                output_path=output_path,
-                goal_command=goal_command,
-                is_use_private_libs=is_use_private_libs,
-                pip_config_path=pip_config_path,
-                venv_path=venv_path,
-                venv_name=venv_name,
-                requirements_txt_path=requirements_txt_path,
-            )
+    with (
+        dependency_cache_service.cached_dependencies(
+            dependency_cache_dir,
+            platform,
+            work_dir_path,
+            dependency_cache_max_bytes,
+            strategy=dependency_cache_restore_strategy,
+            extra_lockfile_paths=[requirements_txt_path],
+        ) as dependency_cache_status,
+        trace_util.span(f"Run unit test {platform.value}"),
+    ):
+        match platform:
+            case Platform.MAVEN:
+                _maven_run_unit_test(
+                    work_dir_path=work_dir_path,
+                    output_path=output_path,
+                    goal_command=goal_command,
+                    is_use_private_libs=is_use_private_libs,
+                    settings_xml_path=settings_xml_path,
+                    is_build_daemon=is_build_daemon,
+                    build_daemon_state_dir=build_daemon_state_dir,
+                )
+            case Platform.DOTNET:
+                _dotnet_run_unit_test(
+                    work_dir_path=work_dir_path,
+                    output_path=output_path,
+                    goal_command=goal_command,
+                    is_use_private_libs=is_use_private_libs,
+                    nuget_config_path=nuget_config_path,
+                    is_build_daemon=is_build_daemon,
+                    build_daemon_state_dir=build_daemon_state_dir,
+                )
+            case Platform.GRADLE:
+                _gradle_run_unit_test(
+                    work_dir_path=work_dir_path,
+                    output_path=output_path,
+                    goal_command=goal_command,
+                    is_build_daemon=is_build_daemon,
+                    build_daemon_state_dir=build_daemon_state_dir,
+                )
+            case Platform.PYTHON:
+                _python_run_unit_test(
+                    work_dir_path=work_dir_path,
+                    output_path=output_path,
+                    goal_command=goal_command,
+                    is_use_private_libs=is_use_private_libs,
+                    pip_config_path=pip_config_path,
+                    venv_path=venv_path,
+                    venv_name=venv_name,
+                    requirements_txt_path=requirements_txt_path,
+                )
+
+    if dependency_cache_status is not None:
+        ado_service.convert_to_ado_env_vars(
+            {"dependency_cache_status": dependency_cache_status.value.lower()},
+            prefix_var="FLOW_",
+        )
@@ -0,0 +1,33 @@
+import os
+
+from app.services import ado_service, build_daemon_service
+
+
+def _fetch_required_env_var():
+    env_vars = {
+        "build_daemon_state_dir": os.getenv("BUILD_DAEMON_STATE_DIR")
+        or build_daemon_service.get_default_state_dir(),
+    }
+    return env_vars
+
+
+def execute():
+    env_vars = _fetch_required_env_var()
+    build_daemon_state_dir = env_vars["build_daemon_state_dir"]
+
+    stopped_daemons = build_daemon_service.stop_daemons(build_daemon_state_dir)
+    if not stopped_daemons:
+        print("No build daemon was started in this job.")
+
+    comparison = build_daemon_service.compare_timings(build_daemon_state_dir)
+    if not comparison:
+        return
+    build_daemon_service.print_comparison(comparison)
+
+    print("> Expose build daemon vars.")
+    build_daemon_vars = {
+        "build_daemon_timings_path": os.path.join(
+            build_daemon_state_dir, build_daemon_service.COMPARISON_FILE_NAME
+        ),
+    }
+    ado_service.convert_to_ado_env_vars(build_daemon_vars, prefix_var="FLOW_")
@@ -1,42 +1,118 @@
+import importlib
+import json
+import os
 import sys
+from typing import List
 
-from app.functions import (
-    compile_platform_func,
-    docker_build_func,
-    extract_diary_and_override_build_number_ado,
-    git_clone_ado_func,
-    helm_upgrade_func,
-    initialize_workspace_func,
-    override_build_number_ado_func,
-    run_unit_test_platform_func,
-    write_diary_func,
-)
 from app.models.function_model import Function
+from app.models.session_model import SessionStep
+from app.utils import adapter_util, trace_util
+
+FUNCTION_MODULES = {
+    Function.INITIALIZE_WORKSPACE: "app.functions.initialize_workspace_func",
+    Function.GIT_CLONE_ADO: "app.functions.git_clone_ado_func",
+    Function.OVERRIDE_BUILD_NUMBER_ADO: "app.functions.override_build_number_ado_func",
+    Function.WRITE_DIARY: "app.functions.write_diary_func",
+    Function.COMPILE_PLATFORM: "app.functions.compile_platform_func",
+    Function.DOCKER_BUILD: "app.functions.docker_build_func",
+    Function.RUN_UNIT_TEST_PLATFORM: "app.functions.run_unit_test_platform_func",
+    Function.HELM_UPGRADE: "app.functions.helm_upgrade_func",
+    Function.STOP_BUILD_DAEMONS: "app.functions.stop_build_daemons_func",
+    Function.EXTRACT_DIARY_AND_OVERRIDE_BUILD_NUMBER_ADO: (
+        "app.functions.extract_diary_and_override_build_number_ado"
+    ),
+}
+
+
+def load_function(target_func: Function):
+    """
+    Imports only the module implementing the selected function.
+    """
+    return importlib.import_module(FUNCTION_MODULES[target_func])
+
+
+def _load_manifest(manifest_path: str) -> List[SessionStep]:
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+    steps = manifest["functions"] if isinstance(manifest, dict) else manifest
+    return [SessionStep.from_dict(step) for step in steps]
+
+
+def _parse_steps(args: List[str]) -> List[SessionStep]:
+    if args and args[0] == "--manifest":
+        return _load_manifest(args[1])
+    return [SessionStep(name=arg) for arg in args]
+
+
+def _run_step(step: SessionStep):
+    """
+    Runs one function with the step env vars applied, then restores the env vars
+    and cwd so the next step starts clean, keeping only the exported vars.
+    """
+    from app.services import session_service
+
+    saved_environ = dict(os.environ)
+    saved_cwd = os.getcwd()
+    try:
+        os.environ.update({k: os.path.expandvars(v) for k, v in step.env.items()})
+        target_func = Function(step.name)
+        with trace_util.span(target_func.value, category="function"):
+            load_function(target_func).execute()
+    finally:
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        os.environ.update(session_service.get_exported_vars())
+
+
+def run(args: List[str]):
+    """
+    Runs one or more functions in this process and prints the trace summaries.
+    Args:
+        args (List[str]): Function names, "--manifest" followed by the path of
+            a JSON manifest like {"functions": [{"name": ..., "env": {...}}]}, or
+            "--pipeline" followed by the path of a pipeline file run as a DAG.
+    """
+    is_pipeline = bool(args) and args[0] == "--pipeline"
+    steps = [] if is_pipeline else _parse_steps(args)
+    for step in steps:
+        Function(step.name)
+
+    trace_file_path = os.getenv("TRACE_FILE_PATH")
+    trace_file_path = os.path.abspath(trace_file_path) if trace_file_path else None
+
+    try:
+        if is_pipeline:
+            from app.services import pipeline_service
+
+            pipeline_service.run_pipeline(args[1])
+        elif len(steps) == 1:
+            _run_step(steps[0])
+        else:
+            with trace_util.span("Session", category="session"):
+                for index, step in enumerate(steps, start=1):
+                    print(f"> Session step {index}/{len(steps)}: {step.name}.")
+                    _run_step(step)
+    finally:
+        if adapter_util.getenv_bool("IS_PRINT_TRACE_SUMMARY", True):
+            trace_util.print_slowest_spans()
+        if adapter_util.getenv_bool("IS_PRINT_RESOURCE_USAGE", True):
+            trace_util.print_resource_usage_summary()
+        if trace_file_path:
+            print(f"> Trace file: {trace_util.export_chrome_trace(trace_file_path)}")
 
 
 def execute():
-    target_func_str = sys.argv[1]
-    target_func = Function(target_func_str)
-
-    match target_func:
-        case Function.INITIALIZE_WORKSPACE:
-            initialize_workspace_func.execute()
-        case Function.GIT_CLONE_ADO:
-            git_clone_ado_func.execute()
-        case Function.OVERRIDE_BUILD_NUMBER_ADO:
-            override_build_number_ado_func.execute()
-        case Function.WRITE_DIARY:
-            write_diary_func.execute()
-        case Function.COMPILE_PLATFORM:
-            compile_platform_func.execute()
-        case Function.DOCKER_BUILD:
-            docker_build_func.execute()
-        case Function.RUN_UNIT_TEST_PLATFORM:
-            run_unit_test_platform_func.execute()
-        case Function.HELM_UPGRADE:
-            helm_upgrade_func.execute()
-        case Function.EXTRACT_DIARY_AND_OVERRIDE_BUILD_NUMBER_ADO:
-            extract_diary_and_override_build_number_ado.execute()
+    worker_socket_path = os.getenv("FUNCTIONS_WORKER_SOCKET")
+    if worker_socket_path:
+        from app.services import worker_service
+
+        exit_code = worker_service.forward(sys.argv, worker_socket_path)
+        if exit_code is not None:
+            sys.exit(exit_code)
+        print(f"> No worker is listening on {worker_socket_path}, run in-process.")
+
+    run(sys.argv[1:])
 
 
 if __name__ == "__main__":
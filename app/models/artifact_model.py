@@ -0,0 +1,31 @@
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Dict
+
+
+@dataclass
+class ArtifactRecord:
+    git_url: str
+    git_commit_id: str
+    target_sub_dir: str = ""
+    artifacts: Dict[str, str] = field(default_factory=dict)
+    updated_at: float = 0.0
+
+    def __repr__(self):
+        return (
+            f"ArtifactRecord(git_url={self.git_url!r}, "
+            f"git_commit_id={self.git_commit_id!r}, "
+            f"target_sub_dir={self.target_sub_dir!r}, "
+            f"artifacts={list(self.artifacts)!r})"
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    @classmethod
+    def from_json(cls, json_data: str):
+        data = json.loads(json_data)
+        return cls(**data)
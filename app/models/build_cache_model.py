@@ -0,0 +1,99 @@
+import json
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from typing import List
+
+
+@dataclass
+class BuildCacheFile:
+    path: str
+    digest: str
+    size_bytes: int
+    mode: int
+
+    def __repr__(self):
+        return f"BuildCacheFile(path={self.path!r}, digest={self.digest[:12]!r})"
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+
+@dataclass
+class BuildCacheEntry:
+    key: str
+    platform: str
+    goal_command: str = ""
+    toolchain_version: str = ""
+    files: List[BuildCacheFile] = field(default_factory=list)
+    dirs: List[str] = field(default_factory=list)
+    created_at: float = 0.0
+
+    def __repr__(self):
+        return (
+            f"BuildCacheEntry(key={self.key!r}, platform={self.platform!r}, "
+            f"files={len(self.files)!r}, size_bytes={self.size_bytes!r})"
+        )
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(cache_file.size_bytes for cache_file in self.files)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    @classmethod
+    def from_json(cls, json_data: str) -> "BuildCacheEntry":
+        data = json.loads(json_data)
+        data["files"] = [BuildCacheFile(**cache_file) for cache_file in data["files"]]
+        return cls(**data)
+
+
+@dataclass
+class BuildCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evicted_entries: int = 0
+    size_bytes: int = 0
+
+    def __repr__(self):
+        return (
+            f"BuildCacheStats(hits={self.hits!r}, misses={self.misses!r}, "
+            f"evicted_entries={self.evicted_entries!r}, "
+            f"size_bytes={self.size_bytes!r})"
+        )
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    @classmethod
+    def from_json(cls, json_data: str) -> "BuildCacheStats":
+        return cls(**json.loads(json_data))
+
+
+class DependencyCacheStatus(Enum):
+    HIT = "HIT"
+    PARTIAL_HIT = "PARTIAL_HIT"
+    MISS = "MISS"
+
+    def __repr__(self):
+        return f"DependencyCacheStatus(name={self.name})"
+
+    def to_dict(self):
+        return {"name": self.name}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
@@ -0,0 +1,68 @@
+import json
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import List
+
+
+class BuildDaemon(Enum):
+    MVND = "MVND"
+    GRADLE = "GRADLE"
+    DOTNET_BUILD_SERVER = "DOTNET_BUILD_SERVER"
+
+    def __repr__(self):
+        return f"BuildDaemon(name={self.name})"
+
+    def to_dict(self):
+        return {"name": self.name}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    def get_registry_args(self, registry_dir: str) -> List[str]:
+        """
+        Returns the arguments keeping the daemons in a registry of their own, so
+        that stopping them leaves the daemons of other registries running. The
+        dotnet build server has no registry, it is shared by every job of the user.
+        """
+        match self:
+            case BuildDaemon.MVND:
+                return [f"-Dmvnd.daemonStorage={registry_dir}"]
+            case BuildDaemon.GRADLE:
+                return [f"-Dorg.gradle.daemon.registry.base={registry_dir}"]
+            case BuildDaemon.DOTNET_BUILD_SERVER:
+                return []
+
+    def get_stop_cmd(self, registry_dir: str) -> List[str]:
+        """
+        Returns the command stopping the daemons of this kind in a registry, or
+        every dotnet build server of the user.
+        """
+        match self:
+            case BuildDaemon.MVND:
+                return ["mvnd"] + self.get_registry_args(registry_dir) + ["--stop"]
+            case BuildDaemon.GRADLE:
+                return ["gradle"] + self.get_registry_args(registry_dir) + ["--stop"]
+            case BuildDaemon.DOTNET_BUILD_SERVER:
+                return ["dotnet", "build-server", "shutdown"]
+
+
+@dataclass
+class BuildTiming:
+    platform: str
+    mode: str
+    goal_command: str
+    duration_s: float
+    is_warm: bool = False
+    started_at: float = 0.0
+
+    def __repr__(self):
+        return (
+            f"BuildTiming(platform={self.platform!r}, mode={self.mode!r}, "
+            f"is_warm={self.is_warm!r}, duration_s={self.duration_s!r})"
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
@@ -0,0 +1,103 @@
+import json
+import re
+from dataclasses import asdict, dataclass
+from typing import Dict
+
+# Rough footprint of one build, used when a target does not declare its own.
+DEFAULT_TARGET_CPUS = {
+    "MAVEN": 2,
+    "GRADLE": 2,
+    "DOTNET": 2,
+    "PYTHON": 1,
+    "NPM": 1,
+    "YARN": 1,
+}
+DEFAULT_TARGET_MEMORY_MB = {
+    "MAVEN": 2048,
+    "GRADLE": 2048,
+    "DOTNET": 2048,
+    "PYTHON": 512,
+    "NPM": 1024,
+    "YARN": 1024,
+}
+
+
+@dataclass
+class BuildTarget:
+    name: str
+    platform: str
+    build_app: str
+    build_output: str
+    goal_command: str = ""
+    cpus: int = 1
+    memory_mb: int = 1024
+
+    def __repr__(self):
+        return (
+            f"BuildTarget(name={self.name!r}, platform={self.platform!r}, "
+            f"build_app={self.build_app!r}, build_output={self.build_output!r})"
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict,
+        default_platform: str = None,
+        default_build_output: str = "",
+    ) -> "BuildTarget":
+        """
+        Reads a target like {"app": ..., "platform": ..., "output": ...,
+        "goal_command": ..., "name": ..., "cpus": ..., "memory_mb": ...}.
+        The output defaults to a directory of the app below `default_build_output`,
+        so targets never share an output directory.
+        """
+        build_app = data["app"]
+        platform = (data.get("platform") or default_platform or "").upper()
+        if not platform:
+            raise ValueError(f"Build target {build_app} has no platform.")
+        name = data.get("name") or build_app.rstrip("/").rsplit("/", 1)[-1]
+        return cls(
+            name=re.sub(r"[^A-Za-z0-9_]+", "_", name).upper(),
+            platform=platform,
+            build_app=build_app,
+            build_output=data.get("output")
+            or f"{default_build_output.rstrip('/')}/{name}".lstrip("/"),
+            goal_command=data.get("goal_command", ""),
+            cpus=int(data.get("cpus", DEFAULT_TARGET_CPUS.get(platform, 1))),
+            memory_mb=int(
+                data.get("memory_mb", DEFAULT_TARGET_MEMORY_MB.get(platform, 1024))
+            ),
+        )
+
+
+@dataclass
+class BuildTargetResult:
+    name: str
+    status: str = "PENDING"
+    start_s: float = None
+    end_s: float = None
+    log_path: str = ""
+
+    def __repr__(self):
+        return (
+            f"BuildTargetResult(name={self.name!r}, status={self.status!r}, "
+            f"duration_s={self.duration_s!r})"
+        )
+
+    @property
+    def duration_s(self) -> float:
+        if self.start_s is None or self.end_s is None:
+            return 0.0
+        return self.end_s - self.start_s
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
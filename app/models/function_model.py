@@ -10,6 +10,7 @@ class Function(Enum):
     INITIALIZE_WORKSPACE = "INITIALIZE_WORKSPACE"
     OVERRIDE_BUILD_NUMBER_ADO = "OVERRIDE_BUILD_NUMBER_ADO"
     RUN_UNIT_TEST_PLATFORM = "RUN_UNIT_TEST_PLATFORM"
+    STOP_BUILD_DAEMONS = "STOP_BUILD_DAEMONS"
     WRITE_DIARY = "WRITE_DIARY"
     EXTRACT_DIARY_AND_OVERRIDE_BUILD_NUMBER_ADO = (
         "EXTRACT_DIARY_AND_OVERRIDE_BUILD_NUMBER_ADO"
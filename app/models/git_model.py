@@ -0,0 +1,92 @@
+import json
+import re
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import Dict, List
+
+COMMIT_ID_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+
+class GitCloneStrategy(Enum):
+    FULL = "FULL"
+    SHALLOW = "SHALLOW"
+    BLOBLESS = "BLOBLESS"
+    TREELESS = "TREELESS"
+
+    def __repr__(self):
+        return f"GitCloneStrategy(name={self.name})"
+
+    def to_dict(self):
+        return {"name": self.name}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    def get_fetch_args(self, depth: int = 1) -> List[str]:
+        """
+        Returns the arguments limiting the history or objects fetched by the strategy.
+        """
+        match self:
+            case GitCloneStrategy.FULL:
+                return []
+            case GitCloneStrategy.SHALLOW:
+                return ["--depth", str(depth)]
+            case GitCloneStrategy.BLOBLESS:
+                return ["--filter=blob:none"]
+            case GitCloneStrategy.TREELESS:
+                return ["--filter=tree:0"]
+
+    def get_clone_args(self, git_branch: str, depth: int = 1) -> List[str]:
+        """
+        Returns the `git clone` arguments of the strategy. Every strategy but FULL
+        fetches only the target branch, so no checkout is needed afterwards.
+        A commit SHA cannot be cloned with `--branch`, see `is_commit_id`.
+        """
+        if self == GitCloneStrategy.FULL:
+            return []
+        return self.get_fetch_args(depth) + ["--single-branch", "--branch", git_branch]
+
+
+def is_commit_id(git_branch: str) -> bool:
+    """
+    Returns whether the branch is a full commit SHA rather than a branch or tag name.
+    """
+    return bool(COMMIT_ID_PATTERN.match(git_branch or ""))
+
+
+@dataclass
+class GitRepoSpec:
+    name: str
+    git_url: str
+    git_branch: str
+    app_source: str
+    is_private_repo: bool = False
+
+    def __repr__(self):
+        return (
+            f"GitRepoSpec(name={self.name!r}, git_url={self.git_url!r}, "
+            f"git_branch={self.git_branch!r}, app_source={self.app_source!r})"
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    @classmethod
+    def from_dict(
+        cls, data: Dict, default_branch: str = "master", is_private_repo: bool = False
+    ) -> "GitRepoSpec":
+        git_url = data["url"]
+        app_source = data.get("destination") or data.get("app_source")
+        if not app_source:
+            app_source = git_url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+        name = data.get("name") or app_source
+        return cls(
+            name=re.sub(r"[^A-Za-z0-9_]+", "_", name).upper(),
+            git_url=git_url,
+            git_branch=data.get("branch") or default_branch,
+            app_source=app_source,
+            is_private_repo=bool(data.get("is_private", is_private_repo)),
+        )
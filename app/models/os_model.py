@@ -1,5 +1,7 @@
 import json
+from dataclasses import asdict, dataclass, field
 from enum import Enum
+from typing import Dict
 
 
 class LogType(Enum):
@@ -14,3 +16,189 @@ class LogType(Enum):
 
     def to_json(self):
         return json.dumps(self.to_dict(), indent=4)
+
+
+@dataclass
+class DirStats:
+    files: int = 0
+    dirs: int = 0
+    size_bytes: int = 0
+
+    def __repr__(self):
+        return (
+            f"DirStats(files={self.files!r}, dirs={self.dirs!r}, "
+            f"size_bytes={self.size_bytes!r})"
+        )
+
+    def merge(self, other: "DirStats") -> "DirStats":
+        return DirStats(
+            files=self.files + other.files,
+            dirs=self.dirs + other.dirs,
+            size_bytes=self.size_bytes + other.size_bytes,
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+
+class ArchiveCodec(Enum):
+    STORED = "STORED"
+    DEFLATE = "DEFLATE"
+    ZSTD = "ZSTD"
+
+    def __repr__(self):
+        return f"ArchiveCodec(name={self.name})"
+
+    def to_dict(self):
+        return {"name": self.name}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+
+@dataclass
+class ArchiveStats:
+    entries: int = 0
+    stored_entries: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+    duration_s: float = 0.0
+
+    def __repr__(self):
+        return (
+            f"ArchiveStats(entries={self.entries!r}, "
+            f"input_bytes={self.input_bytes!r}, output_bytes={self.output_bytes!r}, "
+            f"duration_s={self.duration_s!r})"
+        )
+
+    @property
+    def throughput_mb_s(self) -> float:
+        if self.duration_s <= 0:
+            return 0.0
+        return self.input_bytes / 1024**2 / self.duration_s
+
+    @property
+    def compression_ratio(self) -> float:
+        if self.output_bytes <= 0:
+            return 0.0
+        return self.input_bytes / self.output_bytes
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+
+class CopyStrategy(Enum):
+    AUTO = "AUTO"
+    HARDLINK = "HARDLINK"
+    REFLINK = "REFLINK"
+    COPY_FILE_RANGE = "COPY_FILE_RANGE"
+    SENDFILE = "SENDFILE"
+    COPY = "COPY"
+
+    def __repr__(self):
+        return f"CopyStrategy(name={self.name})"
+
+    def to_dict(self):
+        return {"name": self.name}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+
+@dataclass
+class CopyStats:
+    files: int = 0
+    dirs: int = 0
+    bytes_copied: int = 0
+    duration_s: float = 0.0
+    strategies: Dict[str, int] = field(default_factory=dict)
+
+    def __repr__(self):
+        return (
+            f"CopyStats(files={self.files!r}, bytes_copied={self.bytes_copied!r}, "
+            f"duration_s={self.duration_s!r}, strategies={self.strategies!r})"
+        )
+
+    @property
+    def throughput_mb_s(self) -> float:
+        if self.duration_s <= 0:
+            return 0.0
+        return self.bytes_copied / 1024**2 / self.duration_s
+
+    def merge(self, other: "CopyStats") -> "CopyStats":
+        strategies = dict(self.strategies)
+        for name, count in other.strategies.items():
+            strategies[name] = strategies.get(name, 0) + count
+        return CopyStats(
+            files=self.files + other.files,
+            dirs=self.dirs + other.dirs,
+            bytes_copied=self.bytes_copied + other.bytes_copied,
+            duration_s=self.duration_s + other.duration_s,
+            strategies=strategies,
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+
+@dataclass
+class SyncSummary:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    bytes_copied: int = 0
+    duration_s: float = 0.0
+
+    def __repr__(self):
+        return (
+            f"SyncSummary(created={self.created!r}, updated={self.updated!r}, "
+            f"unchanged={self.unchanged!r}, deleted={self.deleted!r}, "
+            f"bytes_copied={self.bytes_copied!r})"
+        )
+
+    @property
+    def is_changed(self) -> bool:
+        return bool(self.created or self.updated or self.deleted)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+
+@dataclass
+class ExtractStats:
+    entries: int = 0
+    skipped_entries: int = 0
+    output_bytes: int = 0
+    duration_s: float = 0.0
+
+    def __repr__(self):
+        return (
+            f"ExtractStats(entries={self.entries!r}, "
+            f"skipped_entries={self.skipped_entries!r}, "
+            f"output_bytes={self.output_bytes!r}, duration_s={self.duration_s!r})"
+        )
+
+    @property
+    def throughput_mb_s(self) -> float:
+        if self.duration_s <= 0:
+            return 0.0
+        return self.output_bytes / 1024**2 / self.duration_s
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
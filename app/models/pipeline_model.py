@@ -1,5 +1,7 @@
 import json
+from dataclasses import asdict, dataclass, field
 from enum import Enum
+from typing import Dict, List
 
 
 class PipelineStageProperty:
@@ -43,3 +45,60 @@ class PipelineStage(Enum):
             if stage.value.name == name:
                 return stage
         raise ValueError(f"No PipelineStage with name '{name}' found")
+
+
+@dataclass
+class PipelineNode:
+    id: str
+    function: str
+    env: Dict[str, str] = field(default_factory=dict)
+    depends_on: List[str] = field(default_factory=list)
+
+    def __repr__(self):
+        return (
+            f"PipelineNode(id={self.id!r}, function={self.function!r}, "
+            f"depends_on={self.depends_on!r})"
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PipelineNode":
+        return cls(
+            id=data["id"],
+            function=data["function"],
+            env={k: str(v) for k, v in (data.get("env") or {}).items()},
+            depends_on=list(data.get("depends_on") or []),
+        )
+
+
+@dataclass
+class PipelineNodeResult:
+    node_id: str
+    status: str = "PENDING"
+    exit_code: int = None
+    start_s: float = None
+    end_s: float = None
+    exported_vars: Dict[str, str] = field(default_factory=dict)
+
+    def __repr__(self):
+        return (
+            f"PipelineNodeResult(node_id={self.node_id!r}, status={self.status!r}, "
+            f"exit_code={self.exit_code!r}, duration_s={self.duration_s!r})"
+        )
+
+    @property
+    def duration_s(self) -> float:
+        if self.start_s is None or self.end_s is None:
+            return 0.0
+        return self.end_s - self.start_s
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
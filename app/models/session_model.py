@@ -0,0 +1,49 @@
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class SessionStep:
+    name: str
+    env: Dict[str, str] = field(default_factory=dict)
+
+    def __repr__(self):
+        return f"SessionStep(name={self.name!r}, env={list(self.env)!r})"
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    @classmethod
+    def from_dict(cls, data: Dict | str) -> "SessionStep":
+        if isinstance(data, str):
+            return cls(name=data)
+        env = {k: str(v) for k, v in (data.get("env") or {}).items()}
+        return cls(name=data["name"], env=env)
+
+
+@dataclass
+class SessionContext:
+    publishers: Dict = field(default_factory=dict)
+    registry_sessions: List = field(default_factory=list)
+    exported_vars: Dict[str, str] = field(default_factory=dict)
+
+    def __repr__(self):
+        return (
+            f"SessionContext(publishers={list(self.publishers)!r}, "
+            f"registry_sessions={self.registry_sessions!r}, "
+            f"exported_vars={list(self.exported_vars)!r})"
+        )
+
+    def to_dict(self):
+        return {
+            "publishers": list(self.publishers),
+            "registry_sessions": [list(s) for s in self.registry_sessions],
+            "exported_vars": self.exported_vars,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
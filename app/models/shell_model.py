@@ -0,0 +1,58 @@
+import json
+from dataclasses import asdict, dataclass
+
+
+@dataclass
+class ResourceUsage:
+    wall_time_s: float = 0.0
+    user_cpu_s: float = 0.0
+    sys_cpu_s: float = 0.0
+    max_rss_kb: int = 0
+    block_input_ops: int = 0
+    block_output_ops: int = 0
+    voluntary_ctx_switches: int = 0
+    involuntary_ctx_switches: int = 0
+    read_bytes: int = 0
+    write_bytes: int = 0
+
+    def __repr__(self):
+        return (
+            f"ResourceUsage(wall_time_s={self.wall_time_s!r}, "
+            f"user_cpu_s={self.user_cpu_s!r}, sys_cpu_s={self.sys_cpu_s!r}, "
+            f"max_rss_kb={self.max_rss_kb!r}, read_bytes={self.read_bytes!r}, "
+            f"write_bytes={self.write_bytes!r})"
+        )
+
+    @property
+    def cpu_utilization(self) -> float:
+        """CPU seconds per wall second, above 1.0 means more than one core was busy."""
+        if self.wall_time_s <= 0:
+            return 0.0
+        return (self.user_cpu_s + self.sys_cpu_s) / self.wall_time_s
+
+    def merge(self, other: "ResourceUsage") -> "ResourceUsage":
+        return ResourceUsage(
+            wall_time_s=self.wall_time_s + other.wall_time_s,
+            user_cpu_s=self.user_cpu_s + other.user_cpu_s,
+            sys_cpu_s=self.sys_cpu_s + other.sys_cpu_s,
+            max_rss_kb=max(self.max_rss_kb, other.max_rss_kb),
+            block_input_ops=self.block_input_ops + other.block_input_ops,
+            block_output_ops=self.block_output_ops + other.block_output_ops,
+            voluntary_ctx_switches=self.voluntary_ctx_switches
+            + other.voluntary_ctx_switches,
+            involuntary_ctx_switches=self.involuntary_ctx_switches
+            + other.involuntary_ctx_switches,
+            read_bytes=self.read_bytes + other.read_bytes,
+            write_bytes=self.write_bytes + other.write_bytes,
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    @classmethod
+    def from_json(cls, json_data: str):
+        data = json.loads(json_data)
+        return cls(**data)
@@ -1,11 +1,9 @@
 import json
 import os
-import subprocess
 from typing import List
 
-from tabulate import tabulate
-
 from app.models.ado_model import AdoVariable
+from app.services import session_service
 
 
 def update_build_number(build_number: str):
@@ -39,11 +37,10 @@ def export_json_into_vars_to_azure(json_file_path):
     with open(json_file_path) as f:
         data = json.load(f)
     vars_azure = [
-        f'echo "##vso[task.setvariable variable={k.upper()}]{v}"'
-        for k, v in data.items()
+        f"##vso[task.setvariable variable={k.upper()}]{v}" for k, v in data.items()
     ]
     for var in vars_azure:
-        subprocess.run(var, shell=True)
+        print(var)
 
 
 def to_ado_env_var(ado_var: AdoVariable):
@@ -65,6 +62,8 @@ def convert_to_ado_env_vars(
         output_format (str, optional): The format in which to print the environment variables. Can be "table" or "json". Defaults to "table".
     """
 
+    from tabulate import tabulate
+
     summarized_envs = []
 
     def process_env_var(env_var: str) -> None:
@@ -74,6 +73,7 @@ def convert_to_ado_env_vars(
         ado_var = AdoVariable(name=ado_env_var, value=os.getenv(env_var))
         to_ado_env_var(ado_var)
         bash_env_var_name = ado_env_var.replace(".", "_").upper()
+        session_service.export_var(bash_env_var_name, os.getenv(env_var))
         ado_template_var_name = f"{ado_env_var}"
 
         if output_format == "table":
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import shutil
+import time
+from typing import List, Tuple
+
+from app.models.artifact_model import ArtifactRecord
+from app.models.git_model import is_commit_id
+from app.services import git_cache_service, shell_service
+from app.utils import io_util
+
+ARCHIVE = "archive"
+BUILD_OUTPUT = "build_output"
+PUBLISH_FILE = "publish_file"
+REUSABLE_ARTIFACT_KINDS = (ARCHIVE, BUILD_OUTPUT, PUBLISH_FILE)
+RECORD_FILE_NAME = "record.json"
+
+
+def resolve_remote_commit(credential_url: str, git_branch: str) -> str:
+    """
+    Resolves a branch or tag to a commit with `git ls-remote`, without cloning.
+    Returns:
+        str: The commit ID, or None if the ref does not exist on the remote.
+    """
+    if is_commit_id(git_branch):
+        return git_branch
+
+    refs = [f"refs/heads/{git_branch}", f"refs/tags/{git_branch}"]
+    remote_refs = {}
+    for line in shell_service.git_ls_remote(credential_url, refs).stdout.splitlines():
+        commit_id, _, ref = line.partition("\t")
+        remote_refs[ref] = commit_id
+    for ref in [refs[0], f"{refs[1]}^{{}}", refs[1]]:
+        if ref in remote_refs:
+            return remote_refs[ref]
+    return None
+
+
+def get_entry_dir(
+    index_dir: str,
+    git_url: str,
+    git_commit_id: str,
+    target_sub_dir: str = "",
+    other_commits: List[Tuple[str, str]] = None,
+) -> str:
+    """
+    Returns the entry of a commit in the artifact index. A build of several
+    repositories passes the (git_url, git_commit_id) of the other repositories
+    in `other_commits`, so its entry changes when any of them does.
+    """
+    key = "\n".join(
+        [
+            git_cache_service.normalize_git_url(git_url),
+            git_commit_id.strip(),
+            target_sub_dir.strip("/"),
+        ]
+        + [
+            f"{git_cache_service.normalize_git_url(other_url)} {other_commit_id.strip()}"
+            for other_url, other_commit_id in other_commits or []
+        ]
+    )
+    digest = hashlib.sha256(key.encode()).hexdigest()[:24]
+    return os.path.join(os.path.abspath(index_dir), digest)
+
+
+def load_record(entry_dir: str) -> ArtifactRecord:
+    record_path = os.path.join(entry_dir, RECORD_FILE_NAME)
+    if not os.path.exists(record_path):
+        return None
+    with open(record_path, "r") as f:
+        return ArtifactRecord.from_json(f.read())
+
+
+def is_reusable(record: ArtifactRecord) -> bool:
+    """
+    A build is reusable when the archive, the build output and the publish file
+    of its commit were all recorded and still exist.
+    """
+    return record is not None and all(
+        kind in record.artifacts and os.path.exists(record.artifacts[kind])
+        for kind in REUSABLE_ARTIFACT_KINDS
+    )
+
+
+def save_artifact(
+    entry_dir: str,
+    kind: str,
+    source_path: str,
+    git_url: str = "",
+    git_commit_id: str = "",
+    target_sub_dir: str = "",
+) -> str:
+    """
+    Copies a file or directory into the index entry of a commit and records it.
+    The copy is renamed into place, so a reader never sees a partial artifact.
+    Args:
+        entry_dir (str): The index entry, see get_entry_dir.
+        kind (str): The kind of artifact, e.g. ARCHIVE, BUILD_OUTPUT or PUBLISH_FILE.
+        source_path (str): The file or directory to store.
+        git_url (str, optional): Recorded when the entry is created. Defaults to "".
+        git_commit_id (str, optional): Recorded when the entry is created. Defaults to "".
+        target_sub_dir (str, optional): Recorded when the entry is created. Defaults to "".
+    Returns:
+        str: The path of the stored artifact.
+    """
+    entry_dir = os.path.abspath(entry_dir)
+    os.makedirs(entry_dir, exist_ok=True)
+    artifact_path = os.path.join(entry_dir, kind, os.path.basename(source_path))
+    partial_path = f"{artifact_path}.partial"
+
+    with io_util.file_lock(os.path.join(entry_dir, ".lock")):
+        for path in [partial_path, artifact_path]:
+            if os.path.exists(path):
+                io_util.delete_path(path)
+        os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+        if os.path.isdir(source_path):
+            shutil.copytree(source_path, partial_path, symlinks=True)
+        else:
+            shutil.copy2(source_path, partial_path)
+        os.rename(partial_path, artifact_path)
+
+        record = load_record(entry_dir) or ArtifactRecord(
+            git_url=git_cache_service.strip_credentials(git_url),
+            git_commit_id=git_commit_id.strip(),
+            target_sub_dir=target_sub_dir,
+        )
+        record.artifacts[kind] = artifact_path
+        record.updated_at = time.time()
+        record_path = os.path.join(entry_dir, RECORD_FILE_NAME)
+        with open(f"{record_path}.partial", "w") as f:
+            f.write(record.to_json())
+        os.replace(f"{record_path}.partial", record_path)
+
+    print(f"Recorded {kind} artifact: {artifact_path}.")
+    return artifact_path
+
+
+def restore_artifact(artifact_path: str, destination: str):
+    """
+    Copies a recorded artifact to where the pipeline expects it.
+    """
+    print(f"Reuse artifact {artifact_path} at {destination}.")
+    entry_dir = os.path.dirname(os.path.dirname(artifact_path))
+    with io_util.file_lock(os.path.join(entry_dir, ".lock"), is_shared=True):
+        if os.path.isdir(artifact_path):
+            shutil.copytree(artifact_path, destination, dirs_exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+            shutil.copy2(artifact_path, destination)
@@ -0,0 +1,378 @@
+import fnmatch
+import hashlib
+import os
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from app.models.build_cache_model import (
+    BuildCacheEntry,
+    BuildCacheFile,
+    BuildCacheStats,
+)
+from app.models.os_model import CopyStrategy
+from app.models.platform_model import Platform
+from app.services import shell_service
+from app.utils import io_util
+
+ENTRIES_DIR_NAME = "entries"
+OBJECTS_DIR_NAME = "objects"
+LOCK_FILE_NAME = ".lock"
+STATS_FILE_NAME = "stats.json"
+HASH_CHUNK_BYTES = 1024**2
+HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Directories written by the build next to a module file, e.g. target/ next to a
+# pom.xml. A source package named e.g. `target` deeper down is still hashed.
+BUILD_DIR_NAMES = {
+    Platform.MAVEN: {"target"},
+    Platform.GRADLE: {"build", ".gradle"},
+    Platform.DOTNET: {"bin", "obj"},
+}
+MODULE_FILE_PATTERNS = {
+    Platform.MAVEN: ["pom.xml"],
+    Platform.GRADLE: [
+        "build.gradle",
+        "build.gradle.kts",
+        "settings.gradle",
+        "settings.gradle.kts",
+    ],
+    Platform.DOTNET: ["*.csproj", "*.fsproj", "*.vbproj", "*.sln"],
+}
+# Directories that never hold sources, wherever they are.
+GENERATED_DIR_NAMES = {
+    Platform.PYTHON: {"__pycache__", ".pytest_cache"},
+    Platform.NPM: {"node_modules"},
+    Platform.YARN: {"node_modules"},
+}
+TOOLCHAIN_VERSION_CMDS = {
+    Platform.MAVEN: [["mvn", "--version"]],
+    Platform.GRADLE: [["gradle", "--version"]],
+    Platform.DOTNET: [["dotnet", "--version"]],
+    Platform.PYTHON: [["python", "--version"]],
+    Platform.NPM: [["node", "--version"], ["npm", "--version"]],
+    Platform.YARN: [["node", "--version"], ["yarn", "--version"]],
+}
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _list_files(
+    root: str,
+    excluded_dir_names=(),
+    excluded_paths=(),
+    build_dir_names=(),
+    module_file_patterns=(),
+) -> List[str]:
+    """
+    Lists the files below a root. `build_dir_names` are only left out of a
+    directory holding a file matching `module_file_patterns`.
+    """
+    excluded_paths = {os.path.abspath(path) for path in excluded_paths}
+    file_paths = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        is_module_dir = any(
+            fnmatch.fnmatch(name, pattern)
+            for name in file_names
+            for pattern in module_file_patterns
+        )
+        dir_names[:] = sorted(
+            name
+            for name in dir_names
+            if name != ".git"
+            and name not in excluded_dir_names
+            and not (is_module_dir and name in build_dir_names)
+            and os.path.abspath(os.path.join(dir_path, name)) not in excluded_paths
+        )
+        file_paths.extend(os.path.join(dir_path, name) for name in sorted(file_names))
+    return file_paths
+
+
+def _hash_files(root: str, file_paths: List[str]) -> List[BuildCacheFile]:
+    def describe(path: str) -> BuildCacheFile:
+        path_stat = os.stat(path)
+        return BuildCacheFile(
+            path=os.path.relpath(path, root),
+            digest=hash_file(path),
+            size_bytes=path_stat.st_size,
+            mode=stat.S_IMODE(path_stat.st_mode),
+        )
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        return list(executor.map(describe, file_paths))
+
+
+def get_toolchain_version(platform: Platform) -> str:
+    versions = []
+    for cmd in TOOLCHAIN_VERSION_CMDS.get(platform, []):
+        result = shell_service.execute_cmd(cmd, is_collect_log=False)
+        versions.append(result.stdout.strip())
+    return "\n".join(versions)
+
+
+def compute_key(
+    platform: Platform,
+    goal_command: str,
+    toolchain_version: str,
+    source_paths: List[str],
+    excluded_paths: List[str] = None,
+) -> str:
+    """
+    Hashes everything a build output depends on: the platform, the goal command,
+    the toolchain version and the content and exec bit of the source files.
+    Args:
+        platform (Platform): The platform of the build.
+        goal_command (str): The build command, whitespace is normalized.
+        toolchain_version (str): The version output of the toolchain, see get_toolchain_version.
+        source_paths (List[str]): The source directories and files, e.g. the build work dir.
+        excluded_paths (List[str], optional): Paths left out of the hash, e.g. the build output. Defaults to None.
+    Returns:
+        str: The cache key.
+    """
+    key_hash = hashlib.sha256()
+    for line in [
+        platform.value,
+        " ".join(goal_command.split()),
+        toolchain_version,
+    ]:
+        key_hash.update(f"{line}\0".encode())
+
+    for index, source_path in enumerate(source_paths):
+        if os.path.isdir(source_path):
+            file_paths = _list_files(
+                source_path,
+                GENERATED_DIR_NAMES.get(platform, set()),
+                excluded_paths or [],
+                BUILD_DIR_NAMES.get(platform, set()),
+                MODULE_FILE_PATTERNS.get(platform, []),
+            )
+            root = source_path
+        else:
+            file_paths = [source_path] if os.path.isfile(source_path) else []
+            root = os.path.dirname(source_path)
+        for cache_file in _hash_files(root, file_paths):
+            is_executable = bool(cache_file.mode & 0o111)
+            key_hash.update(
+                f"{index}\0{cache_file.path}\0{is_executable}\0{cache_file.digest}\0".encode()
+            )
+    return key_hash.hexdigest()
+
+
+def _entry_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, ENTRIES_DIR_NAME, f"{key}.json")
+
+
+def _object_path(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, OBJECTS_DIR_NAME, digest[:2], digest)
+
+
+def _load_entry(entry_path: str) -> BuildCacheEntry:
+    with open(entry_path, "r") as f:
+        return BuildCacheEntry.from_json(f.read())
+
+
+def restore(
+    cache_dir: str,
+    key: str,
+    dest_path: str,
+    strategy: CopyStrategy = CopyStrategy.AUTO,
+    workers: int = None,
+) -> bool:
+    """
+    Restores the build output of a key into `dest_path`, replacing what is there.
+    The objects of the store are shared between entries, so they are never
+    hardlinked into the output, a HARDLINK strategy falls back to AUTO.
+    Returns:
+        bool: True on a cache hit.
+    """
+    entry_path = _entry_path(cache_dir, key)
+    if not os.path.exists(entry_path):
+        return False
+
+    with io_util.file_lock(os.path.join(cache_dir, LOCK_FILE_NAME), is_shared=True):
+        if not os.path.exists(entry_path):
+            return False
+        entry = _load_entry(entry_path)
+        file_pairs = [
+            (
+                _object_path(cache_dir, cache_file.digest),
+                os.path.join(dest_path, cache_file.path),
+            )
+            for cache_file in entry.files
+        ]
+        if not all(os.path.exists(object_path) for object_path, _ in file_pairs):
+            return False
+
+        start_s = time.perf_counter()
+        if os.path.lexists(dest_path):
+            io_util.delete_path(dest_path)
+        for dir_path in [""] + entry.dirs:
+            os.makedirs(os.path.join(dest_path, dir_path), exist_ok=True)
+        if strategy == CopyStrategy.HARDLINK:
+            strategy = CopyStrategy.AUTO
+        copy_stats = io_util.copy_files(file_pairs, strategy, workers)
+        for cache_file, (_, file_path) in zip(entry.files, file_pairs):
+            os.chmod(file_path, cache_file.mode)
+        os.utime(entry_path)
+
+    print(
+        f"Restored {copy_stats.files} files ({io_util.format_size(entry.size_bytes)}) "
+        f"of build cache entry {key[:12]} in {time.perf_counter() - start_s:.2f}s."
+    )
+    return True
+
+
+def save(
+    cache_dir: str,
+    key: str,
+    platform: Platform,
+    output_path: str,
+    goal_command: str = "",
+    toolchain_version: str = "",
+    workers: int = None,
+) -> BuildCacheEntry:
+    """
+    Stores a build output under its key. Files are stored once per content in
+    the object store, so unchanged jars or dlls of successive builds share it.
+    """
+    start_s = time.perf_counter()
+    file_paths = _list_files(output_path)
+    cache_files = _hash_files(output_path, file_paths)
+    entry = BuildCacheEntry(
+        key=key,
+        platform=platform.value,
+        goal_command=goal_command,
+        toolchain_version=toolchain_version,
+        files=cache_files,
+        dirs=sorted(
+            os.path.relpath(dir_path, output_path)
+            for dir_path, _, _ in os.walk(output_path)
+            if dir_path != output_path
+        ),
+        created_at=time.time(),
+    )
+
+    os.makedirs(os.path.join(cache_dir, ENTRIES_DIR_NAME), exist_ok=True)
+    with io_util.file_lock(os.path.join(cache_dir, LOCK_FILE_NAME)):
+        new_objects = {}
+        for file_path, cache_file in zip(file_paths, cache_files):
+            object_path = _object_path(cache_dir, cache_file.digest)
+            if not os.path.exists(object_path):
+                new_objects[object_path] = file_path
+        for object_path in new_objects:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        io_util.copy_files(
+            [
+                (file_path, f"{object_path}.partial")
+                for object_path, file_path in new_objects.items()
+            ],
+            workers=workers,
+        )
+        for object_path in new_objects:
+            os.rename(f"{object_path}.partial", object_path)
+
+        entry_path = _entry_path(cache_dir, key)
+        with open(f"{entry_path}.partial", "w") as f:
+            f.write(entry.to_json())
+        os.replace(f"{entry_path}.partial", entry_path)
+
+    print(
+        f"Saved build cache entry {key[:12]}: {len(cache_files)} files, "
+        f"{len(new_objects)} new objects in {time.perf_counter() - start_s:.2f}s."
+    )
+    return entry
+
+
+def evict(cache_dir: str, max_bytes: int, keep_key: str = None) -> BuildCacheStats:
+    """
+    Removes the least recently used entries until the objects they reference fit
+    the disk budget, then removes the objects no entry references anymore.
+    Returns:
+        BuildCacheStats: The number of evicted entries and the size of the store.
+    """
+    entries_dir = os.path.join(cache_dir, ENTRIES_DIR_NAME)
+    stats = BuildCacheStats()
+    if not os.path.isdir(entries_dir):
+        return stats
+
+    with io_util.file_lock(os.path.join(cache_dir, LOCK_FILE_NAME)):
+        entries = []
+        for dir_entry in os.scandir(entries_dir):
+            if dir_entry.name.endswith(".json"):
+                entries.append(
+                    (
+                        dir_entry.stat().st_mtime,
+                        dir_entry.path,
+                        _load_entry(dir_entry.path),
+                    )
+                )
+        entries.sort(key=lambda item: item[0])
+
+        object_refs = {}
+        object_sizes = {}
+        for _, _, entry in entries:
+            for cache_file in entry.files:
+                object_refs[cache_file.digest] = (
+                    object_refs.get(cache_file.digest, 0) + 1
+                )
+                object_sizes[cache_file.digest] = cache_file.size_bytes
+        size_bytes = sum(object_sizes.values())
+
+        for _, entry_path, entry in entries:
+            if size_bytes <= max_bytes:
+                break
+            if entry.key == keep_key:
+                continue
+            os.remove(entry_path)
+            stats.evicted_entries += 1
+            for cache_file in entry.files:
+                object_refs[cache_file.digest] -= 1
+                if object_refs[cache_file.digest] == 0:
+                    size_bytes -= object_sizes[cache_file.digest]
+
+        objects_dir = os.path.join(cache_dir, OBJECTS_DIR_NAME)
+        for object_path in (
+            _list_files(objects_dir) if os.path.isdir(objects_dir) else []
+        ):
+            if object_refs.get(os.path.basename(object_path), 0) <= 0:
+                os.remove(object_path)
+        stats.size_bytes = size_bytes
+
+    if stats.evicted_entries:
+        print(
+            f"Evicted {stats.evicted_entries} build cache entries, "
+            f"{io_util.format_size(size_bytes)} of {io_util.format_size(max_bytes)} used."
+        )
+    return stats
+
+
+def record_stats(
+    cache_dir: str, is_hit: bool, eviction_stats: BuildCacheStats = None
+) -> BuildCacheStats:
+    """
+    Adds the outcome of a lookup to the stats of the store, kept across runs.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    stats_path = os.path.join(cache_dir, STATS_FILE_NAME)
+    with io_util.file_lock(os.path.join(cache_dir, LOCK_FILE_NAME)):
+        stats = BuildCacheStats()
+        if os.path.exists(stats_path):
+            with open(stats_path, "r") as f:
+                stats = BuildCacheStats.from_json(f.read())
+        if is_hit:
+            stats.hits += 1
+        else:
+            stats.misses += 1
+        if eviction_stats is not None:
+            stats.evicted_entries += eviction_stats.evicted_entries
+            stats.size_bytes = eviction_stats.size_bytes
+        with open(f"{stats_path}.partial", "w") as f:
+            f.write(stats.to_json())
+        os.replace(f"{stats_path}.partial", stats_path)
+    return stats
@@ -0,0 +1,306 @@
+import contextlib
+import json
+import os
+import shlex
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+from app.exceptions.shell_exception import ExecutorShellError
+from app.models.build_daemon_model import BuildDaemon, BuildTiming
+from app.models.platform_model import Platform
+from app.services import shell_service
+from app.utils import io_util
+
+STATE_DIR_NAME = "one-press-build-daemons"
+DAEMONS_FILE_NAME = "daemons.json"
+TIMINGS_FILE_NAME = "timings.json"
+COMPARISON_FILE_NAME = "comparison.json"
+LOCK_FILE_NAME = ".lock"
+REGISTRY_DIR_NAME = "registry"
+DAEMON_MODE = "daemon"
+COLD_MODE = "cold"
+GRADLE_CMD_NAMES = {"gradle", "gradlew"}
+DOTNET_BUILD_VERBS = {"build", "publish", "test", "pack", "msbuild", "restore"}
+# The MSBuild server keeps the evaluation and the JIT-ed MSBuild between invocations.
+DOTNET_DAEMON_ENV_VARS = {
+    "DOTNET_CLI_USE_MSBUILD_SERVER": "1",
+    "MSBUILDDISABLENODEREUSE": "0",
+}
+
+
+def get_default_state_dir() -> str:
+    """
+    Returns a state dir scoped to the current job, so concurrent jobs of the same
+    user share neither the daemon registries nor the timings: the agent temp
+    directory, which Azure DevOps cleans after every job, or a temp dir keyed by
+    the build and job IDs.
+    """
+    agent_temp_dir = os.getenv("AGENT_TEMPDIRECTORY")
+    if agent_temp_dir:
+        return os.path.join(agent_temp_dir, STATE_DIR_NAME)
+    job_key = "-".join(
+        value
+        for value in [os.getenv("BUILD_BUILDID"), os.getenv("SYSTEM_JOBID")]
+        if value
+    )
+    return os.path.join(tempfile.gettempdir(), f"{STATE_DIR_NAME}-{job_key or 'local'}")
+
+
+def resolve_daemon(platform: Platform) -> BuildDaemon:
+    """
+    Returns the daemon able to run the builds of a platform, or None when there is
+    none or when its client is not installed, e.g. mvnd for Maven.
+    """
+    match platform:
+        case Platform.MAVEN:
+            if shutil.which("mvnd") is None:
+                print("Command mvnd is not installed, run Maven without a daemon.")
+                return None
+            return BuildDaemon.MVND
+        case Platform.GRADLE:
+            return BuildDaemon.GRADLE
+        case Platform.DOTNET:
+            return BuildDaemon.DOTNET_BUILD_SERVER
+    return None
+
+
+def get_registry_dir(state_dir: str, daemon: BuildDaemon) -> str:
+    """
+    Returns the registry of the Maven or Gradle daemons started by this job.
+    """
+    return os.path.join(state_dir, REGISTRY_DIR_NAME, daemon.value.lower())
+
+
+def to_daemon_cmd(
+    daemon: BuildDaemon, goal_command, registry_dir: str = None
+) -> List[str]:
+    """
+    Rewrites a build command to run on a daemon: `mvn` becomes `mvnd`, Gradle gets
+    `--daemon` and dotnet build verbs get `-nodeReuse:true`. Maven and Gradle keep
+    their daemons in `registry_dir` when it is set. Commands with a pipe are run
+    as they are.
+    """
+    cmd = shell_service.normalize_cmd(goal_command)
+    if isinstance(cmd, str) or not cmd:
+        return cmd
+
+    cmd_name = os.path.basename(cmd[0])
+    registry_args = daemon.get_registry_args(registry_dir) if registry_dir else []
+    match daemon:
+        case BuildDaemon.MVND:
+            if cmd_name in ("mvn", "mvnd"):
+                cmd[0] = "mvnd"
+                cmd[1:1] = registry_args
+        case BuildDaemon.GRADLE:
+            if cmd_name in GRADLE_CMD_NAMES:
+                if not ({"--daemon", "--no-daemon"} & set(cmd)):
+                    cmd.insert(1, "--daemon")
+                cmd[1:1] = registry_args
+        case BuildDaemon.DOTNET_BUILD_SERVER:
+            is_build_verb = len(cmd) > 1 and cmd[1] in DOTNET_BUILD_VERBS
+            if cmd_name == "dotnet" and is_build_verb:
+                if not any(arg.lower().startswith("-nodereuse") for arg in cmd):
+                    cmd.append("-nodeReuse:true")
+    return cmd
+
+
+def _read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data):
+    with open(f"{path}.partial", "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(f"{path}.partial", path)
+
+
+def register_daemon(state_dir: str, daemon: BuildDaemon) -> bool:
+    """
+    Records that a daemon runs for this job, so a later step can stop it.
+    Returns:
+        bool: True if an earlier step of this job already registered the daemon. It
+            is then expected to be warm, whether it is still running is not checked.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    daemons_path = os.path.join(state_dir, DAEMONS_FILE_NAME)
+    with io_util.file_lock(os.path.join(state_dir, LOCK_FILE_NAME)):
+        daemons = _read_json(daemons_path, [])
+        if daemon.value in daemons:
+            return True
+        _write_json(daemons_path, daemons + [daemon.value])
+    return False
+
+
+def record_timing(state_dir: str, timing: BuildTiming):
+    os.makedirs(state_dir, exist_ok=True)
+    timings_path = os.path.join(state_dir, TIMINGS_FILE_NAME)
+    with io_util.file_lock(os.path.join(state_dir, LOCK_FILE_NAME)):
+        timings = _read_json(timings_path, [])
+        _write_json(timings_path, timings + [timing.to_dict()])
+
+
+@contextlib.contextmanager
+def build_cmd(
+    platform: Platform, goal_command, is_daemon: bool = False, state_dir: str = None
+):
+    """
+    Yields the command to run a build with, on a daemon when `is_daemon` is set,
+    and records how long the block took as a daemon or cold timing in `state_dir`.
+    Args:
+        platform (Platform): The platform of the build.
+        goal_command (str | list): The build command.
+        is_daemon (bool, optional): Run on the daemon of the platform. Defaults to False.
+        state_dir (str, optional): Where the daemons and timings of the job are kept,
+            timings are not recorded without it. Defaults to get_default_state_dir in daemon mode.
+    """
+    daemon = resolve_daemon(platform) if is_daemon else None
+    cmd = goal_command
+    is_warm = False
+    if daemon is not None:
+        state_dir = state_dir or get_default_state_dir()
+        is_warm = register_daemon(state_dir, daemon)
+        if daemon == BuildDaemon.DOTNET_BUILD_SERVER:
+            # The step env vars are restored once the step is done.
+            os.environ.update(DOTNET_DAEMON_ENV_VARS)
+        cmd = to_daemon_cmd(daemon, goal_command, get_registry_dir(state_dir, daemon))
+        print(f"Run on the {daemon.value} daemon, {'warm' if is_warm else 'cold'}.")
+
+    started_at = time.time()
+    start_s = time.perf_counter()
+    yield cmd
+    if state_dir:
+        normalized_cmd = shell_service.normalize_cmd(goal_command)
+        record_timing(
+            state_dir,
+            BuildTiming(
+                platform=platform.value,
+                mode=DAEMON_MODE if daemon is not None else COLD_MODE,
+                goal_command=(
+                    normalized_cmd
+                    if isinstance(normalized_cmd, str)
+                    else shlex.join(normalized_cmd)
+                ),
+                duration_s=time.perf_counter() - start_s,
+                is_warm=is_warm,
+                started_at=started_at,
+            ),
+        )
+
+
+def compare_timings(state_dir: str) -> List[Dict]:
+    """
+    Compares the mean duration of each build command run cold, on a daemon being
+    started and on a warm daemon, and writes the comparison next to the timings.
+    A warm run is one whose daemon an earlier step of the job registered, the
+    daemon may have exited since and been started again by the run.
+    Returns:
+        List[Dict]: One row per platform and command.
+    """
+    timings = [
+        BuildTiming(**timing)
+        for timing in _read_json(os.path.join(state_dir, TIMINGS_FILE_NAME), [])
+    ]
+    durations = {}
+    for timing in timings:
+        if timing.mode == COLD_MODE:
+            column = "cold_s"
+        else:
+            column = "daemon_warm_s" if timing.is_warm else "daemon_start_s"
+        key = (timing.platform, timing.goal_command)
+        durations.setdefault(key, {}).setdefault(column, []).append(timing.duration_s)
+
+    def mean(values):
+        return sum(values) / len(values) if values else None
+
+    comparison = []
+    for (platform, goal_command), columns in durations.items():
+        row = {
+            "platform": platform,
+            "goal_command": goal_command,
+            "runs": sum(len(values) for values in columns.values()),
+        }
+        for column in ["cold_s", "daemon_start_s", "daemon_warm_s"]:
+            row[column] = mean(columns.get(column, []))
+        row["speedup"] = (
+            row["cold_s"] / row["daemon_warm_s"]
+            if row["cold_s"] and row["daemon_warm_s"]
+            else None
+        )
+        comparison.append(row)
+
+    if comparison:
+        _write_json(os.path.join(state_dir, COMPARISON_FILE_NAME), comparison)
+    return comparison
+
+
+def print_comparison(comparison: List[Dict]):
+    from tabulate import tabulate
+
+    print("> Build daemon timings.")
+    print(
+        tabulate(
+            [
+                [
+                    row["platform"],
+                    row["goal_command"],
+                    row["runs"],
+                    row["cold_s"],
+                    row["daemon_start_s"],
+                    row["daemon_warm_s"],
+                    row["speedup"],
+                ]
+                for row in comparison
+            ],
+            headers=[
+                "Platform",
+                "Command",
+                "Runs",
+                "Cold_s",
+                "Daemon_start_s",
+                "Daemon_warm_s",
+                "Speedup",
+            ],
+            tablefmt="grid",
+            floatfmt=".3f",
+        )
+    )
+    print(
+        "Warm runs are those whose daemon an earlier step registered, "
+        "it is not checked that the daemon was still running."
+    )
+
+
+def stop_daemons(state_dir: str) -> List[BuildDaemon]:
+    """
+    Stops the daemons started by the steps of this job. Maven and Gradle daemons
+    are stopped in the registry of the job only, while the dotnet build server is
+    shared by every job of the user and `dotnet build-server shutdown` stops the
+    servers of concurrent jobs too. A daemon failing to stop is reported and the
+    others are still stopped.
+    Returns:
+        List[BuildDaemon]: The daemons that were stopped.
+    """
+    daemons_path = os.path.join(state_dir, DAEMONS_FILE_NAME)
+    if not os.path.exists(daemons_path):
+        return []
+
+    stopped_daemons = []
+    with io_util.file_lock(os.path.join(state_dir, LOCK_FILE_NAME)):
+        for name in _read_json(daemons_path, []):
+            daemon = BuildDaemon(name)
+            print(f"> Stop the {daemon.value} daemon.")
+            try:
+                shell_service.execute_cmd(
+                    daemon.get_stop_cmd(get_registry_dir(state_dir, daemon)),
+                    trace_cmd=True,
+                )
+                stopped_daemons.append(daemon)
+            except (ExecutorShellError, FileNotFoundError) as e:
+                print(f"Failed to stop the {daemon.value} daemon: {e}")
+        os.remove(daemons_path)
+    return stopped_daemons
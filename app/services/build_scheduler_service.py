@@ -0,0 +1,208 @@
+import contextvars
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+from app.exceptions.shell_exception import ExecutorShellError
+from app.models.build_target_model import BuildTarget, BuildTargetResult
+from app.services import shell_service
+from app.utils import trace_util
+
+CGROUP_MEMORY_MAX_PATH = "/sys/fs/cgroup/memory.max"
+CGROUP_MEMORY_CURRENT_PATH = "/sys/fs/cgroup/memory.current"
+
+
+def get_cpu_budget() -> int:
+    """
+    Returns the number of CPUs this process may run on.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _read_int(path: str) -> int:
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def get_memory_budget_mb() -> int:
+    """
+    Returns the memory available to new processes: MemAvailable of /proc/meminfo,
+    capped by what is left of the cgroup v2 limit of a container.
+    """
+    available_kb = None
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available_kb = int(line.split()[1])
+                    break
+    except (OSError, ValueError):
+        pass
+    if available_kb is None:
+        available_kb = (
+            os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 1024
+        )
+
+    available_mb = available_kb // 1024
+    memory_max = _read_int(CGROUP_MEMORY_MAX_PATH)
+    memory_current = _read_int(CGROUP_MEMORY_CURRENT_PATH)
+    if memory_max is not None and memory_current is not None:
+        available_mb = min(available_mb, (memory_max - memory_current) // 1024**2)
+    return max(available_mb, 0)
+
+
+def _print_summary(targets: List[BuildTarget], results: Dict[str, BuildTargetResult]):
+    from tabulate import tabulate
+
+    rows = [
+        [
+            target.name,
+            target.platform,
+            results[target.name].status,
+            target.cpus,
+            target.memory_mb,
+            results[target.name].duration_s,
+            results[target.name].log_path,
+        ]
+        for target in targets
+    ]
+    print("> Build targets summary.")
+    print(
+        tabulate(
+            rows,
+            headers=[
+                "Target",
+                "Platform",
+                "Status",
+                "Cpus",
+                "Memory_mb",
+                "Duration_s",
+                "Log",
+            ],
+            tablefmt="grid",
+            floatfmt=".3f",
+        )
+    )
+
+
+def run_targets(
+    targets: List[BuildTarget],
+    build_target: Callable[[BuildTarget], None],
+    log_dir: str,
+    max_workers: int = None,
+    cpu_budget: int = None,
+    memory_budget_mb: int = None,
+) -> Dict[str, BuildTargetResult]:
+    """
+    Builds targets concurrently, starting a target only while the CPUs and memory
+    declared by the running targets leave room for it. Targets start in order, a
+    smaller target may start ahead of one that does not fit yet, and a target
+    larger than the whole budget still runs once nothing else is running.
+    The command output of each target is prefixed with its name and written to
+    `<log_dir>/<name>.log`.
+    Args:
+        targets (List[BuildTarget]): The targets to build.
+        build_target (Callable[[BuildTarget], None]): Builds one target, raises on failure.
+        log_dir (str): The directory of the per-target logs.
+        max_workers (int, optional): The max number of concurrent builds. Defaults to the CPU budget.
+        cpu_budget (int, optional): The CPUs to share. Defaults to get_cpu_budget.
+        memory_budget_mb (int, optional): The memory to share. Defaults to get_memory_budget_mb.
+    Returns:
+        Dict[str, BuildTargetResult]: The result of every target by name.
+    Raises:
+        ExecutorShellError: If any target failed, no new target is started after that.
+    """
+    cpu_budget = cpu_budget or get_cpu_budget()
+    memory_budget_mb = memory_budget_mb or get_memory_budget_mb()
+    max_workers = max(1, min(max_workers or cpu_budget, len(targets)))
+    results = {
+        target.name: BuildTargetResult(
+            name=target.name,
+            log_path=os.path.join(
+                os.path.abspath(log_dir), f"{target.name.lower()}.log"
+            ),
+        )
+        for target in targets
+    }
+    print(
+        f"> Build {len(targets)} targets with {max_workers} workers, "
+        f"{cpu_budget} CPUs and {memory_budget_mb} MiB of memory."
+    )
+
+    def run_target(target: BuildTarget, result: BuildTargetResult):
+        if os.path.exists(result.log_path):
+            os.remove(result.log_path)
+        result.status = "RUNNING"
+        result.start_s = time.perf_counter()
+        try:
+            with shell_service.log_to(target.name, result.log_path), trace_util.span(
+                f"Build {target.name}", category="target", platform=target.platform
+            ):
+                build_target(target)
+            result.status = "SUCCEEDED"
+        except Exception:
+            result.status = "FAILED"
+            raise
+        finally:
+            result.end_s = time.perf_counter()
+
+    pending = list(targets)
+    running = {}
+    used_cpus = 0
+    used_memory_mb = 0
+    is_failed = False
+    with trace_util.span("Build targets"):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for target in list(pending):
+                    if is_failed or len(running) >= max_workers:
+                        break
+                    is_fit = (
+                        used_cpus + target.cpus <= cpu_budget
+                        and used_memory_mb + target.memory_mb <= memory_budget_mb
+                    )
+                    if not is_fit and running:
+                        continue
+                    pending.remove(target)
+                    used_cpus += target.cpus
+                    used_memory_mb += target.memory_mb
+                    print(f"Start target {target.name}.")
+                    future = executor.submit(
+                        contextvars.copy_context().run,
+                        run_target,
+                        target,
+                        results[target.name],
+                    )
+                    running[future] = target
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    target = running.pop(future)
+                    used_cpus -= target.cpus
+                    used_memory_mb -= target.memory_mb
+                    try:
+                        future.result()
+                        print(f"Target {target.name} succeeded.")
+                    except Exception as e:
+                        print(f"Target {target.name} failed: {e}")
+                        is_failed = True
+
+    for target in pending:
+        results[target.name].status = "SKIPPED"
+    _print_summary(targets, results)
+
+    failed_targets = [
+        name for name, result in results.items() if result.status == "FAILED"
+    ]
+    if failed_targets:
+        raise ExecutorShellError(f"Build targets failed: {', '.join(failed_targets)}")
+    return results
@@ -0,0 +1,242 @@
+import contextlib
+import fnmatch
+import hashlib
+import os
+import threading
+import time
+from typing import List
+
+from app.models.build_cache_model import DependencyCacheStatus
+from app.models.os_model import CopyStrategy
+from app.models.platform_model import Platform
+from app.services import build_cache_service, trash_service
+from app.utils import io_util
+
+ENTRIES_DIR_NAME = "entries"
+LOCK_FILE_NAME = ".lock"
+LOCKFILE_PATTERNS = {
+    Platform.MAVEN: ["pom.xml"],
+    Platform.DOTNET: ["packages.lock.json", "*.csproj", "Directory.Packages.props"],
+    Platform.NPM: ["package-lock.json"],
+    Platform.PYTHON: ["requirements*.txt"],
+}
+SKIPPED_DIR_NAMES = {".git", "node_modules", "target", "bin", "obj"}
+
+# Concurrent builds of one job share e.g. ~/.m2, only one restores into it at once.
+_restore_locks = {}
+_restore_locks_lock = threading.Lock()
+
+
+def _get_restore_lock(dependency_path: str) -> threading.Lock:
+    with _restore_locks_lock:
+        return _restore_locks.setdefault(
+            os.path.abspath(dependency_path), threading.Lock()
+        )
+
+
+def get_dependency_path(platform: Platform, work_dir_path: str) -> str:
+    """
+    Returns where the toolchain of a platform keeps its downloaded dependencies.
+    """
+    match platform:
+        case Platform.MAVEN:
+            return os.path.expanduser("~/.m2/repository")
+        case Platform.DOTNET:
+            return os.getenv("NUGET_PACKAGES") or os.path.expanduser(
+                "~/.nuget/packages"
+            )
+        case Platform.NPM:
+            return os.path.join(work_dir_path, "node_modules")
+        case Platform.PYTHON:
+            return os.getenv("PIP_CACHE_DIR") or os.path.expanduser("~/.cache/pip")
+    return None
+
+
+def _find_lockfiles(platform: Platform, work_dir_path: str) -> List[str]:
+    patterns = LOCKFILE_PATTERNS.get(platform, [])
+    lockfile_paths = []
+    for dir_path, dir_names, file_names in os.walk(work_dir_path):
+        dir_names[:] = sorted(
+            name for name in dir_names if name not in SKIPPED_DIR_NAMES
+        )
+        for name in sorted(file_names):
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                lockfile_paths.append(os.path.join(dir_path, name))
+    return lockfile_paths
+
+
+def compute_key(
+    platform: Platform, work_dir_path: str, extra_lockfile_paths: List[str] = None
+) -> str:
+    """
+    The key is `<platform>-<hash>`, the hash covering the path and content of
+    every lockfile of the platform below the work dir, e.g. all pom.xml files.
+    """
+    lockfile_paths = _find_lockfiles(platform, work_dir_path)
+    for path in extra_lockfile_paths or []:
+        if path and os.path.isfile(path) and path not in lockfile_paths:
+            lockfile_paths.append(path)
+
+    key_hash = hashlib.sha256()
+    for path in lockfile_paths:
+        relative_path = os.path.relpath(path, work_dir_path)
+        digest = build_cache_service.hash_file(path)
+        key_hash.update(f"{relative_path}\0{digest}\0".encode())
+    print(f"Dependency cache key from {len(lockfile_paths)} lockfiles.")
+    return f"{platform.value.lower()}-{key_hash.hexdigest()[:32]}"
+
+
+def _find_entry(cache_dir: str, key: str):
+    """
+    Returns the entry of the key, or else the most recently used entry of the
+    same platform, whose dependencies are mostly still valid.
+    """
+    entries_dir = os.path.join(cache_dir, ENTRIES_DIR_NAME)
+    if not os.path.isdir(entries_dir):
+        return None, DependencyCacheStatus.MISS
+    exact_path = os.path.join(entries_dir, key)
+    if os.path.isdir(exact_path):
+        return exact_path, DependencyCacheStatus.HIT
+
+    prefix = f"{key.split('-', 1)[0]}-"
+    candidates = [
+        entry
+        for entry in os.scandir(entries_dir)
+        if entry.is_dir()
+        and entry.name.startswith(prefix)
+        and not entry.name.endswith(".partial")
+    ]
+    if not candidates:
+        return None, DependencyCacheStatus.MISS
+    latest = max(candidates, key=lambda entry: entry.stat().st_mtime)
+    return latest.path, DependencyCacheStatus.PARTIAL_HIT
+
+
+def restore(
+    cache_dir: str,
+    key: str,
+    dependency_path: str,
+    strategy: CopyStrategy = CopyStrategy.AUTO,
+) -> DependencyCacheStatus:
+    """
+    Restores the dependencies of the key, or of the closest entry, into the
+    dependency path. Maven and npm rewrite files of the restored tree in place,
+    e.g. `_remote.repositories`, so entries are never hardlinked into it, a
+    HARDLINK strategy falls back to AUTO, i.e. reflink or copy.
+    """
+    if strategy == CopyStrategy.HARDLINK:
+        strategy = CopyStrategy.AUTO
+    with io_util.file_lock(os.path.join(cache_dir, LOCK_FILE_NAME), is_shared=True):
+        entry_path, status = _find_entry(cache_dir, key)
+        if entry_path is None:
+            print(f"Dependency cache miss: {key}.")
+            return status
+        print(
+            f"Dependency cache {status.value.lower()}: {os.path.basename(entry_path)}."
+        )
+        with _get_restore_lock(dependency_path):
+            os.makedirs(dependency_path, exist_ok=True)
+            io_util.cp(f"{entry_path}/.", dependency_path, strategy=strategy)
+        os.utime(entry_path)
+    return status
+
+
+def save(cache_dir: str, key: str, dependency_path: str):
+    """
+    Stores the dependency path under the key, unless the key exists already.
+    The copy is made independent of the dependency path, and renamed into
+    place once complete.
+    """
+    entries_dir = os.path.join(cache_dir, ENTRIES_DIR_NAME)
+    entry_path = os.path.join(entries_dir, key)
+    if not os.path.isdir(dependency_path) or os.path.isdir(entry_path):
+        return
+
+    os.makedirs(entries_dir, exist_ok=True)
+    with io_util.file_lock(os.path.join(cache_dir, LOCK_FILE_NAME)):
+        if os.path.isdir(entry_path):
+            return
+        partial_path = f"{entry_path}.partial"
+        if os.path.exists(partial_path):
+            io_util.delete_path(partial_path)
+        os.makedirs(partial_path)
+        io_util.cp(f"{dependency_path}/.", partial_path, strategy=CopyStrategy.AUTO)
+        os.rename(partial_path, entry_path)
+    print(f"Saved dependency cache entry: {key}.")
+
+
+def evict(cache_dir: str, max_bytes: int, keep_key: str = None) -> int:
+    """
+    Removes the least recently used entries until the cache fits the disk budget.
+    Evicted entries are deleted in the background.
+    Returns:
+        int: The number of evicted entries.
+    """
+    entries_dir = os.path.join(cache_dir, ENTRIES_DIR_NAME)
+    if not os.path.isdir(entries_dir):
+        return 0
+
+    evicted_entries = 0
+    with io_util.file_lock(os.path.join(cache_dir, LOCK_FILE_NAME)):
+        entries = [
+            (
+                entry.stat().st_mtime,
+                entry.path,
+                io_util.dir_stats(entry.path).size_bytes,
+            )
+            for entry in os.scandir(entries_dir)
+            if entry.is_dir() and not entry.name.endswith(".partial")
+        ]
+        total_bytes = sum(size_bytes for _, _, size_bytes in entries)
+        for _, entry_path, size_bytes in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            if os.path.basename(entry_path) == keep_key:
+                continue
+            trash_service.delete_path(
+                entry_path,
+                trash_dir=os.path.join(cache_dir, trash_service.TRASH_DIR_NAME),
+            )
+            total_bytes -= size_bytes
+            evicted_entries += 1
+
+    print(
+        f"Dependency cache size: {io_util.format_size(total_bytes)} "
+        f"of {io_util.format_size(max_bytes)}, {evicted_entries} entries evicted."
+    )
+    return evicted_entries
+
+
+@contextlib.contextmanager
+def cached_dependencies(
+    cache_dir: str,
+    platform: Platform,
+    work_dir_path: str,
+    max_bytes: int,
+    strategy: CopyStrategy = CopyStrategy.AUTO,
+    extra_lockfile_paths: List[str] = None,
+):
+    """
+    Restores the dependencies of a platform before the build, and saves them
+    after a successful build unless they were restored from the exact key.
+    Yields:
+        DependencyCacheStatus: HIT, PARTIAL_HIT or MISS, None when not cached.
+    """
+    dependency_path = get_dependency_path(platform, work_dir_path)
+    if not cache_dir or dependency_path is None:
+        yield None
+        return
+
+    print("> Restore the dependency cache.")
+    os.makedirs(cache_dir, exist_ok=True)
+    start_s = time.perf_counter()
+    key = compute_key(platform, work_dir_path, extra_lockfile_paths)
+    status = restore(cache_dir, key, dependency_path, strategy)
+    print(f"Restored dependencies in {time.perf_counter() - start_s:.2f}s.")
+
+    yield status
+
+    if status != DependencyCacheStatus.HIT:
+        print("> Save the dependency cache.")
+        save(cache_dir, key, dependency_path)
+        evict(cache_dir, max_bytes, keep_key=key)
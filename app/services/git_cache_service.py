@@ -0,0 +1,150 @@
+import hashlib
+import os
+import re
+import time
+from typing import List
+
+from app.models.git_model import is_commit_id
+from app.services import shell_service
+from app.utils import io_util
+
+MIRROR_REFSPECS = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+URL_CREDENTIAL_PATTERN = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*://)[^/@]+@")
+
+
+def strip_credentials(git_url: str) -> str:
+    return URL_CREDENTIAL_PATTERN.sub(r"\1", git_url.strip())
+
+
+def normalize_git_url(git_url: str) -> str:
+    """
+    Normalizes a git URL so that the same repository always maps to the same
+    mirror: credentials, a trailing slash and a ".git" suffix are dropped and
+    the scheme and host are lowercased.
+    """
+    url = strip_credentials(git_url).rstrip("/")
+    url = url[: -len(".git")] if url.endswith(".git") else url
+    if "://" in url:
+        scheme, rest = url.split("://", 1)
+        host, _, path = rest.partition("/")
+        url = f"{scheme.lower()}://{host.lower()}/{path}"
+    return url
+
+
+def get_mirror_path(cache_dir: str, git_url: str) -> str:
+    normalized_url = normalize_git_url(git_url)
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", normalized_url.rsplit("/", 1)[-1])
+    digest = hashlib.sha256(normalized_url.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{name}-{digest}.git")
+
+
+def update_mirror(cache_dir: str, git_url: str, credential_url: str) -> str:
+    """
+    Creates the bare mirror of a repository on first use, or fetches only the new
+    objects into it afterwards. The stored remote URL never holds credentials.
+    Args:
+        cache_dir (str): The directory holding the mirrors.
+        git_url (str): The URL of the repository without credentials.
+        credential_url (str): The URL used to fetch, it may hold credentials.
+    Returns:
+        str: The path of the up to date mirror.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    mirror_path = get_mirror_path(cache_dir, git_url)
+
+    with io_util.file_lock(f"{mirror_path}.lock"):
+        if os.path.isdir(mirror_path):
+            print(f"> Mirror cache hit, fetch into {mirror_path}.")
+            shell_service.git_fetch(credential_url, MIRROR_REFSPECS, cwd=mirror_path)
+        else:
+            print(f"> Mirror cache miss, create {mirror_path}.")
+            partial_mirror_path = f"{mirror_path}.partial"
+            if os.path.exists(partial_mirror_path):
+                io_util.delete_path(partial_mirror_path)
+            shell_service.git_clone_mirror(credential_url, partial_mirror_path)
+            shell_service.git_remote_set_url(
+                strip_credentials(git_url), cwd=partial_mirror_path
+            )
+            os.rename(partial_mirror_path, mirror_path)
+        os.utime(mirror_path)
+
+    return mirror_path
+
+
+def evict(cache_dir: str, max_bytes: int, keep_path: str = None):
+    """
+    Removes the least recently used mirrors until the cache fits the disk budget.
+    Mirrors locked by another job and the mirror at `keep_path` are never removed.
+    Args:
+        cache_dir (str): The directory holding the mirrors.
+        max_bytes (int): The disk budget of the cache.
+        keep_path (str, optional): The path of a mirror to keep. Defaults to None.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+
+    mirrors = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir(follow_symlinks=False) and entry.name.endswith(".git"):
+            size_bytes = io_util.dir_stats(entry.path).size_bytes
+            mirrors.append((entry.stat().st_mtime, entry.path, size_bytes))
+
+    total_bytes = sum(size_bytes for _, _, size_bytes in mirrors)
+    print(
+        f"Mirror cache size: {io_util.format_size(total_bytes)} "
+        f"of {io_util.format_size(max_bytes)}."
+    )
+    for _, mirror_path, size_bytes in sorted(mirrors):
+        if total_bytes <= max_bytes:
+            break
+        if keep_path and os.path.samefile(mirror_path, keep_path):
+            continue
+
+        lock_file = io_util.try_file_lock(f"{mirror_path}.lock")
+        if lock_file is None:
+            continue
+        with lock_file:
+            print(f"Evict mirror: {mirror_path}.")
+            io_util.delete_path(mirror_path)
+        total_bytes -= size_bytes
+
+
+def clone_from_mirror(
+    cache_dir: str,
+    git_url: str,
+    credential_url: str,
+    git_branch: str,
+    max_bytes: int = None,
+    clone_args: List[str] = None,
+    cwd: str = None,
+):
+    """
+    Refreshes the mirror of the repository, then clones the branch from it into
+    `cwd`, or the current directory. Objects are hardlinked from the mirror, so
+    the clone costs no network and little disk. Another job may evict the mirror
+    between the refresh and the shared lock of the clone, it is refreshed again then.
+    """
+    # A commit SHA cannot be cloned with `--branch`, the caller checks it out.
+    branch_args = (
+        ["--no-checkout"]
+        if is_commit_id(git_branch)
+        else ["--single-branch", "--branch", git_branch]
+    )
+    while True:
+        mirror_path = update_mirror(cache_dir, git_url, credential_url)
+
+        clone_start_s = time.perf_counter()
+        with io_util.file_lock(f"{mirror_path}.lock", is_shared=True):
+            if os.path.isdir(mirror_path):
+                shell_service.git_clone(
+                    mirror_path,
+                    clone_args=branch_args + (clone_args or []),
+                    cwd=cwd,
+                )
+                break
+        print(f"Mirror {mirror_path} was evicted before the clone.")
+    shell_service.git_remote_set_url(strip_credentials(git_url), cwd=cwd)
+    print(f"Cloned from mirror in {time.perf_counter() - clone_start_s:.2f}s.")
+
+    if max_bytes is not None:
+        evict(cache_dir, max_bytes, keep_path=mirror_path)
@@ -1,9 +1,23 @@
 import os
+import time
+from typing import List
 
-from app.services import shell_service
+from app.models.git_model import GitCloneStrategy, is_commit_id
+from app.models.os_model import ArchiveCodec, ArchiveStats
+from app.services import git_cache_service, shell_service, trash_service
 from app.utils import io_util
 
 
+def get_credential_url(
+    git_url: str, is_private_repo: bool, git_username: str, git_token: str
+) -> str:
+    if not is_private_repo:
+        return git_url
+    git_protocol = git_url.split("://")[0] + "://"
+    git_uri = git_url.replace(git_protocol, "")
+    return f"{git_protocol}{git_username}:{git_token}@{git_uri}"
+
+
 def clone(
     app_source_prefix_path: str,
     app_source: str,
@@ -13,53 +27,190 @@ def clone(
     git_username: str,
     git_token: str,
     is_delete_git_dir: bool = True,
+    clone_strategy: GitCloneStrategy = GitCloneStrategy.SHALLOW,
+    clone_depth: int = 1,
+    mirror_cache_dir: str = None,
+    mirror_cache_max_bytes: int = None,
+    sparse_checkout_dirs: List[str] = None,
+    is_skip_checkout: bool = False,
+    is_background_delete: bool = False,
 ):
     """
     Clones a git repository and performs various operations on the cloned repository.
+    Every git command runs with its own working directory and the process-wide
+    current directory is never changed, so several clones can run in threads.
     Args:
         app_source_prefix_path (str): The prefix path where the app source will be cloned.
         app_source (str): The name of the app source.
         is_private_repo (bool): Indicates whether the git repository is private or not.
-        git_branch (str): The branch to checkout after cloning the repository.
+        git_branch (str): The branch, tag or full commit SHA to checkout after cloning the repository.
         git_url (str): The URL of the git repository.
         git_username (str): The username for authentication (if the repository is private).
         git_token (str): The token for authentication (if the repository is private).
         is_delete_git_dir (bool): Indicates whether the .git directory should be deleted after cloning.
+        clone_strategy (GitCloneStrategy): How much history and objects to fetch. Defaults to SHALLOW.
+        clone_depth (int): The number of commits fetched by the SHALLOW strategy. Defaults to 1.
+        mirror_cache_dir (str): Clone through a local mirror cache in this directory, the clone strategy is not used then. Defaults to None.
+        mirror_cache_max_bytes (int): The disk budget of the mirror cache. Defaults to None.
+        sparse_checkout_dirs (List[str]): Check out only these directories and the root files (cone mode). Defaults to None.
+        is_skip_checkout (bool): Fetch the objects only, without a working tree, e.g. to archive from git objects. Defaults to False.
+        is_background_delete (bool): Move the .git directory to a trash next to the app source and delete it in the background. Defaults to False.
     Returns:
-        dict: A dictionary containing the git commit ID and the shortened git commit ID.
+        dict: A dictionary containing the git commit ID, the shortened git commit ID,
+            the size of the fetched objects and the clone duration.
     Raises:
         subprocess.CalledProcessError: If an error occurs while executing a git command.
     """
 
     app_source_path = os.path.join(app_source_prefix_path, app_source)
 
-    if is_private_repo:
-        git_protocol = git_url.split("://")[0] + "://"
-        git_uri = git_url.replace(git_protocol, "")
-        credential_url = f"{git_protocol}{git_username}:{git_token}@{git_uri}"
-    else:
-        credential_url = git_url
+    credential_url = get_credential_url(
+        git_url, is_private_repo, git_username, git_token
+    )
 
-    print("> Cloning app source...")
+    print(f"> Cloning {app_source}...")
     os.makedirs(app_source_path, exist_ok=True)
-    os.chdir(app_source_path)
 
-    shell_service.git_clone(credential_url)
-    shell_service.git_checkout(git_branch)
+    if is_skip_checkout:
+        sparse_checkout_dirs = None
+    no_checkout_args = (
+        ["--no-checkout"] if sparse_checkout_dirs or is_skip_checkout else []
+    )
+    is_commit = is_commit_id(git_branch)
+    clone_start_s = time.perf_counter()
+    if mirror_cache_dir:
+        git_cache_service.clone_from_mirror(
+            mirror_cache_dir,
+            git_url,
+            credential_url,
+            git_branch,
+            max_bytes=mirror_cache_max_bytes,
+            clone_args=no_checkout_args,
+            cwd=app_source_path,
+        )
+    elif is_commit and clone_strategy != GitCloneStrategy.FULL:
+        # `git clone --branch` only takes branch and tag names, so the commit is
+        # fetched into an empty repository instead.
+        print(f"Clone strategy: {clone_strategy.value}, fetch commit {git_branch}.")
+        shell_service.git_init(cwd=app_source_path)
+        shell_service.git_fetch_commit(
+            credential_url,
+            git_branch,
+            fetch_args=clone_strategy.get_fetch_args(clone_depth),
+            cwd=app_source_path,
+        )
+    else:
+        print(f"Clone strategy: {clone_strategy.value}.")
+        shell_service.git_clone(
+            credential_url,
+            clone_args=clone_strategy.get_clone_args(git_branch, clone_depth)
+            + no_checkout_args,
+            cwd=app_source_path,
+        )
+
+    if sparse_checkout_dirs:
+        print(f"Sparse checkout directories: {', '.join(sparse_checkout_dirs)}.")
+        shell_service.git_sparse_checkout_set(sparse_checkout_dirs, cwd=app_source_path)
+    if is_skip_checkout and is_commit:
+        shell_service.git_update_ref_head(git_branch, cwd=app_source_path)
+    elif sparse_checkout_dirs or (
+        not is_skip_checkout
+        and (
+            is_commit
+            or (not mirror_cache_dir and clone_strategy == GitCloneStrategy.FULL)
+        )
+    ):
+        shell_service.git_checkout(git_branch, cwd=app_source_path)
+    clone_duration_s = time.perf_counter() - clone_start_s
 
-    git_commit_id = shell_service.git_get_commit_id().stdout
+    git_commit_id = shell_service.git_get_commit_id(cwd=app_source_path).stdout
     git_short_commit_id = git_commit_id[:8]
 
+    if sparse_checkout_dirs:
+        tagged_files = shell_service.git_ls_files_tagged(
+            cwd=app_source_path
+        ).stdout.splitlines()
+        skipped_files = sum(1 for line in tagged_files if line.startswith("S "))
+        print(f"Sparse checkout skipped {skipped_files} of {len(tagged_files)} files.")
+
+    git_objects_stats = io_util.dir_stats(os.path.join(app_source_path, ".git/objects"))
+    print(
+        f"Fetched {io_util.format_size(git_objects_stats.size_bytes)} of git objects "
+        f"in {clone_duration_s:.2f}s."
+    )
+
     if is_delete_git_dir:
         print("> Remove .git directory.\n")
         git_vsc_dir = os.path.join(app_source_path, ".git")
-        io_util.delete_path(git_vsc_dir)
+        trash_service.delete_path(
+            git_vsc_dir,
+            trash_dir=os.path.join(
+                app_source_prefix_path, trash_service.TRASH_DIR_NAME
+            ),
+            is_background=is_background_delete,
+        )
 
-    os.chdir(app_source_prefix_path)
     print("> Verify content of source.")
     shell_service.ls(app_source_path)
 
     return {
         "git_commit_id": git_commit_id,
         "git_short_commit_id": git_short_commit_id,
+        "git_objects_bytes": git_objects_stats.size_bytes,
+        "git_clone_duration_s": round(clone_duration_s, 3),
     }
+
+
+def archive(
+    repo_path: str,
+    archive_path: str,
+    prefix: str,
+    codec: ArchiveCodec = ArchiveCodec.DEFLATE,
+    level: int = 6,
+    paths: List[str] = None,
+    tree_ish: str = "HEAD",
+) -> ArchiveStats:
+    """
+    Writes the snapshot of a commit straight from the object database, without
+    reading the working tree, which does not even need to be checked out.
+    Args:
+        repo_path (str): The path of the repository.
+        archive_path (str): The path of the archive, a .zip, or a .tar.zst for ZSTD.
+        prefix (str): The top-level directory of the entries in the archive.
+        codec (ArchiveCodec, optional): STORED, DEFLATE or ZSTD, ZSTD needs the zstd CLI. Defaults to DEFLATE.
+        level (int, optional): The compression level. Defaults to 6.
+        paths (List[str], optional): Only archive these paths of the tree. Defaults to None.
+        tree_ish (str, optional): The commit or tree to archive. Defaults to "HEAD".
+    Returns:
+        ArchiveStats: The size of the archive and the duration of the run.
+    """
+    config_args = []
+    if codec == ArchiveCodec.ZSTD:
+        config_args = ["-c", f"tar.tar.zst.command=zstd -T0 -{level} -q -c"]
+        archive_format = "tar.zst"
+        compress_args = []
+    else:
+        archive_format = "zip"
+        compress_args = [f"-{0 if codec == ArchiveCodec.STORED else min(level, 9)}"]
+
+    start_s = time.perf_counter()
+    shell_service.git_archive(
+        os.path.abspath(archive_path),
+        archive_format=archive_format,
+        prefix=f"{prefix}/",
+        tree_ish=tree_ish,
+        paths=paths,
+        compress_args=compress_args,
+        config_args=config_args,
+        cwd=repo_path,
+        trace_cmd=True,
+    )
+    stats = ArchiveStats(
+        output_bytes=os.path.getsize(archive_path),
+        duration_s=time.perf_counter() - start_s,
+    )
+    print(
+        f"Archived {tree_ish} from git objects into {archive_path}: "
+        f"{io_util.format_size(stats.output_bytes)} in {stats.duration_s:.2f}s."
+    )
+    return stats
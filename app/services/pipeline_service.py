@@ -0,0 +1,257 @@
+import contextvars
+import json
+import os
+import re
+import string
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+from app.exceptions.shell_exception import ExecutorShellError
+from app.models.function_model import Function
+from app.models.pipeline_model import PipelineNode, PipelineNodeResult
+from app.utils import trace_util
+
+SET_VARIABLE_PATTERN = re.compile(
+    r"##vso\[task\.setvariable variable=([^;\]]+)[^\]]*\](.*)"
+)
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "main.py")
+
+_print_lock = threading.Lock()
+
+
+def load_pipeline(pipeline_file_path: str):
+    """
+    Reads a pipeline file like
+    {"max_workers": 2, "nodes": [{"id": ..., "function": ..., "env": {...}, "depends_on": [...]}]}.
+    Returns:
+        tuple: The validated nodes in topological order and the max number of workers.
+    Raises:
+        ValueError: If a function or dependency is unknown or the graph has a cycle.
+    """
+    with open(pipeline_file_path, "r") as file:
+        pipeline = json.load(file)
+
+    nodes = [PipelineNode.from_dict(node) for node in pipeline["nodes"]]
+    max_workers = int(pipeline.get("max_workers", os.cpu_count() or 1))
+    return _sort_nodes(nodes), max_workers
+
+
+def _sort_nodes(nodes: List[PipelineNode]) -> List[PipelineNode]:
+    nodes_by_id = {}
+    for node in nodes:
+        Function(node.function)
+        if node.id in nodes_by_id:
+            raise ValueError(f"Duplicate pipeline node: {node.id}")
+        nodes_by_id[node.id] = node
+
+    for node in nodes:
+        for dependency in node.depends_on:
+            if dependency not in nodes_by_id:
+                raise ValueError(f"Node {node.id} depends on unknown node {dependency}")
+
+    sorted_nodes = []
+    visiting = set()
+    visited = set()
+
+    def visit(node: PipelineNode):
+        if node.id in visited:
+            return
+        if node.id in visiting:
+            raise ValueError(f"Pipeline has a dependency cycle at node {node.id}")
+        visiting.add(node.id)
+        for dependency in node.depends_on:
+            visit(nodes_by_id[dependency])
+        visiting.remove(node.id)
+        visited.add(node.id)
+        sorted_nodes.append(node)
+
+    for node in nodes:
+        visit(node)
+    return sorted_nodes
+
+
+def _log(node_id: str, line: str):
+    # Azure DevOps only reads logging commands at the start of a line.
+    if not line.startswith("##vso["):
+        line = f"[{node_id}] {line}"
+    with _print_lock:
+        print(line, flush=True)
+
+
+def _run_node(node: PipelineNode, inherited_vars: Dict[str, str], result):
+    """
+    Runs a node as `python app/main.py <FUNCTION>` with the vars exported by its
+    dependencies, prefixing every output line with the node id.
+    """
+    env = {**os.environ, **inherited_vars}
+    env.update(
+        {k: string.Template(v).safe_substitute(env) for k, v in node.env.items()}
+    )
+
+    result.status = "RUNNING"
+    result.start_s = time.perf_counter()
+    with trace_util.span(f"[{node.id}] {node.function}", category="node") as span:
+        process = subprocess.Popen(
+            [sys.executable, MAIN_PATH, node.function],
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            bufsize=1,
+        )
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            _log(node.id, line)
+            matched = SET_VARIABLE_PATTERN.match(line)
+            if matched:
+                result.exported_vars[matched.group(1)] = matched.group(2)
+        result.exit_code = process.wait()
+        span.attrs["exit_code"] = result.exit_code
+
+    result.end_s = time.perf_counter()
+    result.status = "SUCCEEDED" if result.exit_code == 0 else "FAILED"
+    return result
+
+
+def _find_critical_path(
+    nodes: List[PipelineNode], results: Dict[str, PipelineNodeResult]
+):
+    """
+    Walks back from the node that finished last, always through the dependency
+    that finished last, i.e. the one the node actually waited for.
+    """
+    finished = [node for node in nodes if results[node.id].end_s is not None]
+    if not finished:
+        return []
+
+    nodes_by_id = {node.id: node for node in nodes}
+    current = max(finished, key=lambda node: results[node.id].end_s)
+    critical_path = [current.id]
+    while current.depends_on:
+        current = nodes_by_id[
+            max(current.depends_on, key=lambda id: results[id].end_s or 0.0)
+        ]
+        critical_path.append(current.id)
+    return list(reversed(critical_path))
+
+
+def _print_summary(nodes, results, critical_path, origin_s, wall_time_s):
+    from tabulate import tabulate
+
+    rows = []
+    for node in nodes:
+        result = results[node.id]
+        rows.append(
+            [
+                node.id,
+                node.function,
+                result.status,
+                result.exit_code,
+                result.start_s - origin_s if result.start_s is not None else None,
+                result.duration_s,
+                "*" if node.id in critical_path else "",
+            ]
+        )
+    print("> Pipeline summary.")
+    print(
+        tabulate(
+            rows,
+            headers=[
+                "Node",
+                "Function",
+                "Status",
+                "Exit_code",
+                "Start_s",
+                "Duration_s",
+                "Critical",
+            ],
+            tablefmt="grid",
+            floatfmt=".3f",
+        )
+    )
+    critical_path_s = sum(results[id].duration_s for id in critical_path)
+    busy_s = sum(result.duration_s for result in results.values())
+    print(f"Critical path: {' -> '.join(critical_path)} ({critical_path_s:.3f}s).")
+    print(f"Wall time: {wall_time_s:.3f}s, sum of node durations: {busy_s:.3f}s.")
+
+
+def run_pipeline(pipeline_file_path: str) -> Dict[str, PipelineNodeResult]:
+    """
+    Runs the nodes of a pipeline file, each as its own process, starting every
+    node as soon as its dependencies succeeded and with at most `max_workers`
+    nodes running at once. Vars exported by a node through
+    `##vso[task.setvariable]` are passed on to the nodes depending on it.
+    Args:
+        pipeline_file_path (str): The path of the pipeline file.
+    Returns:
+        Dict[str, PipelineNodeResult]: The result of every node by node id.
+    Raises:
+        ExecutorShellError: If any node failed, no new node is started after that.
+    """
+    nodes, max_workers = load_pipeline(pipeline_file_path)
+    nodes_by_id = {node.id: node for node in nodes}
+    results = {node.id: PipelineNodeResult(node_id=node.id) for node in nodes}
+    print(f"> Run pipeline with {len(nodes)} nodes and {max_workers} workers.")
+
+    def inherited_vars(node: PipelineNode) -> Dict[str, str]:
+        vars = {}
+        for dependency in node.depends_on:
+            vars.update(inherited_vars(nodes_by_id[dependency]))
+            vars.update(results[dependency].exported_vars)
+        return vars
+
+    origin_s = time.perf_counter()
+    pending = list(nodes)
+    running = {}
+    is_failed = False
+    with trace_util.span("Pipeline", category="pipeline"):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                if not is_failed:
+                    for node in list(pending):
+                        if all(
+                            results[d].status == "SUCCEEDED" for d in node.depends_on
+                        ):
+                            pending.remove(node)
+                            context = contextvars.copy_context()
+                            future = executor.submit(
+                                context.run,
+                                _run_node,
+                                node,
+                                inherited_vars(node),
+                                results[node.id],
+                            )
+                            running[future] = node
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        _log(node.id, f"Failed to run: {e}")
+                        results[node.id].status = "FAILED"
+                        is_failed = True
+                        continue
+                    if result.status == "FAILED":
+                        is_failed = True
+
+    for node in pending:
+        results[node.id].status = "SKIPPED"
+
+    wall_time_s = time.perf_counter() - origin_s
+    critical_path = _find_critical_path(nodes, results)
+    _print_summary(nodes, results, critical_path, origin_s, wall_time_s)
+
+    failed_nodes = [id for id, result in results.items() if result.status == "FAILED"]
+    if failed_nodes:
+        raise ExecutorShellError(f"Pipeline nodes failed: {', '.join(failed_nodes)}")
+    return results
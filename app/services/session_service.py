@@ -0,0 +1,74 @@
+import os
+from typing import Callable, Dict
+
+from app.models.publisher_model import Publisher
+from app.models.session_model import SessionContext
+
+_context = SessionContext()
+
+
+def get_context() -> SessionContext:
+    return _context
+
+
+def get_publisher(publish_file_path: str) -> Publisher:
+    """
+    Parses the publish file once per session, it is parsed again only when the
+    file has been modified since.
+    Args:
+        publish_file_path (str): The path of the publish file.
+    Returns:
+        Publisher: The parsed publisher.
+    Raises:
+        FileNotFoundError: If the publish file does not exist.
+    """
+    key = os.path.abspath(publish_file_path)
+    if os.path.exists(key):
+        mtime_ns = os.stat(key).st_mtime_ns
+        cached = _context.publishers.get(key)
+        if cached is not None and cached[0] == mtime_ns:
+            print(f"Reuse publisher parsed in this session: {publish_file_path}.")
+            return cached[1]
+
+    publisher = Publisher.from_file(publish_file_path)
+    _context.publishers[key] = (mtime_ns, publisher)
+    return publisher
+
+
+def login_once(
+    registry_kind: str, server_uri: str, server_username: str, login: Callable
+) -> bool:
+    """
+    Logs in to a registry unless the same user is already logged in to it in
+    this session.
+    Args:
+        registry_kind (str): The kind of registry, e.g. "docker" or "helm".
+        server_uri (str): The URI of the registry server.
+        server_username (str): The username used to log in.
+        login (Callable): Performs the login when called without arguments.
+    Returns:
+        bool: True if the login was performed, False if the session was reused.
+    """
+    registry_session = (registry_kind, server_uri, server_username)
+    if registry_session in _context.registry_sessions:
+        print(f"Reuse {registry_kind} login to {server_uri} from this session.")
+        return False
+
+    login()
+    _context.registry_sessions.append(registry_session)
+    return True
+
+
+def export_var(name: str, value: str):
+    """
+    Records a variable exposed to later steps and makes it visible to functions
+    running later in the same session.
+    """
+    if value is None:
+        return
+    _context.exported_vars[name] = str(value)
+    os.environ[name] = str(value)
+
+
+def get_exported_vars() -> Dict[str, str]:
+    return dict(_context.exported_vars)
@@ -1,41 +1,352 @@
+import collections
+import contextlib
+import contextvars
 import enum
+import os
 import shlex
 import subprocess
+import sys
 import textwrap
+import threading
+import time
+from typing import List
 
 from app.exceptions.shell_exception import ExecutorShellError
 from app.models.os_model import LogType
+from app.models.shell_model import ResourceUsage
+from app.utils import io_util, trace_util
+
+STREAM_TAIL_LINES = 200
+
+_log_prefix = contextvars.ContextVar("log_prefix", default="")
+_log_file = contextvars.ContextVar("log_file", default=None)
+_log_lock = threading.Lock()
 
 
 class ShellCommand(enum.Enum):
-    GIT_CLONE = "git clone {credential_url} {dest_path}"
-    GIT_CHECKOUT = "git checkout {branch}"
-    GIT_GET_COMMIT_ID = "git rev-parse HEAD"
-    LS = "ls -la {path}"
-    TREE = "tree -a {path}"
-    MKDIR = "mkdir -p {path}"
-    CAT = "cat {path}"
-    ZIP = "zip -r {archive_path} {archive_name}"
-    DOCKER_LOGIN = "echo {server_password} | docker login {server_uri} -u {server_username} --password-stdin"
-    DOCKER_BUILD = "docker build {os_platform} -t {docker_server_uri}/{image_name}:{image_tag} {build_context} {container_args_str}"
-    DOCKER_PUSH = "docker push {docker_server_uri}/{image_name}:{image_tag}"
-    HELM_REGISTRY_LOGIN = "echo {helm_server_password} | helm registry login {helm_server_uri} --username {helm_server_username} --password-stdin"
-    HELM_PULL = "helm pull oci://{helm_server_uri}/helm/{helm_chart_name} --version {helm_chart_version} --untar"
+    GIT_CLONE = ("git", "clone", "{clone_args}", "{credential_url}", "{dest_path}")
+    GIT_CLONE_MIRROR = ("git", "clone", "--mirror", "{credential_url}", "{dest_path}")
+    GIT_FETCH = ("git", "fetch", "--prune", "{credential_url}", "{refspecs}")
+    GIT_FETCH_COMMIT = (
+        "git",
+        "fetch",
+        "{fetch_args}",
+        "{credential_url}",
+        "{commit_id}",
+    )
+    GIT_INIT = ("git", "init", "--quiet")
+    GIT_UPDATE_REF_HEAD = ("git", "update-ref", "--no-deref", "HEAD", "{commit_id}")
+    GIT_REMOTE_SET_URL = ("git", "remote", "set-url", "origin", "{git_url}")
+    GIT_CHECKOUT = ("git", "checkout", "{branch}")
+    GIT_SPARSE_CHECKOUT_SET = ("git", "sparse-checkout", "set", "--cone", "{dirs}")
+    GIT_LS_FILES_TAGGED = ("git", "ls-files", "-t")
+    GIT_LS_REMOTE = ("git", "ls-remote", "{credential_url}", "{refs}")
+    GIT_ARCHIVE = (
+        "git",
+        "{config_args}",
+        "archive",
+        "--format={format}",
+        "--prefix={prefix}",
+        "{compress_args}",
+        "-o",
+        "{output_path}",
+        "{tree_ish}",
+        "{paths}",
+    )
+    GIT_GET_COMMIT_ID = ("git", "rev-parse", "HEAD")
+    LS = ("ls", "-la", "{path}")
+    TREE = ("tree", "-a", "{path}")
+    MKDIR = ("mkdir", "-p", "{path}")
+    CAT = ("cat", "{path}")
+    ZIP = ("zip", "-r", "{archive_path}", "{archive_name}")
+    DOCKER_LOGIN = (
+        "docker",
+        "login",
+        "{server_uri}",
+        "-u",
+        "{server_username}",
+        "--password-stdin",
+    )
+    DOCKER_BUILD = (
+        "docker",
+        "build",
+        "{os_platform}",
+        "-t",
+        "{docker_server_uri}/{image_name}:{image_tag}",
+        "{build_context}",
+        "{container_args}",
+    )
+    DOCKER_PUSH = ("docker", "push", "{docker_server_uri}/{image_name}:{image_tag}")
+    HELM_REGISTRY_LOGIN = (
+        "helm",
+        "registry",
+        "login",
+        "{helm_server_uri}",
+        "--username",
+        "{helm_server_username}",
+        "--password-stdin",
+    )
+    HELM_PULL = (
+        "helm",
+        "pull",
+        "oci://{helm_server_uri}/helm/{helm_chart_name}",
+        "--version",
+        "{helm_chart_version}",
+        "--untar",
+    )
     HELM_UPGRADE = (
-        "helm upgrade --install --wait --force {project_name} {helm_chart_path} \n"
-        "-f {helm_values_file_path} \n"
-        "-f {helm_values_env_file_path} \n"
-        "--set deployment.containers.{container_name}.image.repository={docker_server_uri}/{image_name} \n"
-        "--set deployment.containers.{container_name}.image.tag={image_tag} {set_args_str}"
+        "helm",
+        "upgrade",
+        "--install",
+        "--wait",
+        "--force",
+        "{project_name}",
+        "{helm_chart_path}",
+        "-f",
+        "{helm_values_file_path}",
+        "-f",
+        "{helm_values_env_file_path}",
+        "--set",
+        "deployment.containers.{container_name}.image.repository={docker_server_uri}/{image_name}",
+        "--set",
+        "deployment.containers.{container_name}.image.tag={image_tag}",
+        "{set_args}",
+    )
+    CONDA_CREATE_VENV = (
+        "conda",
+        "create",
+        "--name",
+        "{venv_name}",
+        "python={python_version}",
+        "-y",
     )
-    CONDA_CREATE_VENV = "conda create --name {venv_name} python={python_version} -y"
     CONDA_RUN_INSTALL_LIBS = (
-        "conda run -n {venv_name} pip install -r {requirements_txt_path}"
+        "conda",
+        "run",
+        "-n",
+        "{venv_name}",
+        "pip",
+        "install",
+        "-r",
+        "{requirements_txt_path}",
+    )
+    CONDA_RUN_WITH_GOAL = ("conda", "run", "-n", "{venv_name}", "{goal_cmd}")
+
+    def get_command(self, **kwargs) -> List[str]:
+        """
+        Renders the argv template. A token that is a single placeholder bound to
+        a list or tuple is expanded into that many arguments.
+        """
+        argv = []
+        for token in self.value:
+            value = kwargs.get(token[1:-1]) if _is_placeholder(token) else None
+            if isinstance(value, (list, tuple)):
+                argv.extend(str(arg) for arg in value)
+            else:
+                argv.append(token.format(**kwargs))
+        return argv
+
+
+def _is_placeholder(token: str) -> bool:
+    return token.startswith("{") and token.endswith("}") and token.count("{") == 1
+
+
+def normalize_cmd(cmd):
+    """
+    Normalizes a command once into an argv list. Multi-line and indented strings
+    are dedented and tokenized, argv lists are returned as is. A string with a
+    pipe is kept as a string so that it still runs through the shell.
+    """
+    if isinstance(cmd, (list, tuple)):
+        return list(cmd)
+    if "|" in cmd:
+        return textwrap.dedent(cmd).strip()
+    return shlex.split(textwrap.dedent(cmd))
+
+
+@contextlib.contextmanager
+def log_to(prefix: str, log_file_path: str = None):
+    """
+    Prefixes the printed output of the commands run in the current context with
+    `[prefix] ` and appends their whole output to a log file, so the logs of
+    concurrent builds stay apart.
+    """
+    log_file = None
+    if log_file_path:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file_path)), exist_ok=True)
+        log_file = open(log_file_path, "a", errors="replace")
+    prefix_token = _log_prefix.set(f"[{prefix}] " if prefix else "")
+    log_file_token = _log_file.set(log_file)
+    try:
+        yield log_file
+    finally:
+        _log_prefix.reset(prefix_token)
+        _log_file.reset(log_file_token)
+        if log_file is not None:
+            log_file.close()
+
+
+def _emit(
+    text,
+    log_type=LogType.STDOUT,
+    is_print=True,
+    is_write_log=True,
+    prefix=None,
+    log_file=None,
+):
+    """
+    Prints text with the log prefix of the context, and appends it to the log file
+    of the context. Pump threads do not inherit the context, so they pass both.
+    """
+    prefix = _log_prefix.get() if prefix is None else prefix
+    log_file = _log_file.get() if log_file is None else log_file
+    if not text.endswith("\n"):
+        text += "\n"
+    with _log_lock:
+        if is_write_log and log_file is not None:
+            log_file.write(text)
+            log_file.flush()
+        if is_print:
+            target = sys.stderr if log_type == LogType.STDERR else sys.stdout
+            if prefix:
+                text = "".join(f"{prefix}{line}" for line in text.splitlines(True))
+            target.write(text)
+            target.flush()
+
+
+def _pump_stream(stream, log_type, tail, is_print, output_sizes, prefix, log_file):
+    for line in iter(stream.readline, ""):
+        tail.append(line)
+        output_sizes[log_type] += len(line.encode(errors="replace"))
+        if is_print or log_file is not None:
+            _emit(line, log_type, is_print, True, prefix, log_file)
+    stream.close()
+
+
+def _write_stdin(stdin, payload):
+    try:
+        stdin.write(payload)
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def _read_proc_io(pid):
+    io_counters = {}
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                io_counters[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return io_counters
+
+
+def _to_resource_usage(rusage, io_counters, wall_time_s) -> ResourceUsage:
+    return ResourceUsage(
+        wall_time_s=wall_time_s,
+        user_cpu_s=rusage.ru_utime,
+        sys_cpu_s=rusage.ru_stime,
+        max_rss_kb=rusage.ru_maxrss,
+        block_input_ops=rusage.ru_inblock,
+        block_output_ops=rusage.ru_oublock,
+        voluntary_ctx_switches=rusage.ru_nvcsw,
+        involuntary_ctx_switches=rusage.ru_nivcsw,
+        read_bytes=io_counters.get("read_bytes", 0),
+        write_bytes=io_counters.get("write_bytes", 0),
     )
-    CONDA_RUN_WITH_GOAL = "conda run -n {venv_name} {goal_cmd}"
 
-    def get_command(self, **kwargs):
-        return self.value.format(**kwargs)
+
+def _run_cmd(cmd, cwd, is_shell, print_log_types, tail_lines, output_sizes, input):
+    """
+    Runs a command, reading stdout/stderr line by line and printing the selected
+    log types as they are produced. With `tail_lines` only the last lines of each
+    stream are kept in memory, otherwise the whole output is kept.
+    The child is reaped with os.wait4 so its resource usage is attached to the
+    result as `resource_usage`. Its /proc/<pid>/io counters, which include the
+    I/O of its own reaped children, are read while it is still a zombie.
+    """
+    stdout_tail = collections.deque(maxlen=tail_lines)
+    stderr_tail = collections.deque(maxlen=tail_lines)
+
+    started_at = time.perf_counter()
+    process = subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        shell=is_shell,
+        stdin=subprocess.PIPE if input is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+        bufsize=1,
+    )
+    pumps = [
+        threading.Thread(
+            target=_pump_stream,
+            args=(
+                process.stdout,
+                LogType.STDOUT,
+                stdout_tail,
+                LogType.STDOUT in print_log_types,
+                output_sizes,
+                _log_prefix.get(),
+                _log_file.get(),
+            ),
+            daemon=True,
+        ),
+        threading.Thread(
+            target=_pump_stream,
+            args=(
+                process.stderr,
+                LogType.STDERR,
+                stderr_tail,
+                LogType.STDERR in print_log_types,
+                output_sizes,
+                _log_prefix.get(),
+                _log_file.get(),
+            ),
+            daemon=True,
+        ),
+    ]
+    for pump in pumps:
+        pump.start()
+    try:
+        if input is not None:
+            _write_stdin(process.stdin, input)
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        io_counters = _read_proc_io(process.pid)
+        _, wait_status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(wait_status)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        for pump in pumps:
+            pump.join()
+    resource_usage = _to_resource_usage(
+        rusage, io_counters, time.perf_counter() - started_at
+    )
+
+    stdout = "".join(stdout_tail)
+    stderr = "".join(stderr_tail)
+    if process.returncode != 0:
+        error = subprocess.CalledProcessError(
+            process.returncode, cmd, output=stdout, stderr=stderr
+        )
+        error.resource_usage = resource_usage
+        raise error
+    result = subprocess.CompletedProcess(
+        cmd, process.returncode, stdout=stdout, stderr=stderr
+    )
+    result.resource_usage = resource_usage
+    return result
 
 
 def execute_cmd(
@@ -44,68 +355,99 @@ def execute_cmd(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    tail_lines=STREAM_TAIL_LINES,
+    input: str = None,
 ) -> subprocess.CompletedProcess:
     """
     Executes a command in the shell and returns the result.
     Args:
-        cmd (str): The command to be executed.
+        cmd (list | str): The argv of the command to be executed. A string is tokenized with
+            normalize_cmd, only a string containing a pipe runs through the shell.
         cwd (str, optional): The current working directory for the command execution. Defaults to None.
         trace_cmd (bool, optional): Whether to print the command before executing. Defaults to False.
         is_collect_log (bool, optional): Whether to collect and print the command output. Defaults to True.
         collect_log_types (list, optional): The types of logs to collect. Defaults to [LogType.STDOUT].
+        is_stream_log (bool, optional): Whether to print the output line by line while the command runs.
+            Only the last `tail_lines` lines of each stream are kept in the returned result. Defaults to False.
+        tail_lines (int, optional): The number of lines kept per stream in streaming mode. Defaults to STREAM_TAIL_LINES.
+        input (str, optional): The payload written to the stdin of the command, e.g. a password. Defaults to None.
     Returns:
-        subprocess.CompletedProcess: The result of the command execution.
+        subprocess.CompletedProcess: The result of the command execution, with the child
+            process usage attached as `resource_usage` (ResourceUsage).
     Raises:
         ExecutorShellError: If the command execution fails.
     """
 
-    if trace_cmd:
-        print(textwrap.dedent(cmd))
+    cmd = normalize_cmd(cmd)
+    is_shell = isinstance(cmd, str)
+    argv_str = trace_util.redact_cmd(cmd)
 
-    try:
-        is_shell = "|" in cmd
-        cmd = cmd if is_shell else shlex.split(cmd)
+    if trace_cmd:
+        _emit(argv_str)
+    cmd_name = os.path.basename(cmd.split()[0] if is_shell else cmd[0])
+    output_sizes = {LogType.STDOUT: 0, LogType.STDERR: 0}
+    print_log_types = collect_log_types if is_collect_log and is_stream_log else []
 
-        subprocess_result = subprocess.run(
-            cmd,
-            check=True,
-            capture_output=True,
-            text=True,
-            cwd=cwd,
-            shell=is_shell,
-        )
+    with trace_util.span(
+        f"$ {cmd_name}", category="cmd", argv=argv_str, cwd=cwd
+    ) as cmd_span:
+        try:
+            subprocess_result = _run_cmd(
+                cmd,
+                cwd,
+                is_shell,
+                print_log_types,
+                tail_lines if is_stream_log else None,
+                output_sizes,
+                input,
+            )
+            cmd_span.attrs["exit_code"] = subprocess_result.returncode
+            cmd_span.attrs["resource_usage"] = (
+                subprocess_result.resource_usage.to_dict()
+            )
 
-        if is_collect_log:
-            for log_type in collect_log_types:
-                if log_type == LogType.STDOUT:
-                    print(subprocess_result.stdout)
-                elif log_type == LogType.STDERR:
-                    print(subprocess_result.stderr)
-    except subprocess.CalledProcessError as e:
-        trace_msg = f"""
-        Command failed: {e.cmd}
-        Return code: {e.returncode}
-        Output: {e.output}
-        Error: {e.stderr}
-        """
-        print(textwrap.dedent(trace_msg))
-        raise ExecutorShellError(
-            "Command failed. Please investigate the command output above."
-        ) from e
+            if is_collect_log and not is_stream_log:
+                for log_type in collect_log_types:
+                    if log_type == LogType.STDOUT:
+                        # The pumps already wrote the output to the log file.
+                        _emit(subprocess_result.stdout, is_write_log=False)
+                    elif log_type == LogType.STDERR:
+                        _emit(subprocess_result.stderr, is_write_log=False)
+        except subprocess.CalledProcessError as e:
+            cmd_span.attrs["exit_code"] = e.returncode
+            cmd_span.attrs["resource_usage"] = e.resource_usage.to_dict()
+            trace_msg = f"""
+            Command failed: {argv_str}
+            Return code: {e.returncode}
+            Output: {trace_util.redact(e.output or "")}
+            Error: {trace_util.redact(e.stderr or "")}
+            """
+            _emit(textwrap.dedent(trace_msg))
+            raise ExecutorShellError(
+                "Command failed. Please investigate the command output above."
+            ) from e
+        finally:
+            cmd_span.attrs["stdout_bytes"] = output_sizes[LogType.STDOUT]
+            cmd_span.attrs["stderr_bytes"] = output_sizes[LogType.STDERR]
     return subprocess_result
 
 
 def git_clone(
     credential_url,
     dest_path=".",
+    clone_args: List[str] = None,
     cwd=None,
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
     git_clone_cmd = cmd or ShellCommand.GIT_CLONE.get_command(
-        credential_url=credential_url, dest_path=dest_path
+        clone_args=clone_args or [],
+        credential_url=credential_url,
+        dest_path=dest_path,
     )
     return execute_cmd(
         git_clone_cmd,
@@ -113,6 +455,140 @@ def git_clone(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_clone_mirror(
+    credential_url,
+    dest_path,
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_clone_mirror_cmd = cmd or ShellCommand.GIT_CLONE_MIRROR.get_command(
+        credential_url=credential_url, dest_path=dest_path
+    )
+    return execute_cmd(
+        git_clone_mirror_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_fetch(
+    credential_url,
+    refspecs: List[str],
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_fetch_cmd = cmd or ShellCommand.GIT_FETCH.get_command(
+        credential_url=credential_url, refspecs=refspecs
+    )
+    return execute_cmd(
+        git_fetch_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_fetch_commit(
+    credential_url,
+    commit_id: str,
+    fetch_args: List[str] = None,
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_fetch_commit_cmd = cmd or ShellCommand.GIT_FETCH_COMMIT.get_command(
+        fetch_args=fetch_args or [], credential_url=credential_url, commit_id=commit_id
+    )
+    return execute_cmd(
+        git_fetch_commit_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_init(
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_init_cmd = cmd or ShellCommand.GIT_INIT.get_command()
+    return execute_cmd(
+        git_init_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_update_ref_head(
+    commit_id: str,
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_update_ref_head_cmd = cmd or ShellCommand.GIT_UPDATE_REF_HEAD.get_command(
+        commit_id=commit_id
+    )
+    return execute_cmd(
+        git_update_ref_head_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_remote_set_url(
+    git_url,
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_remote_set_url_cmd = cmd or ShellCommand.GIT_REMOTE_SET_URL.get_command(
+        git_url=git_url
+    )
+    return execute_cmd(
+        git_remote_set_url_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -122,6 +598,7 @@ def git_checkout(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
     git_checkout_cmd = cmd or ShellCommand.GIT_CHECKOUT.get_command(branch=git_branch)
@@ -131,6 +608,105 @@ def git_checkout(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_sparse_checkout_set(
+    dirs: List[str],
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_sparse_checkout_set_cmd = (
+        cmd or ShellCommand.GIT_SPARSE_CHECKOUT_SET.get_command(dirs=dirs)
+    )
+    return execute_cmd(
+        git_sparse_checkout_set_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_ls_files_tagged(
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=False,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_ls_files_tagged_cmd = cmd or ShellCommand.GIT_LS_FILES_TAGGED.get_command()
+    return execute_cmd(
+        git_ls_files_tagged_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_archive(
+    output_path,
+    archive_format="zip",
+    prefix="",
+    tree_ish="HEAD",
+    paths: List[str] = None,
+    compress_args: List[str] = None,
+    config_args: List[str] = None,
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_archive_cmd = cmd or ShellCommand.GIT_ARCHIVE.get_command(
+        config_args=config_args or [],
+        format=archive_format,
+        prefix=prefix,
+        compress_args=compress_args or [],
+        output_path=output_path,
+        tree_ish=tree_ish,
+        paths=paths or [],
+    )
+    return execute_cmd(
+        git_archive_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+    )
+
+
+def git_ls_remote(
+    credential_url,
+    refs: List[str],
+    cwd=None,
+    trace_cmd=False,
+    is_collect_log=False,
+    collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
+    cmd: str = None,
+):
+    git_ls_remote_cmd = cmd or ShellCommand.GIT_LS_REMOTE.get_command(
+        credential_url=credential_url, refs=refs
+    )
+    return execute_cmd(
+        git_ls_remote_cmd,
+        cwd=cwd,
+        trace_cmd=trace_cmd,
+        is_collect_log=is_collect_log,
+        collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -139,6 +715,7 @@ def git_get_commit_id(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT, LogType.STDERR],
+    is_stream_log=False,
     cmd: str = None,
 ):
     git_get_commit_id_cmd = cmd or ShellCommand.GIT_GET_COMMIT_ID.get_command()
@@ -148,22 +725,62 @@ def git_get_commit_id(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
+def _resolve_path(path, cwd=None):
+    return os.path.join(cwd, path) if cwd is not None else path
+
+
+def _run_native(
+    name,
+    path,
+    operation,
+    is_collect_log=True,
+    collect_log_types=[LogType.STDOUT],
+) -> subprocess.CompletedProcess:
+    """
+    Runs a file system operation in-process and wraps its output the same way
+    execute_cmd does, so callers keep getting a subprocess.CompletedProcess.
+    """
+    with trace_util.span(name, category="fs", path=path):
+        try:
+            stdout = operation() or ""
+        except OSError as e:
+            _emit(f"Command failed: {name} {path}\nError: {e}")
+            raise ExecutorShellError(
+                "Command failed. Please investigate the command output above."
+            ) from e
+
+    if is_collect_log and LogType.STDOUT in collect_log_types:
+        _emit(stdout)
+    return subprocess.CompletedProcess([name, path], 0, stdout=stdout, stderr="")
+
+
 def ls(
     path,
     cwd=None,
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    ls_cmd = cmd or ShellCommand.LS.get_command(path=path)
-    return execute_cmd(
-        ls_cmd,
-        cwd=cwd,
-        trace_cmd=trace_cmd,
+    if cmd:
+        return execute_cmd(
+            cmd,
+            cwd=cwd,
+            trace_cmd=trace_cmd,
+            is_collect_log=is_collect_log,
+            collect_log_types=collect_log_types,
+            is_stream_log=is_stream_log,
+        )
+    target_path = _resolve_path(path, cwd)
+    return _run_native(
+        "ls",
+        target_path,
+        lambda: io_util.list_dir(target_path),
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
     )
@@ -175,13 +792,27 @@ def tree(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
+    max_depth=io_util.TREE_MAX_DEPTH,
+    max_entries=io_util.TREE_MAX_ENTRIES,
 ):
-    tree_cmd = cmd or ShellCommand.TREE.get_command(path=path)
-    return execute_cmd(
-        tree_cmd,
-        cwd=cwd,
-        trace_cmd=trace_cmd,
+    if cmd:
+        return execute_cmd(
+            cmd,
+            cwd=cwd,
+            trace_cmd=trace_cmd,
+            is_collect_log=is_collect_log,
+            collect_log_types=collect_log_types,
+            is_stream_log=is_stream_log,
+        )
+    target_path = _resolve_path(path, cwd)
+    return _run_native(
+        "tree",
+        target_path,
+        lambda: io_util.summarize_dir(
+            target_path, max_depth=max_depth, max_entries=max_entries
+        ),
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
     )
@@ -193,15 +824,24 @@ def mkdir(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    mkdir_cmd = cmd or ShellCommand.MKDIR.get_command(path=path)
-    return execute_cmd(
-        mkdir_cmd,
-        cwd=cwd,
-        trace_cmd=trace_cmd,
-        is_collect_log=is_collect_log,
-        collect_log_types=collect_log_types,
+    if cmd:
+        return execute_cmd(
+            cmd,
+            cwd=cwd,
+            trace_cmd=trace_cmd,
+            is_collect_log=is_collect_log,
+            collect_log_types=collect_log_types,
+            is_stream_log=is_stream_log,
+        )
+    target_path = _resolve_path(path, cwd)
+    return _run_native(
+        "mkdir",
+        target_path,
+        lambda: os.makedirs(target_path, exist_ok=True),
+        is_collect_log=False,
     )
 
 
@@ -211,13 +851,28 @@ def cat(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    cat_cmd = cmd or ShellCommand.CAT.get_command(path=path)
-    return execute_cmd(
-        cat_cmd,
-        cwd=cwd,
-        trace_cmd=trace_cmd,
+    if cmd:
+        return execute_cmd(
+            cmd,
+            cwd=cwd,
+            trace_cmd=trace_cmd,
+            is_collect_log=is_collect_log,
+            collect_log_types=collect_log_types,
+            is_stream_log=is_stream_log,
+        )
+    target_path = _resolve_path(path, cwd)
+
+    def read_file():
+        with open(target_path, "r", errors="replace") as f:
+            return f.read()
+
+    return _run_native(
+        "cat",
+        target_path,
+        read_file,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
     )
@@ -230,6 +885,7 @@ def zip(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
     zip_cmd = cmd or ShellCommand.ZIP.get_command(
@@ -241,6 +897,7 @@ def zip(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -252,10 +909,10 @@ def docker_login(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
     docker_login_cmd = cmd or ShellCommand.DOCKER_LOGIN.get_command(
-        server_password=server_password,
         server_uri=server_uri,
         server_username=server_username,
     )
@@ -265,6 +922,8 @@ def docker_login(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+        input=None if cmd else f"{server_password}\n",
     )
 
 
@@ -279,20 +938,16 @@ def docker_build(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    container_args_str = (
-        " ".join(container_args)
-        if container_args is not None and len(container_args) > 0
-        else ""
-    )
     docker_build_cmd = cmd or ShellCommand.DOCKER_BUILD.get_command(
-        os_platform=os_platform,
+        os_platform=normalize_cmd(os_platform or []),
         docker_server_uri=docker_server_uri,
         image_name=image_name,
         image_tag=image_tag,
         build_context=build_context,
-        container_args_str=container_args_str,
+        container_args=container_args or [],
     )
     return execute_cmd(
         docker_build_cmd,
@@ -300,6 +955,7 @@ def docker_build(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -311,6 +967,7 @@ def docker_push(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
     docker_push_cmd = cmd or ShellCommand.DOCKER_PUSH.get_command(
@@ -324,6 +981,7 @@ def docker_push(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -335,10 +993,10 @@ def helm_registry_login(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
     helm_registry_login_cmd = cmd or ShellCommand.HELM_REGISTRY_LOGIN.get_command(
-        helm_server_password=helm_server_password,
         helm_server_uri=helm_server_uri,
         helm_server_username=helm_server_username,
     )
@@ -348,6 +1006,8 @@ def helm_registry_login(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
+        input=None if cmd else f"{helm_server_password}\n",
     )
 
 
@@ -360,6 +1020,7 @@ def helm_pull(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
     helm_pull_cmd = cmd or ShellCommand.HELM_PULL.get_command(
@@ -373,6 +1034,7 @@ def helm_pull(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -385,16 +1047,17 @@ def helm_upgrade(
     image_name,
     image_tag,
     container_name="mainApp",
-    set_args: str = None,
+    set_args: List[str] = None,
     cwd=None,
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    set_args_str = (
-        "\n".join(set_args) if set_args is not None and len(set_args) > 0 else ""
-    )
+    set_argv = []
+    for set_arg in set_args or []:
+        set_argv.extend(["--set", set_arg])
     helm_upgrade_cmd = cmd or ShellCommand.HELM_UPGRADE.get_command(
         project_name=project_name,
         helm_chart_path=helm_chart_path,
@@ -404,7 +1067,7 @@ def helm_upgrade(
         image_name=image_name,
         container_name=container_name,
         image_tag=image_tag,
-        set_args_str=set_args_str,
+        set_args=set_argv,
     )
     return execute_cmd(
         helm_upgrade_cmd,
@@ -412,6 +1075,7 @@ def helm_upgrade(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -432,6 +1096,7 @@ def conda_create_venv_cmd(
     trace_cmd=True,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     override_cmd: str = None,
 ):
     cmd = override_cmd or ShellCommand.CONDA_CREATE_VENV.get_command(
@@ -444,6 +1109,7 @@ def conda_create_venv_cmd(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -454,6 +1120,7 @@ def conda_run_install_libs(
     trace_cmd=True,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     override_cmd: str = None,
 ):
     cmd = override_cmd or ShellCommand.CONDA_RUN_INSTALL_LIBS.get_command(
@@ -465,6 +1132,7 @@ def conda_run_install_libs(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -475,10 +1143,14 @@ def conda_run_with_goal(
     trace_cmd=True,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     override_cmd: str = None,
 ):
+    goal_argv = normalize_cmd(goal_cmd)
+    if isinstance(goal_argv, str):
+        goal_argv = ["sh", "-c", goal_argv]
     cmd = override_cmd or ShellCommand.CONDA_RUN_WITH_GOAL.get_command(
-        venv_name=venv_name, goal_cmd=goal_cmd
+        venv_name=venv_name, goal_cmd=goal_argv
     )
     return execute_cmd(
         cmd,
@@ -486,6 +1158,7 @@ def conda_run_with_goal(
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -494,20 +1167,17 @@ def check_version_maven(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    check_version_maven_cmd = (
-        cmd
-        or """
-        mvn --version
-    """
-    )
+    check_version_maven_cmd = cmd or ["mvn", "--version"]
     return execute_cmd(
         check_version_maven_cmd,
         cwd=cwd,
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -517,20 +1187,17 @@ def maven_cmd(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    maven_cmd = (
-        cmd
-        or f"""
-        {maven_cmd}
-    """
-    )
+    maven_cmd = cmd or normalize_cmd(maven_cmd)
     return execute_cmd(
         maven_cmd,
         cwd=cwd,
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -540,20 +1207,17 @@ def dotnet_cmd(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    dotnet_cmd = (
-        cmd
-        or f"""
-        {dotnet_cmd}
-    """
-    )
+    dotnet_cmd = cmd or normalize_cmd(dotnet_cmd)
     return execute_cmd(
         dotnet_cmd,
         cwd=cwd,
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -563,20 +1227,17 @@ def python_cmd(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
     cmd: str = None,
 ):
-    python_cmd = (
-        cmd
-        or f"""
-        {python_cmd}
-    """
-    )
+    python_cmd = cmd or normalize_cmd(python_cmd)
     return execute_cmd(
         python_cmd,
         cwd=cwd,
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
 
 
@@ -586,17 +1247,14 @@ def npm_cmd(
     trace_cmd=False,
     is_collect_log=True,
     collect_log_types=[LogType.STDOUT],
+    is_stream_log=False,
 ):
-    npm_cmd = (
-        npm_cmd
-        or f"""
-        {npm_cmd}
-    """
-    )
+    npm_cmd = normalize_cmd(npm_cmd)
     return execute_cmd(
         npm_cmd,
         cwd=cwd,
         trace_cmd=trace_cmd,
         is_collect_log=is_collect_log,
         collect_log_types=collect_log_types,
+        is_stream_log=is_stream_log,
     )
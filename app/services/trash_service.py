@@ -0,0 +1,134 @@
+import errno
+import os
+import shutil
+import subprocess
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils import io_util
+
+TRASH_DIR_NAME = ".one-press-trash"
+LOCK_FILE_NAME = ".lock"
+COLLECTOR_WORKERS = 2
+COLLECTOR_NICENESS = 19
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def get_trash_dir(path: str) -> str:
+    """
+    The trash sits next to the deleted path, so moving into it is a rename on
+    the same filesystem.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), TRASH_DIR_NAME)
+
+
+def move_to_trash(path: str, trash_dir: str) -> str:
+    """
+    Renames a path into the trash directory under a unique name.
+    Returns:
+        str: The path in the trash, or None when the trash is on another filesystem.
+    """
+    os.makedirs(trash_dir, exist_ok=True)
+    trash_path = os.path.join(
+        trash_dir, f"{os.path.basename(os.path.normpath(path))}-{uuid.uuid4().hex}"
+    )
+    try:
+        os.rename(path, trash_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        return None
+    return trash_path
+
+
+def spawn_collector(trash_dir: str):
+    """
+    Starts a detached, niced process that empties the trash directory, with the
+    idle I/O class when `ionice` is available. It outlives the current step.
+    """
+    ionice_cmd = ["ionice", "-c3"] if shutil.which("ionice") else []
+    subprocess.Popen(
+        ionice_cmd + [sys.executable, "-m", "app.services.trash_service", trash_dir],
+        cwd=PROJECT_ROOT,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _remove(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def collect(trash_dir: str, workers: int = COLLECTOR_WORKERS):
+    """
+    Empties the trash directory, including what an interrupted collector left.
+    The children of each trashed tree are removed by a small thread pool with
+    `shutil.rmtree`, which unlinks through directory file descriptors. Only one
+    collector runs per trash directory at a time.
+    """
+    if not os.path.isdir(trash_dir):
+        return
+    lock_file = io_util.try_file_lock(os.path.join(trash_dir, LOCK_FILE_NAME))
+    if lock_file is None:
+        return
+
+    with lock_file, ThreadPoolExecutor(max_workers=workers) as executor:
+        # Paths trashed while collecting are picked up by the next pass.
+        while True:
+            trash_paths = [
+                entry.path
+                for entry in os.scandir(trash_dir)
+                if entry.name != LOCK_FILE_NAME
+            ]
+            if not trash_paths:
+                break
+            child_paths = []
+            for trash_path in trash_paths:
+                if os.path.isdir(trash_path) and not os.path.islink(trash_path):
+                    child_paths.extend(entry.path for entry in os.scandir(trash_path))
+
+            list(executor.map(_remove, child_paths))
+            for trash_path in trash_paths:
+                _remove(trash_path)
+
+
+def delete_path(path: str, trash_dir: str = None, is_background: bool = True):
+    """
+    Deletes a path without waiting for the space to be reclaimed: it is renamed
+    into the trash and a background collector deletes it. Falls back to a
+    synchronous delete when the trash is on another filesystem.
+    Args:
+        path (str): The file or directory to delete.
+        trash_dir (str, optional): The trash directory, see get_trash_dir. Defaults to None.
+        is_background (bool, optional): Delete synchronously when False. Defaults to True.
+    Raises:
+        FileNotFoundError: If the path does not exist.
+    """
+    if not is_background:
+        io_util.delete_path(path)
+        return
+    if not os.path.lexists(path):
+        raise FileNotFoundError(f"Path not found: {path}")
+
+    trash_dir = trash_dir or get_trash_dir(path)
+    trash_path = move_to_trash(path, trash_dir)
+    if trash_path is None:
+        print(f"Trash {trash_dir} is on another filesystem, delete {path} now.")
+        io_util.delete_path(path)
+        return
+    print(f"Moved {path} to trash, it is deleted in the background.")
+    spawn_collector(trash_dir)
+
+
+if __name__ == "__main__":
+    os.nice(COLLECTOR_NICENESS)
+    collect(sys.argv[1])
@@ -0,0 +1,258 @@
+import json
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+import traceback
+
+DEFAULT_SOCKET_PATH = "/tmp/one-press-functions.sock"
+HEADER_FORMAT = "!Q"
+EXIT_CODE_FORMAT = "!i"
+PID_FORMAT = "!i"
+FORWARDED_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+ACCEPT_TIMEOUT_S = 1.0
+START_TIMEOUT_S = 30.0
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = conn.recv(min(size, 1 << 16))
+        if not chunk:
+            raise ConnectionError("Connection closed before the message was received.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _send_request(conn: socket.socket, request: dict, fds=()):
+    payload = json.dumps(request).encode()
+    socket.send_fds(conn, [struct.pack(HEADER_FORMAT, len(payload))], list(fds))
+    conn.sendall(payload)
+
+
+def _recv_request(conn: socket.socket):
+    header_size = struct.calcsize(HEADER_FORMAT)
+    header, fds, _, _ = socket.recv_fds(conn, header_size, 3)
+    if len(header) < header_size:
+        header += _recv_exactly(conn, header_size - len(header))
+    (payload_size,) = struct.unpack(HEADER_FORMAT, header)
+    return json.loads(_recv_exactly(conn, payload_size)), fds
+
+
+def _reap_children():
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _run_request(conn: socket.socket, request: dict, fds):
+    """
+    Runs a forwarded function in a forked child. The client's stdin/stdout/stderr
+    are installed as fds 0/1/2, so the output streams straight to the client.
+    The child pid is sent first, so the client can forward signals to the run.
+    """
+    from app import main
+
+    conn.sendall(struct.pack(PID_FORMAT, os.getpid()))
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    for target_fd, client_fd in enumerate(fds):
+        os.dup2(client_fd, target_fd)
+        os.close(client_fd)
+
+    os.environ.clear()
+    os.environ.update(request["env"])
+    os.chdir(request["cwd"])
+    sys.argv = request["argv"]
+
+    exit_code = 0
+    try:
+        main.run(sys.argv[1:])
+    except SystemExit as e:
+        exit_code = 0 if e.code is None else (e.code if isinstance(e.code, int) else 1)
+    except KeyboardInterrupt:
+        traceback.print_exc()
+        exit_code = 128 + signal.SIGINT
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    try:
+        conn.sendall(struct.pack(EXIT_CODE_FORMAT, exit_code))
+    finally:
+        os._exit(0)
+
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH, idle_timeout_s: float = 3600):
+    """
+    Serves forwarded function runs on a Unix domain socket with every function
+    module already imported. Each run is executed in a forked child so that env
+    vars, cwd and module state never leak between pipeline steps.
+    Args:
+        socket_path (str, optional): The path of the Unix domain socket. Defaults to DEFAULT_SOCKET_PATH.
+        idle_timeout_s (float, optional): Stop after this many seconds without a request. Defaults to 3600.
+    """
+    from app import main
+
+    for target_func in main.FUNCTION_MODULES:
+        main.load_function(target_func)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen()
+    server.settimeout(ACCEPT_TIMEOUT_S)
+    print(f"> Worker is listening on {socket_path} (pid {os.getpid()}).")
+    sys.stdout.flush()
+
+    last_request_at = time.monotonic()
+    try:
+        while time.monotonic() - last_request_at < idle_timeout_s:
+            _reap_children()
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            last_request_at = time.monotonic()
+            conn.settimeout(None)
+
+            with conn:
+                try:
+                    request, fds = _recv_request(conn)
+                except ConnectionError:
+                    continue
+                except ValueError as e:
+                    print(f"Drop malformed worker request: {e}")
+                    continue
+
+                if request.get("command") == "stop":
+                    conn.sendall(struct.pack(EXIT_CODE_FORMAT, 0))
+                    break
+
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    server.close()
+                    _run_request(conn, request, fds)
+                for fd in fds:
+                    os.close(fd)
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("> Worker stopped.")
+
+
+def start(socket_path: str = DEFAULT_SOCKET_PATH, log_file_path: str = None):
+    """
+    Starts a detached worker and waits until its socket accepts connections.
+    """
+    log_file_path = log_file_path or f"{socket_path}.log"
+    with open(log_file_path, "a") as log_file:
+        subprocess.Popen(
+            [sys.executable, "-m", "app.worker", "serve"],
+            env={**os.environ, "FUNCTIONS_WORKER_SOCKET": socket_path},
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+    deadline = time.monotonic() + START_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if is_alive(socket_path):
+            print(f"> Worker started on {socket_path}, logs at {log_file_path}.")
+            return
+        time.sleep(0.1)
+    raise TimeoutError(f"Worker did not start on {socket_path}, see {log_file_path}.")
+
+
+def is_alive(socket_path: str = DEFAULT_SOCKET_PATH) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def stop(socket_path: str = DEFAULT_SOCKET_PATH):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            _send_request(client, {"command": "stop"})
+            _recv_exactly(client, struct.calcsize(EXIT_CODE_FORMAT))
+        print(f"> Worker on {socket_path} stopped.")
+    except OSError:
+        print(f"> No worker is listening on {socket_path}.")
+
+
+def forward(argv, socket_path: str = DEFAULT_SOCKET_PATH):
+    """
+    Forwards a function run to the worker, passing the current env, cwd and the
+    stdin/stdout/stderr file descriptors. SIGINT and SIGTERM received while the
+    run is in progress are forwarded to the worker's child running it.
+    Args:
+        argv (list): The command line arguments of the run, e.g. sys.argv.
+        socket_path (str, optional): The path of the Unix domain socket. Defaults to DEFAULT_SOCKET_PATH.
+    Returns:
+        int | None: The exit code of the run, or None when no worker is listening.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        client.close()
+        return None
+
+    with client:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        request = {"argv": list(argv), "env": dict(os.environ), "cwd": os.getcwd()}
+        _send_request(client, request, fds=[0, 1, 2])
+
+        try:
+            (child_pid,) = struct.unpack(
+                PID_FORMAT, _recv_exactly(client, struct.calcsize(PID_FORMAT))
+            )
+        except ConnectionError:
+            print("Worker closed the connection before the function started.")
+            return 1
+
+        def forward_signal(signum, frame):
+            try:
+                os.kill(child_pid, signum)
+            except ProcessLookupError:
+                pass
+
+        previous_handlers = {
+            signum: signal.signal(signum, forward_signal)
+            for signum in FORWARDED_SIGNALS
+        }
+        try:
+            response = _recv_exactly(client, struct.calcsize(EXIT_CODE_FORMAT))
+        except ConnectionError:
+            print("Worker closed the connection before the function finished.")
+            return 1
+        finally:
+            for signum, previous_handler in previous_handlers.items():
+                signal.signal(signum, previous_handler)
+
+    (exit_code,) = struct.unpack(EXIT_CODE_FORMAT, response)
+    return exit_code
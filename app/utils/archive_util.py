@@ -0,0 +1,630 @@
+import collections
+import errno
+import fnmatch
+import os
+import shutil
+import stat
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from app.models.os_model import ArchiveCodec, ArchiveStats, ExtractStats
+
+COMPRESSED_EXTENSIONS = {
+    ".7z",
+    ".br",
+    ".bz2",
+    ".ear",
+    ".gif",
+    ".gz",
+    ".jar",
+    ".jpeg",
+    ".jpg",
+    ".mp3",
+    ".mp4",
+    ".nupkg",
+    ".png",
+    ".tgz",
+    ".war",
+    ".webp",
+    ".woff",
+    ".woff2",
+    ".xz",
+    ".zip",
+    ".zst",
+}
+LARGE_FILE_BYTES = 64 * 1024**2
+MAX_INFLIGHT_BYTES = 256 * 1024**2
+CHUNK_BYTES = 1024**2
+BATCH_BYTES = 4 * 1024**2
+BATCH_ENTRIES = 256
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_UTF8_FLAG = 0x800
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_OF_CENTRAL_DIR = struct.Struct("<4s4H2LH")
+ZIP64_END_OF_CENTRAL_DIR = struct.Struct("<4sQ2H2L4Q")
+ZIP64_LOCATOR = struct.Struct("<4sLQL")
+
+
+class _ZipEntry:
+    def __init__(self, name: bytes, mode: int, mtime: float, is_dir: bool = False):
+        self.name = name
+        self.mode = mode
+        self.mtime = mtime
+        self.is_dir = is_dir
+        self.compress_type = ZIP_STORED
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+        self.header_offset = 0
+
+
+def _dos_date_time(mtime: float):
+    year, month, day, hour, minute, second = time.localtime(mtime)[:6]
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_date, dos_time
+
+
+def _is_compressed(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS
+
+
+def _walk(source_path: str, arcname: str):
+    """
+    Yields (path, archive name, stat) in a stable order, directories first, the
+    same entries `zip -r` would add.
+    """
+    root_stat = os.stat(source_path)
+    if not stat.S_ISDIR(root_stat.st_mode):
+        yield source_path, arcname, root_stat
+        return
+
+    pending = [(source_path, arcname)]
+    while pending:
+        dir_path, dir_arcname = pending.pop()
+        yield dir_path, f"{dir_arcname}/", os.stat(dir_path)
+        child_dirs = []
+        for entry in sorted(os.scandir(dir_path), key=lambda e: e.name):
+            child_arcname = f"{dir_arcname}/{entry.name}"
+            try:
+                entry_stat = entry.stat()
+            except FileNotFoundError:
+                print(f"Skip broken link: {entry.path}")
+                continue
+            if stat.S_ISDIR(entry_stat.st_mode):
+                child_dirs.append((entry.path, child_arcname))
+            elif stat.S_ISREG(entry_stat.st_mode):
+                yield entry.path, child_arcname, entry_stat
+        pending.extend(reversed(child_dirs))
+
+
+def _compress_file(path: str, codec: ArchiveCodec, level: int):
+    with open(path, "rb") as f:
+        data = f.read()
+    crc = zlib.crc32(data)
+    if codec == ArchiveCodec.DEFLATE and data and not _is_compressed(path):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) < len(data):
+            return ZIP_DEFLATED, crc, len(data), compressed
+    return ZIP_STORED, crc, len(data), data
+
+
+class _ZipWriter:
+    """
+    Writes a zip file entry by entry, with zip64 records once sizes, offsets or
+    the entry count no longer fit the classic format.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.entries = []
+
+    def _write_local_header(self, entry: _ZipEntry, is_zip64: bool):
+        entry.header_offset = self.file.tell()
+        dos_date, dos_time = _dos_date_time(entry.mtime)
+        extra = b""
+        compress_size, file_size = entry.compress_size, entry.file_size
+        if is_zip64:
+            extra = struct.pack("<HHQQ", 1, 16, file_size, compress_size)
+            compress_size = file_size = ZIP64_LIMIT
+        self.file.write(
+            LOCAL_HEADER.pack(
+                b"PK\x03\x04",
+                45 if is_zip64 else 20,
+                0,
+                ZIP_UTF8_FLAG,
+                entry.compress_type,
+                dos_time,
+                dos_date,
+                entry.crc,
+                compress_size,
+                file_size,
+                len(entry.name),
+                len(extra),
+            )
+        )
+        self.file.write(entry.name)
+        self.file.write(extra)
+
+    def write_entry(self, entry: _ZipEntry, data: bytes):
+        is_zip64 = entry.file_size >= ZIP64_LIMIT or entry.compress_size >= ZIP64_LIMIT
+        self._write_local_header(entry, is_zip64)
+        self.file.write(data)
+        self.entries.append(entry)
+
+    def write_large_file(self, entry: _ZipEntry, path: str, codec, level: int):
+        """
+        Compresses a large file chunk by chunk without holding it in memory, the
+        header is patched with the final CRC and sizes afterwards.
+        """
+        is_compressible = codec == ArchiveCodec.DEFLATE and not _is_compressed(path)
+        entry.compress_type = ZIP_DEFLATED if is_compressible else ZIP_STORED
+        is_zip64 = entry.file_size * 1.05 >= ZIP64_LIMIT
+        self._write_local_header(entry, is_zip64)
+        data_offset = self.file.tell()
+
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        crc = 0
+        file_size = 0
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_BYTES):
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                self.file.write(
+                    compressor.compress(chunk) if is_compressible else chunk
+                )
+        if is_compressible:
+            self.file.write(compressor.flush())
+        end_offset = self.file.tell()
+
+        entry.crc = crc
+        entry.file_size = file_size
+        entry.compress_size = end_offset - data_offset
+        self.file.seek(entry.header_offset + 14)
+        if is_zip64:
+            self.file.write(struct.pack("<L", crc))
+            self.file.seek(entry.header_offset + 30 + len(entry.name) + 4)
+            self.file.write(struct.pack("<QQ", file_size, entry.compress_size))
+        else:
+            self.file.write(struct.pack("<LLL", crc, entry.compress_size, file_size))
+        self.file.seek(end_offset)
+        self.entries.append(entry)
+
+    def close(self):
+        central_dir_offset = self.file.tell()
+        for entry in self.entries:
+            dos_date, dos_time = _dos_date_time(entry.mtime)
+            zip64_fields = []
+            file_size, compress_size, header_offset = (
+                entry.file_size,
+                entry.compress_size,
+                entry.header_offset,
+            )
+            if file_size >= ZIP64_LIMIT:
+                zip64_fields.append(file_size)
+                file_size = ZIP64_LIMIT
+            if compress_size >= ZIP64_LIMIT:
+                zip64_fields.append(compress_size)
+                compress_size = ZIP64_LIMIT
+            if header_offset >= ZIP64_LIMIT:
+                zip64_fields.append(header_offset)
+                header_offset = ZIP64_LIMIT
+            extra = b""
+            if zip64_fields:
+                extra = struct.pack(
+                    f"<HH{len(zip64_fields)}Q",
+                    1,
+                    8 * len(zip64_fields),
+                    *zip64_fields,
+                )
+            external_attr = (entry.mode & 0xFFFF) << 16 | (0x10 if entry.is_dir else 0)
+            self.file.write(
+                CENTRAL_HEADER.pack(
+                    b"PK\x01\x02",
+                    45 if zip64_fields else 20,
+                    3,
+                    45 if zip64_fields else 20,
+                    0,
+                    ZIP_UTF8_FLAG,
+                    entry.compress_type,
+                    dos_time,
+                    dos_date,
+                    entry.crc,
+                    compress_size,
+                    file_size,
+                    len(entry.name),
+                    len(extra),
+                    0,
+                    0,
+                    0,
+                    external_attr,
+                    header_offset,
+                )
+            )
+            self.file.write(entry.name)
+            self.file.write(extra)
+
+        central_dir_end = self.file.tell()
+        central_dir_size = central_dir_end - central_dir_offset
+        entry_count = len(self.entries)
+        if (
+            entry_count >= 0xFFFF
+            or central_dir_offset >= ZIP64_LIMIT
+            or central_dir_size >= ZIP64_LIMIT
+        ):
+            self.file.write(
+                ZIP64_END_OF_CENTRAL_DIR.pack(
+                    b"PK\x06\x06",
+                    ZIP64_END_OF_CENTRAL_DIR.size - 12,
+                    45,
+                    45,
+                    0,
+                    0,
+                    entry_count,
+                    entry_count,
+                    central_dir_size,
+                    central_dir_offset,
+                )
+            )
+            self.file.write(ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, central_dir_end, 1))
+        self.file.write(
+            END_OF_CENTRAL_DIR.pack(
+                b"PK\x05\x06",
+                0,
+                0,
+                min(entry_count, 0xFFFF),
+                min(entry_count, 0xFFFF),
+                min(central_dir_size, ZIP64_LIMIT),
+                min(central_dir_offset, ZIP64_LIMIT),
+                0,
+            )
+        )
+
+
+def _compress_batch(paths, codec: ArchiveCodec, level: int):
+    return [
+        _compress_file(path, codec, level) if path is not None else None
+        for path in paths
+    ]
+
+
+def _create_zip(source_path, archive_path, arcname, codec, level, workers, stats):
+    """
+    Small files are compressed in batches by the pool, while the batches are
+    written in order through a window bounded by MAX_INFLIGHT_BYTES. Large files
+    are streamed by the writer itself.
+    """
+    with open(archive_path, "wb") as f, ThreadPoolExecutor(workers) as executor:
+        writer = _ZipWriter(f)
+        window = collections.deque()
+        inflight_bytes = 0
+        batch_entries, batch_paths, batch_bytes = [], [], 0
+
+        def record(entry: _ZipEntry):
+            stats.entries += 1
+            stats.input_bytes += entry.file_size
+            if entry.compress_type == ZIP_STORED and not entry.is_dir:
+                stats.stored_entries += 1
+
+        def write_oldest_batch():
+            nonlocal inflight_bytes
+            entries, future, size = window.popleft()
+            for entry, result in zip(entries, future.result()):
+                data = b""
+                if result is not None:
+                    entry.compress_type, entry.crc, entry.file_size, data = result
+                    entry.compress_size = len(data)
+                writer.write_entry(entry, data)
+                record(entry)
+            inflight_bytes -= size
+
+        def submit_batch():
+            nonlocal inflight_bytes, batch_entries, batch_paths, batch_bytes
+            if not batch_entries:
+                return
+            while window and inflight_bytes + batch_bytes > MAX_INFLIGHT_BYTES:
+                write_oldest_batch()
+            future = executor.submit(_compress_batch, batch_paths, codec, level)
+            window.append((batch_entries, future, batch_bytes))
+            inflight_bytes += batch_bytes
+            batch_entries, batch_paths, batch_bytes = [], [], 0
+
+        for path, name, path_stat in _walk(source_path, arcname):
+            entry = _ZipEntry(
+                name.encode("utf-8"),
+                path_stat.st_mode,
+                path_stat.st_mtime,
+                is_dir=name.endswith("/"),
+            )
+            if not entry.is_dir and path_stat.st_size > LARGE_FILE_BYTES:
+                submit_batch()
+                while window:
+                    write_oldest_batch()
+                entry.file_size = path_stat.st_size
+                writer.write_large_file(entry, path, codec, level)
+                record(entry)
+                continue
+
+            batch_entries.append(entry)
+            batch_paths.append(None if entry.is_dir else path)
+            batch_bytes += 0 if entry.is_dir else path_stat.st_size
+            if batch_bytes >= BATCH_BYTES or len(batch_entries) >= BATCH_ENTRIES:
+                submit_batch()
+
+        submit_batch()
+        while window:
+            write_oldest_batch()
+        writer.close()
+
+
+def _create_tar_zst(source_path, archive_path, arcname, level, workers, stats):
+    import tarfile
+
+    import zstandard
+
+    compressor = zstandard.ZstdCompressor(level=level, threads=workers)
+    with open(archive_path, "wb") as f, compressor.stream_writer(f) as writer:
+        with tarfile.open(fileobj=writer, mode="w|") as tar:
+            for path, name, path_stat in _walk(source_path, arcname):
+                tar.add(path, arcname=name.rstrip("/"), recursive=False)
+                stats.entries += 1
+                if stat.S_ISREG(path_stat.st_mode):
+                    stats.input_bytes += path_stat.st_size
+
+
+def resolve_codec(codec: ArchiveCodec) -> ArchiveCodec:
+    """
+    Falls back from ZSTD to DEFLATE when the optional `zstandard` module is missing.
+    """
+    if codec == ArchiveCodec.ZSTD:
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            print("Module zstandard is not installed, fall back to DEFLATE.")
+            return ArchiveCodec.DEFLATE
+    return codec
+
+
+def get_archive_extension(codec: ArchiveCodec) -> str:
+    return ".tar.zst" if codec == ArchiveCodec.ZSTD else ".zip"
+
+
+def create_archive(
+    source_path: str,
+    archive_path: str,
+    codec: ArchiveCodec = ArchiveCodec.DEFLATE,
+    level: int = 6,
+    workers: int = None,
+    arcname: str = None,
+) -> ArchiveStats:
+    """
+    Archives a file or directory, compressing the entries in parallel. Already
+    compressed files and files that do not shrink are stored as they are.
+    Args:
+        source_path (str): The file or directory to archive.
+        archive_path (str): The path of the archive, a .zip, or a .tar.zst for ZSTD.
+        codec (ArchiveCodec, optional): STORED, DEFLATE or ZSTD, see resolve_codec. Defaults to DEFLATE.
+        level (int, optional): The compression level of the codec. Defaults to 6.
+        workers (int, optional): The number of compression threads. Defaults to the CPU count.
+        arcname (str, optional): The top-level name in the archive. Defaults to the source name.
+    Returns:
+        ArchiveStats: The entry count, sizes and duration of the run.
+    """
+    codec = resolve_codec(codec)
+    workers = workers or os.cpu_count() or 1
+    arcname = arcname or os.path.basename(os.path.normpath(source_path))
+    stats = ArchiveStats()
+    start_s = time.perf_counter()
+
+    if codec == ArchiveCodec.ZSTD:
+        _create_tar_zst(source_path, archive_path, arcname, level, workers, stats)
+    else:
+        level = max(0, min(level, 9))
+        _create_zip(source_path, archive_path, arcname, codec, level, workers, stats)
+
+    stats.duration_s = time.perf_counter() - start_s
+    stats.output_bytes = os.path.getsize(archive_path)
+    print(
+        f"Archived {stats.entries} entries ({stats.stored_entries} stored) "
+        f"into {archive_path} with {codec.value}: "
+        f"{stats.input_bytes / 1024**2:.1f} MiB -> {stats.output_bytes / 1024**2:.1f} MiB "
+        f"in {stats.duration_s:.2f}s ({stats.throughput_mb_s:.1f} MiB/s)."
+    )
+    return stats
+
+
+def _is_included(name: str, include_patterns) -> bool:
+    """
+    An entry is included when its path, or the path of one of its parent
+    directories, matches one of the glob patterns.
+    """
+    if not include_patterns:
+        return True
+    parts = name.rstrip("/").split("/")
+    for i in range(len(parts), 0, -1):
+        path = "/".join(parts[:i])
+        if any(
+            fnmatch.fnmatchcase(path, pattern.strip("/"))
+            for pattern in include_patterns
+        ):
+            return True
+    return False
+
+
+def _resolve_member_path(dest_path: str, name: str) -> str:
+    """
+    Returns where an entry is extracted, refusing absolute names and names that
+    would escape the destination, e.g. through "..".
+    """
+    member_path = os.path.realpath(os.path.join(dest_path, name))
+    if (
+        os.path.isabs(name)
+        or ".." in name.replace("\\", "/").split("/")
+        or os.path.commonpath([dest_path, member_path]) != dest_path
+    ):
+        raise ValueError(f"Unsafe path in archive: {name}")
+    return member_path
+
+
+def _write_member(fileobj, member_path: str, size: int, mode: int, mtime: float):
+    """
+    Writes an entry into a file preallocated to its size, so the filesystem can
+    lay it out in one extent, then restores its permissions and mtime.
+    """
+    with open(member_path, "wb") as f:
+        if size > 0:
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+                    raise
+        shutil.copyfileobj(fileobj, f, CHUNK_BYTES)
+    if mode and stat.S_IFMT(mode) in (0, stat.S_IFREG):
+        os.chmod(member_path, stat.S_IMODE(mode))
+    os.utime(member_path, (mtime, mtime))
+
+
+def _extract_zip_batch(archive_path: str, members, dest_path: str) -> int:
+    import zipfile
+
+    output_bytes = 0
+    with zipfile.ZipFile(archive_path) as zip_file:
+        for info, member_path in members:
+            with zip_file.open(info) as fileobj:
+                _write_member(
+                    fileobj,
+                    member_path,
+                    info.file_size,
+                    info.external_attr >> 16,
+                    time.mktime(info.date_time + (0, 0, -1)),
+                )
+            output_bytes += info.file_size
+    return output_bytes
+
+
+def _extract_zip(archive_path, dest_path, include_patterns, workers, stats):
+    """
+    Directories are created first, then the files are split into batches of
+    about BATCH_BYTES that the workers extract, each through its own ZipFile.
+    """
+    import zipfile
+
+    with zipfile.ZipFile(archive_path) as zip_file:
+        infos = zip_file.infolist()
+
+    batches, batch, batch_bytes = [], [], 0
+    for info in infos:
+        if not _is_included(info.filename, include_patterns):
+            stats.skipped_entries += 1
+            continue
+        member_path = _resolve_member_path(dest_path, info.filename)
+        stats.entries += 1
+        if info.is_dir():
+            os.makedirs(member_path, exist_ok=True)
+            continue
+        os.makedirs(os.path.dirname(member_path), exist_ok=True)
+        batch.append((info, member_path))
+        batch_bytes += info.file_size
+        if batch_bytes >= BATCH_BYTES or len(batch) >= BATCH_ENTRIES:
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        batches.append(batch)
+
+    with ThreadPoolExecutor(max(1, min(workers, len(batches) or 1))) as executor:
+        for output_bytes in executor.map(
+            lambda batch: _extract_zip_batch(archive_path, batch, dest_path), batches
+        ):
+            stats.output_bytes += output_bytes
+
+
+def _extract_tar(tar_file, dest_path, include_patterns, stats):
+    """
+    Reads the tar as a stream, so a compressed tar is never copied to a temporary
+    file. Regular files are written like zip entries, the other entries go
+    through the "data" filter of tarfile when it is available.
+    """
+    import tarfile
+
+    filter_kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+    for member in tar_file:
+        if not _is_included(member.name, include_patterns):
+            stats.skipped_entries += 1
+            continue
+        member_path = _resolve_member_path(dest_path, member.name)
+        stats.entries += 1
+        if member.isreg():
+            os.makedirs(os.path.dirname(member_path), exist_ok=True)
+            _write_member(
+                tar_file.extractfile(member),
+                member_path,
+                member.size,
+                member.mode,
+                member.mtime,
+            )
+            stats.output_bytes += member.size
+        else:
+            tar_file.extract(member, dest_path, **filter_kwargs)
+
+
+def extract_archive(
+    archive_path: str,
+    dest_path: str,
+    include_patterns=None,
+    workers: int = None,
+) -> ExtractStats:
+    """
+    Extracts a .zip, .tar, .tar.gz, .tar.bz2 or .tar.zst archive. Zip entries are
+    decompressed in parallel, tar archives are streamed.
+    Args:
+        archive_path (str): The path of the archive.
+        dest_path (str): The directory to extract into.
+        include_patterns (List[str], optional): Only extract the entries matching
+            these glob patterns, or below a directory matching them, e.g.
+            "app_source/services/api". Defaults to None, which extracts everything.
+        workers (int, optional): The number of zip extraction threads. Defaults to the CPU count.
+    Returns:
+        ExtractStats: The entry counts, the bytes written and the duration.
+    Raises:
+        ValueError: If the format is not supported or an entry escapes `dest_path`.
+    """
+    import tarfile
+
+    workers = workers or os.cpu_count() or 1
+    dest_path = os.path.realpath(dest_path)
+    os.makedirs(dest_path, exist_ok=True)
+    stats = ExtractStats()
+    start_s = time.perf_counter()
+
+    if archive_path.endswith(".zip"):
+        _extract_zip(archive_path, dest_path, include_patterns, workers, stats)
+    elif archive_path.endswith(".tar.zst"):
+        import zstandard
+
+        with open(archive_path, "rb") as f:
+            with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                with tarfile.open(fileobj=reader, mode="r|") as tar_file:
+                    _extract_tar(tar_file, dest_path, include_patterns, stats)
+    elif archive_path.endswith((".tar", ".tar.gz", ".tar.bz2")):
+        with tarfile.open(archive_path, "r|*") as tar_file:
+            _extract_tar(tar_file, dest_path, include_patterns, stats)
+    else:
+        raise ValueError(f"The file {archive_path} is not a supported archive format")
+
+    stats.duration_s = time.perf_counter() - start_s
+    print(
+        f"Extracted {stats.entries} entries ({stats.skipped_entries} skipped) "
+        f"of {archive_path} into {dest_path}: "
+        f"{stats.output_bytes / 1024**2:.1f} MiB in {stats.duration_s:.2f}s "
+        f"({stats.throughput_mb_s:.1f} MiB/s)."
+    )
+    return stats
@@ -1,51 +1,380 @@
+import contextlib
+import errno
+import fcntl
+import filecmp
 import glob
 import os
 import shutil
-import tarfile
-import zipfile
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 
+from app.models.os_model import (
+    CopyStats,
+    CopyStrategy,
+    DirStats,
+    ExtractStats,
+    SyncSummary,
+)
 
-def cp(source_pattern, destination):
+TREE_MAX_DEPTH = 3
+TREE_MAX_ENTRIES = 200
+FICLONE = 0x40049409
+COPY_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+COPY_BATCH_FILES = 64
+COPY_FALLBACK_ORDER = [
+    CopyStrategy.HARDLINK,
+    CopyStrategy.REFLINK,
+    CopyStrategy.COPY_FILE_RANGE,
+    CopyStrategy.SENDFILE,
+    CopyStrategy.COPY,
+]
+COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EPERM,
+    errno.EMLINK,
+}
+
+
+def _hardlink_file(source, dest):
+    if os.path.lexists(dest):
+        os.remove(dest)
+    os.link(source, dest)
+
+
+def _reflink_file(source, dest):
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _copy_file_range_file(source, dest):
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+            if copied == 0:
+                raise OSError(errno.EINVAL, "copy_file_range copied nothing", source)
+            remaining -= copied
+
+
+def _sendfile_file(source, dest):
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+            if sent == 0:
+                raise OSError(errno.EINVAL, "sendfile sent nothing", source)
+            offset += sent
+
+
+COPY_FILE_FUNCS = {
+    CopyStrategy.HARDLINK: _hardlink_file,
+    CopyStrategy.REFLINK: _reflink_file,
+    CopyStrategy.COPY_FILE_RANGE: _copy_file_range_file,
+    CopyStrategy.SENDFILE: _sendfile_file,
+    CopyStrategy.COPY: shutil.copyfile,
+}
+
+
+def _copy_file(source, dest, strategies, disabled_strategies) -> CopyStrategy:
+    """
+    Copies one file with the first strategy of the chain that the filesystems
+    support. A strategy that fails with an unsupported error is disabled for
+    the rest of the copy, so the fallback is paid once and not per file.
+    """
+    if os.path.exists(dest) and os.path.samefile(source, dest):
+        # A previous hardlink copy, unlink it so the source is never truncated.
+        os.remove(dest)
+    for strategy in strategies:
+        if strategy in disabled_strategies:
+            continue
+        try:
+            COPY_FILE_FUNCS[strategy](source, dest)
+        except (OSError, AttributeError) as e:
+            is_unsupported = isinstance(e, AttributeError) or (
+                e.errno in COPY_FALLBACK_ERRNOS
+            )
+            if strategy == CopyStrategy.COPY or not is_unsupported:
+                raise
+            disabled_strategies.add(strategy)
+            continue
+        if strategy != CopyStrategy.HARDLINK:
+            shutil.copystat(source, dest)
+        return strategy
+
+
+def _copy_batch(pairs, strategies, disabled_strategies) -> CopyStats:
+    stats = CopyStats()
+    for source, dest in pairs:
+        size_bytes = os.stat(source).st_size
+        strategy = _copy_file(source, dest, strategies, disabled_strategies)
+        stats.files += 1
+        stats.bytes_copied += size_bytes
+        stats.strategies[strategy.name] = stats.strategies.get(strategy.name, 0) + 1
+    return stats
+
+
+def _plan_copy(source, dest_path, dir_pairs):
+    if not os.path.isdir(source):
+        return [(source, dest_path)]
+
+    file_pairs = []
+    for root, _, files in os.walk(source, followlinks=True):
+        dest_root = os.path.normpath(
+            os.path.join(dest_path, os.path.relpath(root, source))
+        )
+        os.makedirs(dest_root, exist_ok=True)
+        dir_pairs.append((root, dest_root))
+        for name in files:
+            file_pairs.append((os.path.join(root, name), os.path.join(dest_root, name)))
+    return file_pairs
+
+
+def _map_batches(func, items, workers):
+    """
+    Applies `func` to batches of COPY_BATCH_FILES items on a thread pool, so that
+    the overhead of the pool is paid per batch and not per file.
+    """
+    batches = [
+        items[i : i + COPY_BATCH_FILES] for i in range(0, len(items), COPY_BATCH_FILES)
+    ]
+    workers = max(1, min(workers or COPY_WORKERS, len(batches)))
+    if workers == 1:
+        return [func(batch) for batch in batches]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, batches))
+
+
+def _resolve_copy_targets(source_pattern, destination):
+    targets = []
     for source in glob.glob(source_pattern):
         if os.path.isdir(destination):
             dest_path = os.path.join(destination, os.path.basename(source))
         else:
             dest_path = destination
+        targets.append((source, dest_path))
+    return targets
+
+
+def copy_files(
+    file_pairs, strategy: CopyStrategy = CopyStrategy.AUTO, workers: int = None
+) -> CopyStats:
+    """
+    Copies (source, destination) file pairs with the strategies and thread pool
+    of cp. The parent directories of the destinations must exist.
+    """
+    if strategy == CopyStrategy.AUTO:
+        strategy = CopyStrategy.REFLINK
+    strategies = COPY_FALLBACK_ORDER[COPY_FALLBACK_ORDER.index(strategy) :]
+    disabled_strategies = set()
+
+    stats = CopyStats()
+    for batch_stats in _map_batches(
+        lambda batch: _copy_batch(batch, strategies, disabled_strategies),
+        file_pairs,
+        workers,
+    ):
+        stats = stats.merge(batch_stats)
+    return stats
+
+
+def _format_strategies(stats: CopyStats) -> str:
+    return ", ".join(
+        f"{name.lower()}: {count}" for name, count in stats.strategies.items()
+    )
+
+
+def cp(
+    source_pattern,
+    destination,
+    strategy: CopyStrategy = CopyStrategy.AUTO,
+    workers: int = None,
+) -> CopyStats:
+    """
+    Copies the files and directories matching a glob pattern into a destination,
+    like `cp -r`. Files are copied by a thread pool in batches, and each file with
+    the cheapest strategy the filesystems support: a hardlink when asked for, then
+    a reflink, copy_file_range, sendfile and finally a plain copy.
+    Args:
+        source_pattern (str): The glob pattern of the files and directories to copy.
+        destination (str): The destination directory, or file for a single file.
+        strategy (CopyStrategy, optional): The first strategy to try, AUTO starts
+            with REFLINK. HARDLINK shares the inodes with the source, so it must
+            only be used when neither side is modified afterwards. Defaults to AUTO.
+        workers (int, optional): The number of copy threads. Defaults to COPY_WORKERS.
+    Returns:
+        CopyStats: The number of files and bytes copied and the strategies used.
+    """
+    start_s = time.perf_counter()
+    file_pairs = []
+    dir_pairs = []
+    for source, dest_path in _resolve_copy_targets(source_pattern, destination):
+        file_pairs.extend(_plan_copy(source, dest_path, dir_pairs))
+
+    stats = copy_files(file_pairs, strategy, workers)
+    stats.dirs = len(dir_pairs)
+    for source_dir, dest_dir in reversed(dir_pairs):
+        shutil.copystat(source_dir, dest_dir)
+
+    stats.duration_s = time.perf_counter() - start_s
+    print(
+        f"Copied {stats.files} files into {destination}: "
+        f"{format_size(stats.bytes_copied)} in {stats.duration_s:.2f}s "
+        f"({stats.throughput_mb_s:.1f} MiB/s), "
+        f"{_format_strategies(stats) or 'nothing copied'}."
+    )
+    return stats
+
+
+def _is_file_unchanged(source, dest, is_compare_content) -> bool:
+    try:
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        return False
+    source_stat = os.stat(source)
+    if not stat.S_ISREG(dest_stat.st_mode) or source_stat.st_size != dest_stat.st_size:
+        return False
+    if is_compare_content:
+        return filecmp.cmp(source, dest, shallow=False)
+    return source_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+
+def _diff_batch(pairs, is_compare_content):
+    changed_pairs = []
+    created = 0
+    for source, dest in pairs:
+        if _is_file_unchanged(source, dest, is_compare_content):
+            continue
+        if os.path.isdir(dest) and not os.path.islink(dest):
+            shutil.rmtree(dest)
+        if not os.path.lexists(dest):
+            created += 1
+        changed_pairs.append((source, dest))
+    return changed_pairs, created
 
-        if os.path.isdir(source):
-            shutil.copytree(source, dest_path, dirs_exist_ok=True)
-        else:
-            shutil.copy2(source, dest_path)
 
+def _delete_extraneous(source_dir, dest_dir) -> int:
+    deleted = 0
+    for root, dirs, files in os.walk(dest_dir):
+        source_root = os.path.join(source_dir, os.path.relpath(root, dest_dir))
+        for name in list(dirs):
+            if not os.path.isdir(os.path.join(source_root, name)):
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    os.remove(path)
+                else:
+                    shutil.rmtree(path)
+                dirs.remove(name)
+                deleted += 1
+        for name in files:
+            if not os.path.lexists(os.path.join(source_root, name)):
+                os.remove(os.path.join(root, name))
+                deleted += 1
+    return deleted
+
+
+def sync(
+    source_pattern,
+    destination,
+    is_compare_content: bool = False,
+    is_delete: bool = False,
+    strategy: CopyStrategy = CopyStrategy.AUTO,
+    workers: int = None,
+) -> SyncSummary:
+    """
+    Copies only the new and changed files, like `rsync -a`, with the same source
+    and destination semantics as cp. A file is unchanged when its size and mtime
+    match the destination, which cp preserves, so a second run on an unchanged
+    tree copies nothing.
+    Args:
+        source_pattern (str): The glob pattern of the files and directories to sync.
+        destination (str): The destination directory, or file for a single file.
+        is_compare_content (bool, optional): Compare the content of files of the same
+            size instead of their mtime. Defaults to False.
+        is_delete (bool, optional): Delete the files of a destination directory that
+            are not in its source directory. Defaults to False.
+        strategy (CopyStrategy, optional): The copy strategy, see cp. Defaults to AUTO.
+        workers (int, optional): The number of threads. Defaults to COPY_WORKERS.
+    Returns:
+        SyncSummary: The number of files created, updated, unchanged and deleted.
+    """
+    start_s = time.perf_counter()
+    summary = SyncSummary()
+    file_pairs = []
+    dir_pairs = []
+    for source, dest_path in _resolve_copy_targets(source_pattern, destination):
+        if is_delete and os.path.isdir(source) and os.path.isdir(dest_path):
+            summary.deleted += _delete_extraneous(source, dest_path)
+        file_pairs.extend(_plan_copy(source, dest_path, dir_pairs))
+
+    changed_pairs = []
+    for batch_changed_pairs, created in _map_batches(
+        lambda batch: _diff_batch(batch, is_compare_content), file_pairs, workers
+    ):
+        changed_pairs.extend(batch_changed_pairs)
+        summary.created += created
+    summary.updated = len(changed_pairs) - summary.created
+    summary.unchanged = len(file_pairs) - len(changed_pairs)
+
+    copy_stats = copy_files(changed_pairs, strategy, workers)
+    summary.bytes_copied = copy_stats.bytes_copied
+    for source_dir, dest_dir in reversed(dir_pairs):
+        shutil.copystat(source_dir, dest_dir)
+
+    summary.duration_s = time.perf_counter() - start_s
+    print(
+        f"Synced {len(file_pairs)} files into {destination}: "
+        f"{summary.created} created, {summary.updated} updated, "
+        f"{summary.unchanged} unchanged, {summary.deleted} deleted, "
+        f"{format_size(summary.bytes_copied)} copied in {summary.duration_s:.2f}s"
+        f"{', ' + _format_strategies(copy_stats) if copy_stats.files else ''}."
+    )
+    return summary
+
+
+def unzip(
+    target_archive_path, dest_archive_path, include_patterns=None, workers=None
+) -> List[ExtractStats]:
+    """
+    Extracts every archive matching a glob pattern, see archive_util.extract_archive.
+    Args:
+        target_archive_path (str): The glob pattern of the archives.
+        dest_archive_path (str): The directory to extract into.
+        include_patterns (List[str], optional): Only extract the entries matching
+            these glob patterns. Defaults to None.
+        workers (int, optional): The number of zip extraction threads. Defaults to None.
+    Returns:
+        List[ExtractStats]: The stats of each archive.
+    """
+    from app.utils import archive_util
 
-def unzip(target_archive_path, dest_archive_path):
     archive_files = glob.glob(target_archive_path)
 
     if not archive_files:
         raise FileNotFoundError(f"No files matching pattern: {target_archive_path}")
 
-    for archive_file in archive_files:
-        if archive_file.endswith(".zip"):
-            with zipfile.ZipFile(archive_file, "r") as zip_ref:
-                zip_ref.extractall(dest_archive_path)
-                print(f"Extracted {archive_file} to {dest_archive_path}")
-        elif (
-            archive_file.endswith(".tar")
-            or archive_file.endswith(".tar.gz")
-            or archive_file.endswith(".tar.bz2")
-        ):
-            with tarfile.open(archive_file, "r:*") as tar_ref:
-                tar_ref.extractall(dest_archive_path)
-                print(f"Extracted {archive_file} to {dest_archive_path}")
-        else:
-            raise ValueError(
-                f"The file {archive_file} is not a supported archive format"
-            )
+    extract_stats = [
+        archive_util.extract_archive(
+            archive_file,
+            dest_archive_path,
+            include_patterns=include_patterns,
+            workers=workers,
+        )
+        for archive_file in archive_files
+    ]
 
     print("> Verify content of at current directory.")
     for item in os.listdir(dest_archive_path):
         path = os.path.join(dest_archive_path, item)
         print(path)
+    return extract_stats
 
 
 def delete_path(path):
@@ -56,3 +385,193 @@ def delete_path(path):
             shutil.rmtree(path)
     else:
         raise FileNotFoundError(f"Path not found: {path}")
+
+
+@contextlib.contextmanager
+def file_lock(lock_file_path: str, is_shared: bool = False):
+    """
+    Holds an advisory lock on a file, shared between readers or exclusive,
+    so that concurrent jobs on the same agent can share a cache directory.
+    """
+    with open(lock_file_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if is_shared else fcntl.LOCK_EX)
+        try:
+            yield lock_file
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def try_file_lock(lock_file_path: str):
+    """
+    Returns an open file holding an exclusive lock, or None if another process
+    holds a lock on it. The lock is released when the file is closed.
+    """
+    lock_file = open(lock_file_path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def format_size(size_bytes: int) -> str:
+    size = float(size_bytes)
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024 or unit == "GiB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} {unit}"
+        size /= 1024
+
+
+def dir_stats(path) -> DirStats:
+    """
+    Counts files, directories and bytes below a directory without following symlinks.
+    """
+    stats = DirStats()
+    pending_dirs = [path]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stats.dirs += 1
+                        pending_dirs.append(entry.path)
+                        continue
+                    stats.files += 1
+                    try:
+                        stats.size_bytes += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        pass
+        except OSError:
+            continue
+    return stats
+
+
+def _sorted_entries(path):
+    try:
+        with os.scandir(path) as entries:
+            return sorted(entries, key=lambda entry: entry.name)
+    except OSError:
+        return []
+
+
+def _render_tree(path, max_depth, max_entries):
+    lines = [path]
+    skipped_entries = 0
+
+    def walk(dir_path, prefix, depth):
+        nonlocal skipped_entries
+        entries = _sorted_entries(dir_path)
+        for index, entry in enumerate(entries):
+            if len(lines) > max_entries:
+                skipped_entries += len(entries) - index
+                return
+            is_last = index == len(entries) - 1
+            is_dir = entry.is_dir(follow_symlinks=False)
+            connector = "`-- " if is_last else "|-- "
+            lines.append(f"{prefix}{connector}{entry.name}{'/' if is_dir else ''}")
+            if is_dir and depth < max_depth:
+                walk(entry.path, prefix + ("    " if is_last else "|   "), depth + 1)
+
+    walk(path, "", 1)
+    if skipped_entries:
+        lines.append(f"... {skipped_entries} more entries not shown.")
+    return lines
+
+
+def summarize_dir(
+    path,
+    max_depth=TREE_MAX_DEPTH,
+    max_entries=TREE_MAX_ENTRIES,
+    max_workers=None,
+) -> str:
+    """
+    Renders a bounded tree of a directory followed by file counts and aggregate
+    sizes per top-level directory. The top-level directories are walked in
+    parallel on a thread pool.
+    Args:
+        path (str): The directory to summarize.
+        max_depth (int, optional): The deepest level rendered in the tree. Defaults to TREE_MAX_DEPTH.
+        max_entries (int, optional): The maximum number of entries rendered in the tree. Defaults to TREE_MAX_ENTRIES.
+        max_workers (int, optional): The number of threads walking the top-level directories. Defaults to the executor default.
+    Returns:
+        str: The rendered summary.
+    """
+    from tabulate import tabulate
+
+    if not os.path.isdir(path):
+        raise NotADirectoryError(f"Directory not found: {path}")
+
+    started_at = time.perf_counter()
+    lines = _render_tree(path, max_depth, max_entries)
+
+    top_level_entries = _sorted_entries(path)
+    top_level_dirs = [e for e in top_level_entries if e.is_dir(follow_symlinks=False)]
+    top_level_stats = DirStats()
+    for entry in top_level_entries:
+        if not entry.is_dir(follow_symlinks=False):
+            top_level_stats.files += 1
+            try:
+                top_level_stats.size_bytes += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                pass
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dirs_stats = list(executor.map(lambda e: dir_stats(e.path), top_level_dirs))
+
+    total_stats = top_level_stats
+    rows = []
+    for entry, stats in zip(top_level_dirs, dirs_stats):
+        total_stats = total_stats.merge(stats)
+        total_stats.dirs += 1
+        rows.append(
+            [f"{entry.name}/", stats.dirs, stats.files, format_size(stats.size_bytes)]
+        )
+    if top_level_stats.files:
+        rows.append(
+            [
+                "(files)",
+                0,
+                top_level_stats.files,
+                format_size(top_level_stats.size_bytes),
+            ]
+        )
+
+    lines.append("")
+    lines.append(
+        f"{total_stats.dirs} directories, {total_stats.files} files, "
+        f"{format_size(total_stats.size_bytes)} "
+        f"(scanned in {time.perf_counter() - started_at:.2f}s)"
+    )
+    if rows:
+        lines.append(
+            tabulate(rows, headers=["Entry", "Dirs", "Files", "Size"], tablefmt="grid")
+        )
+    return "\n".join(lines)
+
+
+def list_dir(path) -> str:
+    """
+    Lists a directory, or a single file, in the spirit of `ls -la`.
+    """
+    if os.path.isdir(path):
+        entries = [(name, os.path.join(path, name)) for name in [".", ".."]]
+        entries.extend((e.name, e.path) for e in _sorted_entries(path))
+    else:
+        entries = [(path, path)]
+
+    lines = []
+    for name, entry_path in entries:
+        entry_stat = os.lstat(entry_path)
+        modified_at = time.strftime(
+            "%Y-%m-%d %H:%M", time.localtime(entry_stat.st_mtime)
+        )
+        display_name = name
+        if stat.S_ISLNK(entry_stat.st_mode):
+            display_name = f"{name} -> {os.readlink(entry_path)}"
+        lines.append(
+            f"{stat.filemode(entry_stat.st_mode)} {entry_stat.st_size:>12} "
+            f"{modified_at} {display_name}"
+        )
+    return "\n".join(lines)
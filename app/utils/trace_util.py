@@ -0,0 +1,264 @@
+import contextlib
+import contextvars
+import json
+import os
+import re
+import shlex
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    from app.models.shell_model import ResourceUsage
+
+SECRET_ENV_VAR_PATTERN = re.compile(
+    r"PASSWORD|TOKEN|SECRET|CREDENTIAL|KUBE_CONFIG_CONTENT", re.IGNORECASE
+)
+URL_CREDENTIAL_PATTERN = re.compile(r"(://)[^/\s@]+@")
+# Helm `--set ...env.secret.<NAME>=<value>` args, the value may hold spaces in an argv.
+SECRET_SET_ARG_PATTERN = re.compile(r"(env\.secret\.[^=\s]+=).*", re.DOTALL)
+SECRET_SET_VALUE_PATTERN = re.compile(r"(env\.secret\.[^=\s']+=)[^\s']+")
+REDACTED = "***"
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        category: str,
+        start_ns: int,
+        thread_id: int,
+        parent: "Span" = None,
+        end_ns: int = None,
+        attrs: Dict = None,
+    ):
+        self.name = name
+        self.category = category
+        self.start_ns = start_ns
+        self.thread_id = thread_id
+        self.parent = parent
+        self.end_ns = end_ns
+        self.attrs = attrs if attrs is not None else {}
+
+    def __repr__(self):
+        return (
+            f"Span(name={self.name!r}, category={self.category!r}, "
+            f"duration_s={self.duration_s!r})"
+        )
+
+    @property
+    def duration_s(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+    def to_trace_event(self, origin_ns: int, pid: int) -> Dict:
+        end_ns = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": (self.start_ns - origin_ns) / 1e3,
+            "dur": (end_ns - self.start_ns) / 1e3,
+            "pid": pid,
+            "tid": self.thread_id,
+            "args": self.attrs,
+        }
+
+
+_origin_ns = time.perf_counter_ns()
+_spans: List[Span] = []
+_spans_lock = threading.Lock()
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+@contextlib.contextmanager
+def span(name: str, category: str = "step", **attrs):
+    """
+    Records a timing span nested under the span currently open in this context.
+    Args:
+        name (str): The name of the span.
+        category (str, optional): The category shown by the trace viewer. Defaults to "step".
+        **attrs: Extra attributes attached to the span.
+    Yields:
+        Span: The opened span, its attrs can be updated while it is open.
+    """
+    current = Span(
+        name=name,
+        category=category,
+        start_ns=time.perf_counter_ns(),
+        thread_id=threading.get_ident(),
+        parent=_current_span.get(),
+        attrs=dict(attrs),
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.perf_counter_ns()
+        _current_span.reset(token)
+        with _spans_lock:
+            _spans.append(current)
+
+
+def get_spans() -> List[Span]:
+    with _spans_lock:
+        return list(_spans)
+
+
+def redact(text: str) -> str:
+    """
+    Masks credentials embedded in URLs, values of secret-like env vars and
+    `env.secret.<NAME>=<value>` values.
+    """
+    text = URL_CREDENTIAL_PATTERN.sub(rf"\1{REDACTED}@", text)
+    text = SECRET_SET_VALUE_PATTERN.sub(rf"\1{REDACTED}", text)
+    for name, value in os.environ.items():
+        if SECRET_ENV_VAR_PATTERN.search(name) and len(value) >= 4:
+            text = text.replace(value, REDACTED)
+    return text
+
+
+def redact_cmd(cmd: str | List[str]) -> str:
+    """
+    Returns a command as one shell-like string, masked like `redact`. The args of
+    an argv are masked one by one, so a secret value is masked whole even when it
+    holds spaces.
+    """
+    if isinstance(cmd, str):
+        return redact(cmd)
+    return redact(
+        shlex.join(SECRET_SET_ARG_PATTERN.sub(rf"\1{REDACTED}", arg) for arg in cmd)
+    )
+
+
+def export_chrome_trace(trace_file_path: str) -> str:
+    """
+    Writes the recorded spans as a Chrome/Perfetto trace file.
+    Args:
+        trace_file_path (str): The path of the JSON trace file.
+    Returns:
+        str: The absolute path of the written trace file.
+    """
+    pid = os.getpid()
+    trace_events = [
+        {
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "args": {"name": "one-press-functions"},
+        }
+    ]
+    trace_events.extend(s.to_trace_event(_origin_ns, pid) for s in get_spans())
+
+    trace_file_path = os.path.abspath(trace_file_path)
+    with open(trace_file_path, "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+    return trace_file_path
+
+
+def print_slowest_spans(limit: int = 10):
+    """
+    Prints the slowest recorded spans as a condensed table.
+    Args:
+        limit (int, optional): The number of spans to print. Defaults to 10.
+    """
+    from tabulate import tabulate
+
+    slowest_spans = sorted(get_spans(), key=lambda s: s.duration_s, reverse=True)
+    rows = [
+        [
+            s.name,
+            s.parent.name if s.parent is not None else "",
+            s.category,
+            s.attrs.get("exit_code", ""),
+            s.duration_s,
+        ]
+        for s in slowest_spans[:limit]
+    ]
+    print("> Slowest steps.")
+    print(
+        tabulate(
+            rows,
+            headers=["Step", "Parent", "Category", "Exit_code", "Duration_s"],
+            tablefmt="grid",
+            floatfmt=".3f",
+        )
+    )
+
+
+def _get_function_name(span: Span) -> str:
+    while span is not None and span.category != "function":
+        span = span.parent
+    return span.name if span is not None else "-"
+
+
+def print_resource_usage_summary():
+    """
+    Prints the child process resource usage of the commands run so far, summed
+    per function with a total row, to tell CPU-bound, memory-bound and I/O-bound
+    steps apart.
+    """
+    from tabulate import tabulate
+
+    from app.models.shell_model import ResourceUsage
+
+    cmd_spans = [
+        s for s in get_spans() if s.category == "cmd" and "resource_usage" in s.attrs
+    ]
+    if not cmd_spans:
+        return
+
+    function_usages = {}
+    total_usage = ResourceUsage()
+    for cmd_span in sorted(cmd_spans, key=lambda s: s.start_ns):
+        usage = ResourceUsage(**cmd_span.attrs["resource_usage"])
+        total_usage = total_usage.merge(usage)
+        function_name = _get_function_name(cmd_span)
+        cmd_count, function_usage = function_usages.get(
+            function_name, (0, ResourceUsage())
+        )
+        function_usages[function_name] = (cmd_count + 1, function_usage.merge(usage))
+    rows = [
+        _to_resource_usage_row(function_name, cmd_count, usage)
+        for function_name, (cmd_count, usage) in function_usages.items()
+    ]
+    rows.append(_to_resource_usage_row("Total", len(cmd_spans), total_usage))
+
+    print("> Resource usage of commands per function.")
+    print(
+        tabulate(
+            rows,
+            headers=[
+                "Function",
+                "Commands",
+                "Wall_s",
+                "User_cpu_s",
+                "Sys_cpu_s",
+                "Cpu_util",
+                "Max_rss_mb",
+                "Read_mb",
+                "Write_mb",
+                "Ctx_switches",
+            ],
+            tablefmt="grid",
+            floatfmt=".2f",
+        )
+    )
+
+
+def _to_resource_usage_row(name, cmd_count, usage: "ResourceUsage"):
+    return [
+        name,
+        cmd_count,
+        usage.wall_time_s,
+        usage.user_cpu_s,
+        usage.sys_cpu_s,
+        usage.cpu_utilization,
+        usage.max_rss_kb / 1024,
+        usage.read_bytes / 1024**2,
+        usage.write_bytes / 1024**2,
+        usage.voluntary_ctx_switches + usage.involuntary_ctx_switches,
+    ]
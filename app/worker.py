@@ -0,0 +1,26 @@
+import os
+import sys
+
+from app.services import worker_service
+
+
+def execute():
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    socket_path = os.getenv(
+        "FUNCTIONS_WORKER_SOCKET", worker_service.DEFAULT_SOCKET_PATH
+    )
+
+    match command:
+        case "serve":
+            idle_timeout_s = float(os.getenv("FUNCTIONS_WORKER_IDLE_TIMEOUT_S", 3600))
+            worker_service.serve(socket_path, idle_timeout_s)
+        case "start":
+            worker_service.start(socket_path, os.getenv("FUNCTIONS_WORKER_LOG_FILE"))
+        case "stop":
+            worker_service.stop(socket_path)
+        case _:
+            raise ValueError(f"Unknown worker command: {command}")
+
+
+if __name__ == "__main__":
+    execute()
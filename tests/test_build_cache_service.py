@@ -0,0 +1,38 @@
+from app.models.platform_model import Platform
+from app.services import build_cache_service
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def _compute_key(app_dir):
+    return build_cache_service.compute_key(
+        Platform.MAVEN, "mvn package", "Apache Maven 3.9.6", [str(app_dir)]
+    )
+
+
+def test_compute_key_hashes_nested_target_package(tmp_path):
+    app_dir = tmp_path / "app"
+    _write(app_dir / "pom.xml", "<project/>")
+    source_path = app_dir / "src/main/java/com/acme/target/A.java"
+    _write(source_path, "class A {}")
+    key = _compute_key(app_dir)
+
+    _write(source_path, "class A { int a; }")
+
+    assert _compute_key(app_dir) != key
+
+
+def test_compute_key_ignores_module_build_dir(tmp_path):
+    app_dir = tmp_path / "app"
+    _write(app_dir / "pom.xml", "<project/>")
+    _write(app_dir / "core/pom.xml", "<project/>")
+    _write(app_dir / "core/src/main/java/A.java", "class A {}")
+    key = _compute_key(app_dir)
+
+    _write(app_dir / "target/app.jar", "jar")
+    _write(app_dir / "core/target/core.jar", "jar")
+
+    assert _compute_key(app_dir) == key
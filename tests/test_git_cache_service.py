@@ -0,0 +1,101 @@
+import os
+import subprocess
+
+from app.services import git_cache_service
+from app.utils import io_util
+
+
+def _git(*args, cwd=None):
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def _commit(work_dir, file_name, text):
+    with open(os.path.join(work_dir, file_name), "w") as f:
+        f.write(text)
+    _git("add", file_name, cwd=work_dir)
+    _git("commit", "-q", "-m", file_name, cwd=work_dir)
+    _git("push", "-q", "origin", "main", cwd=work_dir)
+    return _git("rev-parse", "HEAD", cwd=work_dir)
+
+
+def _create_repo(tmp_path, name):
+    bare_path = str(tmp_path / f"{name}.git")
+    work_dir = str(tmp_path / f"{name}-work")
+    _git("init", "-q", "--bare", "-b", "main", bare_path)
+    _git("clone", "-q", bare_path, work_dir)
+    _git("config", "user.email", "ci@example.com", cwd=work_dir)
+    _git("config", "user.name", "ci", cwd=work_dir)
+    _git("checkout", "-q", "-b", "main", cwd=work_dir)
+    _commit(work_dir, "README.md", name)
+    return f"file://{bare_path}", work_dir
+
+
+def _clone(cache_dir, git_url, dest_dir, max_bytes=None):
+    os.makedirs(dest_dir)
+    git_cache_service.clone_from_mirror(
+        cache_dir, git_url, git_url, "main", max_bytes=max_bytes, cwd=dest_dir
+    )
+    return _git("rev-parse", "HEAD", cwd=dest_dir)
+
+
+def test_clone_from_mirror_miss_then_hit(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    git_url, work_dir = _create_repo(tmp_path, "app")
+    mirror_path = git_cache_service.get_mirror_path(cache_dir, git_url)
+
+    first_commit_id = _git("rev-parse", "HEAD", cwd=work_dir)
+    assert _clone(cache_dir, git_url, str(tmp_path / "first")) == first_commit_id
+    assert os.path.isdir(mirror_path)
+
+    second_commit_id = _commit(work_dir, "a.txt", "a")
+    assert _clone(cache_dir, git_url, str(tmp_path / "second")) == second_commit_id
+    assert _git("rev-parse", "main", cwd=mirror_path) == second_commit_id
+
+
+def test_evict_removes_least_recently_used_mirror(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    old_url, _ = _create_repo(tmp_path, "old")
+    new_url, _ = _create_repo(tmp_path, "new")
+    _clone(cache_dir, old_url, str(tmp_path / "old-clone"))
+    old_mirror_path = git_cache_service.get_mirror_path(cache_dir, old_url)
+    os.utime(old_mirror_path, (0, 0))
+
+    _clone(cache_dir, new_url, str(tmp_path / "new-clone"), max_bytes=1)
+
+    assert not os.path.exists(old_mirror_path)
+    assert os.path.isdir(git_cache_service.get_mirror_path(cache_dir, new_url))
+
+
+def test_evict_skips_locked_mirror(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    git_url, _ = _create_repo(tmp_path, "app")
+    _clone(cache_dir, git_url, str(tmp_path / "clone"))
+    mirror_path = git_cache_service.get_mirror_path(cache_dir, git_url)
+
+    with io_util.file_lock(f"{mirror_path}.lock", is_shared=True):
+        git_cache_service.evict(cache_dir, max_bytes=1)
+
+    assert os.path.isdir(mirror_path)
+
+
+def test_clone_from_mirror_evicted_before_clone(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    git_url, work_dir = _create_repo(tmp_path, "app")
+    update_mirror = git_cache_service.update_mirror
+    update_calls = []
+
+    def update_then_evict(*args):
+        mirror_path = update_mirror(*args)
+        update_calls.append(mirror_path)
+        if len(update_calls) == 1:
+            git_cache_service.evict(cache_dir, max_bytes=0)
+        return mirror_path
+
+    monkeypatch.setattr(git_cache_service, "update_mirror", update_then_evict)
+
+    commit_id = _clone(cache_dir, git_url, str(tmp_path / "clone"))
+
+    assert commit_id == _git("rev-parse", "HEAD", cwd=work_dir)
+    assert len(update_calls) == 2
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# In microseconds, generous for slow CI agents.
+IMPORT_BUDGET_US = 300_000
+
+
+def _import_times(module_name: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=PROJECT_DIR,
+        env={**os.environ, "PYTHONPATH": PROJECT_DIR},
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.removeprefix("import time:").split("|")
+        import_times[name.strip()] = int(cumulative_us)
+    return import_times
+
+
+def test_import_main_within_budget():
+    import_times = _import_times("app.main")
+
+    assert import_times["app.main"] < IMPORT_BUDGET_US
+
+
+def test_import_main_is_lazy():
+    import_times = _import_times("app.main")
+
+    assert "tabulate" not in import_times
+    assert not [name for name in import_times if name.startswith("app.functions.")]
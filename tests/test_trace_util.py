@@ -0,0 +1,41 @@
+from app.services import shell_service
+from app.utils import trace_util
+
+
+def test_redact_cmd_masks_helm_secret_values():
+    cmd = [
+        "helm",
+        "upgrade",
+        "--set",
+        "deployment.containers.api.env.secret.DB_PASS=s3cr et",
+        "--set",
+        "deployment.containers.api.env.common.LOG_LEVEL=debug",
+    ]
+
+    argv = trace_util.redact_cmd(cmd)
+
+    assert "s3cr" not in argv
+    assert "'deployment.containers.api.env.secret.DB_PASS=***'" in argv
+    assert "env.common.LOG_LEVEL=debug" in argv
+
+
+def test_redact_masks_helm_secret_values_of_shell_string():
+    cmd = "helm upgrade --set deployment.containers.api.env.secret.DB_PASS=s3cret"
+
+    assert trace_util.redact_cmd(cmd).endswith("env.secret.DB_PASS=***")
+
+
+def test_print_resource_usage_summary_groups_commands_per_function(capsys):
+    for function_name, cmd_count in [("TEST_FUNCTION_A", 2), ("TEST_FUNCTION_B", 1)]:
+        with trace_util.span(function_name, category="function"):
+            for _ in range(cmd_count):
+                shell_service.execute_cmd(["true"])
+
+    trace_util.print_resource_usage_summary()
+
+    rows = {
+        line.split("|")[1].strip(): line.split("|")[2].strip()
+        for line in capsys.readouterr().out.splitlines()
+        if line.startswith("| TEST_FUNCTION_")
+    }
+    assert rows == {"TEST_FUNCTION_A": "2", "TEST_FUNCTION_B": "1"}